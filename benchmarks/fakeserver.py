@@ -0,0 +1,234 @@
+"""  Local stand-in of the MicroStrategy Library REST API serving synthetic payloads, for the benchmarks.
+    Run it alone with: python -m benchmarks.fakeserver --rows 100000 --latency 0.02
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+TOKEN = "FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF"
+
+
+class SyntheticLibrary:
+    """  Synthetic projects, search results, dataset definitions and instances.
+        rows: rows of every dataset, depth: attributes of the results (levels of the tree), metrics: metrics per row,
+        objects: objects returned by searches, folderDepth: ancestors of every object, projects: projects listed,
+        definitionObjects: attributes and metrics available in a dataset definition
+    """
+
+    def __init__(self, rows=10000, depth=3, metrics=4, objects=1000, folderDepth=4, projects=4,
+                 definitionObjects=200):
+        self.rows = rows
+        self.depth = depth
+        self.metrics = metrics
+        self.objects = objects
+        self.folderDepth = folderDepth
+        self.projects = projects
+        self.definitionObjects = definitionObjects
+        # Elements per attribute, so that the attributes together produce the rows
+        self.cardinality = max(2, int(round(rows ** (1.0 / depth))))
+        self._instances = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def getId(pPrefix, pIndex):
+        return "%s%031X" % (pPrefix, pIndex)
+
+    def getProjects(self):
+        return [{"id": self.getId("B", i), "name": "Project %s" % i, "alias": "", "description": "",
+                 "status": 0} for i in range(self.projects)]
+
+    def getSearchResults(self, pOffset, pLimit):
+        ancestors = [{"name": "Folder %s" % level, "id": self.getId("D", level), "level": self.folderDepth - level}
+                     for level in range(self.folderDepth)]
+        return {"totalItems": self.objects,
+                "result": [{"id": self.getId("C", i), "name": "Report %s" % i, "type": 3, "subtype": 768,
+                            "dateCreated": "2017-11-23T15:16:56.589Z", "dateModified": "2017-11-23T15:16:56.589Z",
+                            "version": self.getId("E", i), "acg": 255, "owner": {"name": "Administrator"},
+                            "ancestors": ancestors}
+                           for i in range(pOffset, min(pOffset + pLimit, self.objects))]}
+
+    def getAttribute(self, pIndex):
+        return {"id": self.getId("A", pIndex), "name": "Attribute %s" % pIndex, "type": 12,
+                "forms": [{"id": "45C11FA478E745FEA08D781CEA190FE5", "name": "ID", "dataType": "Real"},
+                          {"id": "CCFBE2A5EADB4F50941FB879CCF1721C", "name": "DESC", "dataType": "Char"}]}
+
+    def getMetric(self, pIndex):
+        return {"id": self.getId("9", pIndex), "name": "Metric %s" % pIndex, "type": 4, "isDerived": False}
+
+    def getDefinition(self, pDatasetId):
+        half = self.definitionObjects // 2
+        return {"id": pDatasetId, "name": "Dataset " + pDatasetId,
+                "result": {"definition": {"availableObjects": {
+                    "attributes": [self.getAttribute(i) for i in range(half)],
+                    "metrics": [self.getMetric(i) for i in range(self.definitionObjects - half)]}}}}
+
+    def newInstanceId(self):
+        with self._lock:
+            self._instances += 1
+            return self.getId("F", self._instances)
+
+    def getElement(self, pRow, pAttribute):
+        # Mixed radix digits of the row: the first attribute changes slowest, so rows are sorted as in a grid
+        value = pRow // self.cardinality ** (self.depth - 1 - pAttribute)
+        if pAttribute > 0:
+            value %= self.cardinality
+        return {"attributeIndex": pAttribute, "name": "Element %s-%s" % (pAttribute, value),
+                "id": "h%s;%s" % (value, self.getId("A", pAttribute)),
+                "formValues": {"ID": str(value), "DESC": "Element %s-%s" % (pAttribute, value)}}
+
+    def getInstance(self, pInstanceId, pOffset, pLimit):
+        """ Page of the results tree: one level of children per attribute, the metrics in the leaves """
+        end = min(pOffset + pLimit, self.rows)
+        root = {"isPartial": end < self.rows, "children": []}
+        path = []
+        for row in range(pOffset, end):
+            elements = [self.getElement(row, a) for a in range(self.depth)]
+            # Keep the nodes shared with the previous row
+            level = 0
+            while level < len(path) and path[level]["element"]["id"] == elements[level]["id"]:
+                level += 1
+            del path[level:]
+            for a in range(level, self.depth):
+                node = {"depth": a, "element": elements[a]}
+                if a < self.depth - 1:
+                    node["children"] = []
+                else:
+                    node["metrics"] = {"Metric %s" % m: {"rv": (row * (m + 1)) % 1000 + 0.5,
+                                                         "fv": "%.2f" % ((row * (m + 1)) % 1000 + 0.5), "mi": m}
+                                       for m in range(self.metrics)}
+                (path[-1]["children"] if path else root["children"]).append(node)
+                path.append(node)
+        return {"id": "", "name": "", "instanceId": pInstanceId, "status": 1,
+                "result": {"definition": {
+                    "attributes": [dict(self.getAttribute(a), forms=[]) for a in range(self.depth)],
+                    "metrics": [self.getMetric(m) for m in range(self.metrics)]},
+                    "data": {"paging": {"total": self.rows, "current": end - pOffset, "offset": pOffset,
+                                        "limit": pLimit, "prev": None, "next": None},
+                             "root": root}}}
+
+
+class FakeLibraryServer:
+    """  Threaded HTTP server answering the REST requests of MSTRSession with a SyntheticLibrary, on a free port
+        of localhost by default. latency: seconds added to every response
+    """
+
+    def __init__(self, library=None, latency=0.0, host="127.0.0.1", port=0):
+        self.library = library if library is not None else SyntheticLibrary()
+        self.latency = latency
+        self.requests = 0
+        self._server = ThreadingHTTPServer((host, port), self._handlerClass())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return "http://%s:%s/MicroStrategyLibrary/api/" % (host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="FakeLibraryServer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def route(self, pVerb, pPath, pParams):
+        """ (status, headers, JSON body or None) of a request. pPath is the path after api/ """
+        lib = self.library
+        parts = pPath.strip("/").split("/")
+        offset = int(pParams.get("offset", ["0"])[0])
+        limit = int(pParams.get("limit", ["1000"])[0])
+        if pPath == "auth/login" and pVerb == "POST":
+            return 204, {"X-MSTR-AuthToken": TOKEN}, None
+        if pPath == "auth/logout":
+            return 204, {}, None
+        if pPath == "sessions":
+            return 200, {}, {"locale": 1033}
+        if pPath == "projects":
+            return 200, {}, lib.getProjects()
+        if pPath == "searches/results":
+            return 200, {}, lib.getSearchResults(offset, limit)
+        if parts[0] in ("reports", "cubes") and len(parts) == 2:
+            return 200, {}, lib.getDefinition(parts[1])
+        if parts[0] in ("reports", "cubes") and len(parts) == 3 and pVerb == "POST":
+            return 200, {}, lib.getInstance(lib.newInstanceId(), offset, limit)
+        if parts[0] in ("reports", "cubes") and len(parts) == 4:
+            return 200, {}, lib.getInstance(parts[3], offset, limit)
+        if parts[0] == "objects" and len(parts) == 2:
+            return 200, {}, dict(lib.getSearchResults(0, 1)["result"][0], id=parts[1])
+        return 404, {}, {"code": "ERR001", "message": "Unknown resource " + pPath}
+
+    def _handlerClass(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                self.answer("GET")
+
+            def do_POST(self):
+                self.answer("POST")
+
+            def do_DELETE(self):
+                self.answer("DELETE")
+
+            def answer(self, pVerb):
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+                url = urlsplit(self.path)
+                path = url.path.split("/api/", 1)[-1]
+                server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                status, headers, body = server.route(pVerb, path, parse_qs(url.query))
+                data = json.dumps(body).encode("utf-8") if body is not None else b""
+                self.send_response(status)
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                if body is not None:
+                    self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake MicroStrategy Library REST server")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--metrics", type=int, default=4)
+    parser.add_argument("--objects", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+    server = FakeLibraryServer(SyntheticLibrary(rows=args.rows, depth=args.depth, metrics=args.metrics,
+                                                objects=args.objects), latency=args.latency, port=args.port)
+    server.start()
+    print("Serving " + server.url)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
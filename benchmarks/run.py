@@ -0,0 +1,197 @@
+"""  Benchmarks of the hot paths of the module, against synthetic payloads and the local FakeLibraryServer.
+    Run from the repository root with: python -m benchmarks.run [--rows N] [--json results.json] [benchmark ...]
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+import mstr
+from benchmarks.fakeserver import FakeLibraryServer, SyntheticLibrary
+
+
+def measure(pFunction, pRepeat):
+    """ Best time in seconds of pRepeat calls of pFunction, and its last result """
+    best = None
+    result = None
+    for _ in range(pRepeat):
+        start = time.perf_counter()
+        result = pFunction()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def benchDecode(pLibrary, pArgs):
+    """ getData decode: JSON text of one page to MSTRDatasetResults rows and to MSTRColumnarResults """
+    text = json.dumps(pLibrary.getInstance(pLibrary.newInstanceId(), 0, pLibrary.rows))
+
+    def rows():
+        return sum(1 for _ in mstr.MSTRDatasetResults(json.loads(text)).iterRows())
+
+    def columnar():
+        return len(mstr.MSTRDatasetResults(json.loads(text)).getColumnarResults())
+
+    seconds, count = measure(rows, pArgs.repeat)
+    yield "decode.rows", count, seconds, "rows"
+    seconds, count = measure(columnar, pArgs.repeat)
+    yield "decode.columnar", count, seconds, "rows"
+
+
+def benchViewFilter(pLibrary, pArgs):
+    """ MSTRViewFiler build and serialize, with new constants every time (compiled template reused) """
+    definition = mstr.MSTRDatasetDefinition(mstr.MSTRObject(pLibrary.getId("C", 0), {"type": 3, "subtype": 768}),
+                                            pLibrary.getDefinition("C"))
+    forms = [a.Forms["DESC"] for a in definition.Attributes[:4]]
+    metric = definition.Metrics[0]
+    count = pArgs.filters
+
+    def build():
+        for i in range(count):
+            expression = (forms[0].isin(["North %s" % i, "South"]) | (forms[1] == "Year %s" % i)) & \
+                (metric > i) & ~forms[2].contains("x%s" % i) & (forms[3] != "Other")
+            mstr.MSTRViewFiler(expression).tojson()
+        return count
+
+    def buildList():
+        for i in range(count):
+            mstr.MSTRViewFiler(['(', forms[0], mstr.MSTROperatorEquals(), mstr.MSTRConstant("North %s" % i), ')',
+                                mstr.MSTROperatorOr(), '(', forms[1], mstr.MSTROperatorEquals(),
+                                mstr.MSTRConstant("Year %s" % i), ')']).tojson()
+        return count
+
+    seconds, count = measure(build, pArgs.repeat)
+    yield "viewfilter.expression", count, seconds, "filters"
+    seconds, count = measure(buildList, pArgs.repeat)
+    yield "viewfilter.list", count, seconds, "filters"
+
+
+def benchDefinition(pLibrary, pArgs):
+    """ MSTRDatasetDefinition parse of a definition with definitionObjects attributes and metrics """
+    text = json.dumps(pLibrary.getDefinition("C"))
+    report = mstr.MSTRObject(pLibrary.getId("C", 0), {"type": 3, "subtype": 768})
+
+    def parse():
+        definition = mstr.MSTRDatasetDefinition(report, json.loads(text))
+        return len(definition.Attributes) + len(definition.Metrics)
+
+    seconds, count = measure(parse, pArgs.repeat)
+    yield "definition.parse", count, seconds, "objects"
+
+
+def measureMemory(pFunction):
+    """ Bytes still allocated by pFunction once it returns (the result is kept alive), and the result """
+    tracemalloc.start()
+    try:
+        result = pFunction()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return size, result
+
+
+def benchCatalog(pLibrary, pArgs):
+    """ Bulk catalog load: search results JSON to MSTRObject instances and to a MSTRObjectTable, timed and with
+        the bytes per object retained (the JSON is released)
+    """
+    text = json.dumps(pLibrary.getSearchResults(0, pLibrary.objects))
+
+    def objects():
+        return [mstr.MSTRObject(r["id"], r) for r in json.loads(text)["result"]]
+
+    def table():
+        return mstr.MSTRObjectTable(json.loads(text)["result"])
+
+    for name, build in (("catalog.objects", objects), ("catalog.table", table)):
+        seconds, result = measure(build, pArgs.repeat)
+        del result
+        size, result = measureMemory(build)
+        yield name, len(result), seconds, "objects", size / max(len(result), 1)
+        del result
+
+
+def benchEndToEnd(pLibrary, pArgs):
+    """ Extraction through HTTP from the FakeLibraryServer: search, definition and paged data """
+    with FakeLibraryServer(pLibrary, latency=pArgs.latency) as server:
+        session = mstr.MSTRSession(server.url, "user", "password", autoopen=True, autoload=True,
+                                   poolMaxSize=max(10, pArgs.workers))
+        try:
+            def search():
+                return sum(1 for _ in session.quickSearchProject("Report", pPageSize=pArgs.pageSize).iterRows())
+
+            seconds, count = measure(search, pArgs.repeat)
+            yield "endtoend.search", count, seconds, "objects"
+
+            report = session.quickSearchProject("Report", pPageSize=1)[0]
+            definition = session.getDatasetDefinition(report)
+
+            def rows():
+                return sum(1 for _ in session.iterData(definition, pPageSize=pArgs.pageSize, pWorkers=pArgs.workers))
+
+            def columnar():
+                return len(session.getColumnarData(definition, pPageSize=pArgs.pageSize, pWorkers=pArgs.workers))
+
+            def streamed():
+                return sum(1 for _ in session.iterData(definition, pPageSize=pArgs.pageSize, pStream=True))
+
+            seconds, count = measure(rows, pArgs.repeat)
+            yield "endtoend.iterData", count, seconds, "rows"
+            seconds, count = measure(columnar, pArgs.repeat)
+            yield "endtoend.columnar", count, seconds, "rows"
+            seconds, count = measure(streamed, pArgs.repeat)
+            yield "endtoend.stream", count, seconds, "rows"
+        finally:
+            session.close()
+
+
+BENCHMARKS = {"decode": benchDecode, "viewfilter": benchViewFilter, "definition": benchDefinition,
+              "catalog": benchCatalog, "endtoend": benchEndToEnd}
+
+
+def main(pArgv=None):
+    parser = argparse.ArgumentParser(description="mstr-py benchmarks")
+    parser.add_argument("benchmarks", nargs="*", help="benchmarks to run (%s), all by default" %
+                        ", ".join(BENCHMARKS))
+    parser.add_argument("--rows", type=int, default=50000, help="rows of the datasets")
+    parser.add_argument("--depth", type=int, default=3, help="attributes of the datasets")
+    parser.add_argument("--metrics", type=int, default=4, help="metrics of the datasets")
+    parser.add_argument("--objects", type=int, default=5000, help="objects returned by searches")
+    parser.add_argument("--definition-objects", dest="definitionObjects", type=int, default=500,
+                        help="attributes and metrics of the dataset definitions")
+    parser.add_argument("--filters", type=int, default=2000, help="view filters built per run")
+    parser.add_argument("--page-size", dest="pageSize", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every server response")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of every benchmark, the best is reported")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(pArgv)
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error("unknown benchmark %s" % name)
+
+    library = SyntheticLibrary(rows=args.rows, depth=args.depth, metrics=args.metrics, objects=args.objects,
+                               definitionObjects=args.definitionObjects)
+    results = []
+    print("%-24s %10s %10s %14s" % ("benchmark", "count", "seconds", "rate"))
+    for name in args.benchmarks or list(BENCHMARKS):
+        # Benchmarks yield (name, count, seconds, unit) and optionally the bytes retained per item
+        for benchmark, count, seconds, unit, *size in BENCHMARKS[name](library, args):
+            rate = count / seconds if seconds else float("inf")
+            results.append({"benchmark": benchmark, "count": count, "seconds": seconds, "rate": rate,
+                            "unit": unit + "/s"})
+            line = "%-24s %10d %10.4f %14.1f %s/s" % (benchmark, count, seconds, rate, unit)
+            if size:
+                results[-1]["bytesPerItem"] = size[0]
+                line += " %10.0f bytes/item" % size[0]
+            print(line)
+            sys.stdout.flush()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"settings": vars(args), "results": results}, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,17 @@
 from mstr.mstr import MSTRSession, MSTRError, MSTRAttribute, MSTRMetric, MSTRDatasetDefinition, MSTRSearchResults,\
-    AuthorizationToken, MSTRObject, MSTRViewFiler, MSTRAttributeForm
+    AuthorizationToken, MSTRObject, MSTRViewFiler, MSTRAttributeForm, MSTRDatasetResults, MSTRColumnarResults, \
+    MSTRResultRow, MSTRProjectsResults, MSTRColumnarFilter, MSTRObjectTable, MSTRAncestor
+from mstr.cache import MSTRCache, MSTRResultCache
+from mstr.pool import MSTRSessionPool
+from mstr.index import MSTRMetadataIndex
+from mstr.metrics import MSTRMetrics
+from mstr.aio import MSTRAsyncSession
 from mstr.base import EnumDssXmlSearchType, EnumDSSObjectType, EnumDSSSubTypes, MSTRConstant, MSTROperator, \
     MSTROperatorAnd, MSTROperatorBeginsWith, MSTROperatorContains, MSTROperatorEndsWith, MSTROperatorEquals, \
     MSTROperatorGreater, MSTROperatorGreaterEqual, MSTROperatorLess, MSTROperatorLessEqual, MSTROperatorLike, \
     MSTROperatorNot, MSTROperatorNotBeginsWith, MSTROperatorNotContains, MSTROperatorNotEndsWith, \
-    MSTROperatorNotEquals, MSTROperatorNotLike, MSTROperatorOr
+    MSTROperatorNotEquals, MSTROperatorNotLike, MSTROperatorOr, MSTROperatorIn, MSTRConstants, \
+    MSTRExpression
 
 __all__ = ['MSTRSession', 'MSTRError', 'MSTRAttribute', 'MSTRMetric', 'MSTRDatasetDefinition', 'MSTRSearchResults',
            'MSTRViewFiler', 'AuthorizationToken', 'MSTRObject', 'MSTROperator', 'MSTRConstant', 'MSTRAttributeForm',
@@ -12,4 +19,8 @@ __all__ = ['MSTRSession', 'MSTRError', 'MSTRAttribute', 'MSTRMetric', 'MSTRDatas
            'MSTROperatorNotEquals', 'MSTROperatorNotEndsWith', 'MSTROperatorNotContains', 'MSTROperatorNotBeginsWith',
            'MSTROperatorNot', 'MSTROperatorLike', 'MSTROperatorLessEqual', 'MSTROperatorLess', 'MSTROperatorEquals',
            'MSTROperatorGreaterEqual', 'MSTROperatorGreater', 'MSTROperatorEndsWith', 'MSTROperatorContains',
-           'MSTROperatorBeginsWith', 'MSTROperatorAnd']
+           'MSTROperatorBeginsWith', 'MSTROperatorAnd', 'MSTROperatorIn', 'MSTRConstants',
+           'MSTRExpression', 'MSTRDatasetResults', 'MSTRColumnarResults',
+           'MSTRResultRow', 'MSTRProjectsResults', 'MSTRColumnarFilter', 'MSTRCache',
+           'MSTRResultCache', 'MSTRSessionPool', 'MSTRAsyncSession', 'MSTRMetadataIndex',
+           'MSTRMetrics', 'MSTRObjectTable', 'MSTRAncestor']
@@ -0,0 +1,339 @@
+import asyncio
+import json
+import logging as log
+from urllib.parse import urljoin
+
+import mstr.base as base
+from mstr.mstr import MSTRSession, MSTRError, MSTRDatasetDefinition, MSTRDatasetResults, MSTRSearchResults, \
+    AuthorizationToken, MSTRProjectIndex
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp is optional, only needed for MSTRAsyncSession
+    aiohttp = None
+
+
+class MSTRAsyncResponse:
+    """  Response of MSTRAsyncSession.request, with the body already read.
+        Offers the subset of requests.Response used by the library
+    """
+
+    def __init__(self, status, headers, content):
+        self.status_code = status
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class MSTRAsyncSession:
+    """  asyncio twin of MSTRSession built on aiohttp, with the same object model.
+        Every method that talks to the server is a coroutine, so many requests can run concurrently from one
+        event loop, ex. asyncio.gather(*[s.getObjectInformation(o) for o in objects]).
+        Must be opened and used from a running event loop, preferably as an async context manager
+    """
+
+    # Constants
+    ContentType = MSTRSession.ContentType
+    # Configuration
+    REQ_TIMEOUT = MSTRSession.REQ_TIMEOUT
+    CONNECT_TIMEOUT = MSTRSession.CONNECT_TIMEOUT
+    TOKEN_LIFE = MSTRSession.TOKEN_LIFE
+    PAGE_SIZE = MSTRSession.PAGE_SIZE
+    POOL_MAXSIZE = 100  # Concurrent connections to the server
+
+    def __init__(self, mstr_api_url, username=None, userpassword=None, cache=None, poolMaxSize=None,
+                 connectTimeout=None, readTimeout=None):
+        """ MSTRAsyncSession Constructor. The session is not opened until open is awaited
+            mstr_api_url: full URL for MicroStrategy API (ex. https://demo.microstrategy.com/MicroStrategyLibrary/api/)
+            cache: optional MSTRCache for object information and dataset definitions, can be shared with MSTRSession
+        """
+        if aiohttp is None:
+            raise MSTRError("aiohttp is required for MSTRAsyncSession")
+        log.debug("MSTR Async Session creation for %s", username)
+        self._mstr_url = mstr_api_url + '/'
+        self._user = username
+        self._passw = userpassword
+        self._poolMaxSize = poolMaxSize if poolMaxSize is not None else self.POOL_MAXSIZE
+        self._timeout = aiohttp.ClientTimeout(
+            sock_connect=connectTimeout if connectTimeout is not None else self.CONNECT_TIMEOUT,
+            sock_read=readTimeout if readTimeout is not None else self.REQ_TIMEOUT)
+        self._session = None
+        self._headers = {"ContentType": self.ContentType, "Accept": self.ContentType}  # Default Headers
+        self._valid = False
+        self._authToken = AuthorizationToken()
+        self._authLock = None  # asyncio.Lock, created in open from the running event loop
+        self._projects = MSTRProjectIndex([])
+        self.currentProject = None
+        self.cache = cache
+
+    async def __aenter__(self):
+        await self.open(self._user, self._passw)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    @property
+    def AuthToken(self):
+        return self._authToken
+
+    @property
+    def projectCount(self):
+        return len(self._projects)
+
+    async def validate(self):
+        """  Check if the session is valid, remotely once TOKEN_LIFE has passed. See MSTRSession.isValid"""
+        if self._authToken.isValid:
+            if self._authToken.validFor > self.TOKEN_LIFE:
+                req = await self.request('GET', urljoin(self._mstr_url, "sessions"), raiseError=False,
+                                         pReauthenticate=False)
+                if req.status_code == 204:
+                    self._authToken.validate()
+                else:
+                    self._valid = False
+        else:
+            self._valid = False
+
+        return self._valid
+
+    async def open(self, username, userpassword, autoload=True):
+        """  Open a connection to MSTR Server and get the list of projects available for the user"""
+        log.debug("MSTR Async Session opening for %s", username)
+        self._user = username
+        self._passw = userpassword
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self._poolMaxSize),
+                                                  timeout=self._timeout)
+        if self._authLock is None:
+            self._authLock = asyncio.Lock()
+
+        open_body = {"username": self._user,
+                     "password": self._passw,
+                     "loginMode": 1}
+        try:
+            req = await self.request('POST', urljoin(self._mstr_url, "auth/login"), {}, open_body,
+                                     pReauthenticate=False)
+            self._authToken.token = req.headers['X-MSTR-AuthToken']
+            self._headers.update({"X-MSTR-AuthToken": self._authToken.token} if self._authToken.isValid else {})
+            self._valid = True
+            if autoload:
+                await self.loadProjects()
+        except MSTRError:
+            raise
+        except KeyError as e:
+            log.error("X-MSTR-AuthToken does not exist in the the header. %s", e)
+            raise MSTRError("X-MSTR-AuthToken does not exist in the the header.", e)
+
+        log.debug("MSTR Async Session created for %s", self._user)
+
+    async def close(self):
+        """  Close MSTR Session and the underlying HTTP connections"""
+        log.debug("MSTR Async Session closing for %s", self._user)
+        try:
+            if await self.validate():
+                await self.request('POST', urljoin(self._mstr_url, "auth/logout"), pReauthenticate=False)
+                self._valid = False
+                log.debug("MSTR Async Session closed for %s", self._user)
+            else:
+                log.debug("MSTR Async Session closing failed. Invalid session for %s", self._user)
+        finally:
+            if self._session is not None:
+                await self._session.close()
+
+    async def getProjectList(self):
+        """  Get the list of projects available for the session"""
+        log.debug("MSTR Async Session Project List for %s", self._user)
+        if await self.validate():
+            r = await self.request('GET', urljoin(self._mstr_url, "projects"))
+            return list(r.json())
+        else:
+            log.debug("MSTR Async Session Project List failed. Invalid session for %s", self._user)
+            return None
+
+    async def loadProjects(self):
+        """  Reload the project list and index the active ones for searchForProject
+             Returns the list of projects, None if the session is invalid
+        """
+        _lprojects = await self.getProjectList()
+        if _lprojects is not None:
+            # Only use projects with Status = Active (0)
+            self._projects = MSTRProjectIndex([elem for elem in _lprojects if elem.get('status') == 0])
+        return _lprojects
+
+    def searchForProject(self, pProject):
+        """  Searches for project in ID, Alias and Name, see MSTRSession.searchForProject"""
+        return MSTRSession.findProject(self._projects, pProject)
+
+    def setDefaultProject(self, pProject):
+        """  Set the default project to be used if none is selected"""
+        self.currentProject = self.searchForProject(pProject)
+        if self.currentProject is not None:
+            self._headers.update(MSTRSession.getProjectHeader(self.currentProject["id"]))
+            log.debug("MSTR Async Session Set Header Project ID = %s", self.currentProject["id"])
+
+    async def getObjectInformation(self, pMstrObject, pMstrProjectId=None):
+        """  Get information for an specific object"""
+        log.debug("MSTR Async Session Object Info for %s", self._user)
+        _lkey = self._getCacheKey(pMstrObject, pMstrProjectId, "object")
+        _lcached = self.cache.get(_lkey, MSTRSession.getCacheVersion(pMstrObject)) if self.cache is not None else None
+        if _lcached is not None:
+            pMstrObject.update(_lcached)
+            return pMstrObject
+
+        if await self.validate():
+            r = await self.request('GET', urljoin(self._mstr_url, "objects") + "/" + pMstrObject.ID,
+                                   pHeaders=MSTRSession.getProjectHeader(pMstrProjectId),
+                                   pParams={"type": pMstrObject.Type.value})
+            _ljson = r.json()
+            pMstrObject.update(_ljson)
+            if self.cache is not None:
+                self.cache.set(_lkey, _ljson, MSTRSession.getCacheVersion(pMstrObject))
+            return pMstrObject
+        else:
+            log.debug("MSTR Async Session Object Info failed. Invalid session for %s", self._user)
+            return None
+
+    async def getDatasetDefinition(self, pMstrObject, pMstrProjectId=None):
+        """  Get report or cube definition from metadata, see MSTRSession.getDatasetDefinition"""
+        log.debug("MSTR Async Session Dataset Definition for %s", self._user)
+        _lkey = self._getCacheKey(pMstrObject, pMstrProjectId, "definition")
+        _lcached = self.cache.get(_lkey, MSTRSession.getCacheVersion(pMstrObject)) if self.cache is not None else None
+        if _lcached is not None:
+            return MSTRDatasetDefinition(pMstrObject, _lcached)
+
+        if await self.validate():
+            try:
+                r = await self.request('GET', urljoin(self._mstr_url, MSTRSession.getDatasetMethod(pMstrObject) + "/" +
+                                                      pMstrObject.ID),
+                                       pHeaders=MSTRSession.getProjectHeader(pMstrProjectId))
+                _ljson = r.json()
+                _ldefinition = MSTRDatasetDefinition(pMstrObject, _ljson)
+                if self.cache is not None:
+                    self.cache.set(_lkey, _ljson, MSTRSession.getCacheVersion(pMstrObject))
+                return _ldefinition
+            except MSTRError as err:
+                log.debug("MSTR Async Session Dataset Definition failed. HTTP Error: %s", err)
+                return None
+        else:
+            log.debug("MSTR Async Session Dataset Definition failed. Invalid session for %s", self._user)
+            return None
+
+    async def quickSearchProject(self, pSearchString=None, pRootFolderId=None,
+                                 pSearchType=base.EnumDssXmlSearchType.DSSXMLSEARCHTYPECONTAINS,
+                                 pObjectTypes=[base.EnumDSSObjectType.DSSTYPEREPORTDEFINITION], pMstrProjectId=None):
+        """  Search objects in the project, see MSTRSession.quickSearchProject"""
+        log.debug("MSTR Async Session Quick Search for %s", self._user)
+        if await self.validate():
+            r = await self.request('GET', urljoin(self._mstr_url, "searches/results"),
+                                   pHeaders=MSTRSession.getProjectHeader(pMstrProjectId),
+                                   pParams=MSTRSession.getSearchParams(pSearchString, pRootFolderId, pSearchType,
+                                                                       pObjectTypes))
+            return MSTRSearchResults(r.json())
+        else:
+            log.debug("MSTR Async Session Quick Search failed. Invalid session for %s", self._user)
+            return None
+
+    async def getData(self, pMstrDataset, pMstrObjectList=None, pMstrFilterList=None, pMstrProjectId=None):
+        """  Get the results of a report or cube, see MSTRSession.getData"""
+        log.debug("MSTR Async Session Data request for %s", self._user)
+        if await self.validate():
+            try:
+                r = await self.request('POST', self._getInstancesURL(pMstrDataset),
+                                       pHeaders=MSTRSession.getProjectHeader(pMstrProjectId),
+                                       pBody=MSTRSession.getDataBody(pMstrObjectList, pMstrFilterList))
+                return MSTRDatasetResults(r.json())
+            except MSTRError as err:
+                log.debug("MSTR Async Session Data request failed. HTTP Error: %s", err)
+                return None
+        else:
+            log.debug("MSTR Async Session Data request failed. Invalid session for %s", self._user)
+            return None
+
+    async def getDataPages(self, pMstrDataset, pMstrObjectList=None, pMstrFilterList=None, pMstrProjectId=None,
+                           pPageSize=None):
+        """  Async generator over the pages of a dataset, see MSTRSession.getDataPages"""
+        if not await self.validate():
+            log.debug("MSTR Async Session Data pages request failed. Invalid session for %s", self._user)
+            return
+
+        _lpageSize = pPageSize if pPageSize is not None else self.PAGE_SIZE
+        _lurl = self._getInstancesURL(pMstrDataset)
+        _lheaders = MSTRSession.getProjectHeader(pMstrProjectId)
+
+        r = await self.request('POST', _lurl, pHeaders=_lheaders,
+                               pBody=MSTRSession.getDataBody(pMstrObjectList, pMstrFilterList),
+                               pParams={"offset": 0, "limit": _lpageSize})
+        page = MSTRDatasetResults(r.json())
+        yield page
+
+        for _loffset in range(_lpageSize, page.Total if page.InstanceId is not None else 0, _lpageSize):
+            r = await self.request('GET', _lurl + "/" + page.InstanceId, pHeaders=_lheaders,
+                                   pParams={"offset": _loffset, "limit": _lpageSize})
+            yield MSTRDatasetResults(r.json())
+
+    async def request(self, pVerb, pURL, pHeaders={}, pBody=None, pParams={}, raiseError=True,
+                      pReauthenticate=True):
+        """  Runs request, returning a MSTRAsyncResponse
+             With pReauthenticate a 401 response logs in again and the request is replayed once, see
+             MSTRSession.request
+        """
+        if self._session is None:
+            raise MSTRError("MSTR Async Session is not opened")
+        _ltoken = self._authToken.token
+        r = await self._request(pVerb, pURL, pHeaders, pBody, pParams, raiseError and not pReauthenticate)
+        if r.status_code == 401 and pReauthenticate and self._passw is not None:
+            await self._reauthenticate(_ltoken)
+            r = await self._request(pVerb, pURL, pHeaders, pBody, pParams, raiseError)
+        elif (r.status_code < 200 or r.status_code >= 300) and raiseError:
+            raise MSTRError(pjson=r.json())
+        return r
+
+    async def _reauthenticate(self, pFailedToken):
+        """  Logs in again unless another task already did since pFailedToken was rejected"""
+        async with self._authLock:
+            if self._authToken.token == pFailedToken:
+                log.info("MSTR Async Session expired, logging in again for %s", self._user)
+                await self.open(self._user, self._passw, autoload=False)
+
+    async def _request(self, pVerb, pURL, pHeaders, pBody, pParams, raiseError):
+        _lheaders = dict(self._headers)
+        _lheaders.update(pHeaders)
+        try:
+            log.debug("Request Headers: %s", _lheaders)
+            log.debug("Request Content: %s", pBody)
+            async with self._session.request(pVerb, pURL, headers=_lheaders, json=pBody,
+                                             params=self._toQuery(pParams)) as resp:
+                r = MSTRAsyncResponse(resp.status, resp.headers, await resp.read())
+            log.info("Request status code: %s", r.status_code)
+
+            if (r.status_code < 200 or r.status_code >= 300) and raiseError:
+                raise MSTRError(pjson=r.json())
+        except ValueError as err:
+            log.error(err)
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise MSTRError("Request to %s failed" % pURL, e)
+
+        return r
+
+    def _getInstancesURL(self, pMstrDataset):
+        return MSTRSession.getDatasetInstancesURL(self._mstr_url, pMstrDataset)
+
+    def _getCacheKey(self, pMstrObject, pMstrProjectId, pKind):
+        return MSTRSession.getObjectCacheKey(
+            pMstrObject, MSTRSession.getRequestProjectId(pMstrProjectId, self.currentProject), pKind)
+
+    @staticmethod
+    def _toQuery(pParams):
+        """ Query parameters encoded as requests does: lists as repeated keys, values as strings """
+        query = []
+        for k, v in pParams.items():
+            for x in (v if isinstance(v, (list, tuple)) else [v]):
+                query.append((k, str(x)))
+        return query
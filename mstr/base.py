@@ -1,3 +1,8 @@
+import json
+import logging as log
+import operator
+import threading
+from datetime import date
 from enum import IntEnum
 from numbers import Number
 
@@ -25,6 +30,35 @@ class Stack:
         return len(self.items)
 
 
+class PeriodicTimer:
+    """
+    Calls a function every interval seconds from a daemon thread until cancel is called.
+    Exceptions raised by the function are logged and do not stop the timer
+    """
+
+    def __init__(self, interval, function):
+        self.interval = interval
+        self.function = function
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def cancel(self):
+        self._stop.set()
+
+    def isAlive(self):
+        return self._thread.is_alive() and not self._stop.is_set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.function()
+            except Exception as e:
+                log.error("Periodic task %s failed: %s", self.function, e)
+
+
 class BinaryTree:
     """
     A recursive implementation of Binary Tree
@@ -71,16 +105,122 @@ class BinaryTree:
         return self.key
 
 
+    def getChildren(self):
+        return [c for c in (self.leftChild, self.rightChild) if c is not None]
+
+    def todict(self):
+        return _treetodict(self)
+
+
+class ExpressionTree:
+    """
+    N-ary expression tree: an operator key with a list of children, or an operand key if it is a leaf.
+    normalize flattens chains of the same associative operator (And, Or) into one node and turns an Or of
+    Equals on the same object into an In with the list of constants
+    """
+
+    ASSOCIATIVE = ('And', 'Or')
+
+    def __init__(self, rootObj, children=None):
+        self.key = rootObj
+        self.children = children if children is not None else []
+
+    def isLeaf(self):
+        return not self.children
+
+    def getChildren(self):
+        return self.children
+
+    def getRootVal(self):
+        return self.key
+
+    def addChild(self, newNode):
+        self.children.append(newNode if isinstance(newNode, ExpressionTree) else ExpressionTree(newNode))
+
+    @classmethod
+    def fromBinaryTree(cls, tree):
+        # Post order walk with an explicit stack, so deep trees do not hit the recursion limit
+        converted = {}
+        stack = [(tree, False)]
+        while stack:
+            node, visited = stack.pop()
+            if not visited:
+                stack.append((node, True))
+                stack.extend((c, False) for c in reversed(node.getChildren()))
+                continue
+            converted[id(node)] = cls(node.key, [converted.pop(id(c)) for c in node.getChildren()])
+        return cls.normalize(converted[id(tree)])
+
+    @classmethod
+    def normalize(cls, tree):
+        """ Flattens the And/Or chains and then turns the Or of Equals into In. Returns the new root """
+        stack = [(tree, False)]
+        while stack:
+            node, visited = stack.pop()
+            if not visited:
+                stack.append((node, True))
+                stack.extend((c, False) for c in node.children)
+                continue
+            if not node.isLeaf() and node.key in cls.ASSOCIATIVE:
+                children = []
+                for child in node.children:
+                    if not child.isLeaf() and child.key == node.key:
+                        children.extend(child.children)
+                    else:
+                        children.append(child)
+                node.children = children
+
+        # Or of Equals once the chains are flattened
+        root = cls._toIn(tree)
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            node.children = [cls._toIn(c) for c in node.children]
+            stack.extend(node.children)
+        return root
+
+    @classmethod
+    def _toIn(cls, node):
+        """ Or of Equals of the same object and constants of the same type as an In """
+        if node.isLeaf() or node.key != 'Or' or len(node.children) < 2:
+            return node
+        operand = None
+        dataType = None
+        values = []
+        for child in node.children:
+            if child.isLeaf() or child.key != 'Equals' or len(child.children) != 2:
+                return node
+            left, right = child.children
+            if not left.isLeaf() or not right.isLeaf() or type(right.key) is not MSTRConstant:
+                return node
+            if operand is None:
+                operand = left.key
+                dataType = right.key.DataType
+            elif (left.key is not operand and left.key.todict() != operand.todict()) or \
+                    right.key.DataType != dataType:
+                return node
+            values.append(right.key)
+        return cls(MSTROperatorIn().Expression, [cls(operand), cls(MSTRConstants(values, dataType))])
+
     def todict(self):
-        if self.isLeaf():
-            return self.key.todict()
+        return _treetodict(self)
+
+
+def _treetodict(tree):
+    """ Dict of an expression tree (BinaryTree or ExpressionTree) built without recursion """
+    results = {}
+    stack = [(tree, False)]
+    while stack:
+        node, visited = stack.pop()
+        children = node.getChildren()
+        if node.isLeaf():
+            results[id(node)] = node.key.todict()
+        elif not visited:
+            stack.append((node, True))
+            stack.extend((c, False) for c in reversed(children))
         else:
-            operands = []
-            if self.leftChild is not None:
-                operands.append(self.leftChild.todict())
-            if self.rightChild is not None:
-                operands.append(self.rightChild.todict())
-            return dict(operator=self.key, operands=operands)
+            results[id(node)] = dict(operator=node.key, operands=[results.pop(id(c)) for c in children])
+    return results[id(tree)]
 
 
 
@@ -108,10 +248,33 @@ class MSTRConstant:
     def _tomstrstr(self):
         return str(self._value)
 
+    @property
+    def DataType(self):
+        return self._dataType
+
+    @property
+    def Value(self):
+        """ Value as sent to the server """
+        return self._tomstrstr
+
     def todict(self):
         return dict(type="constant", dataType=self._dataType, value=self._tomstrstr)
 
 
+class MSTRConstants(MSTRConstant):
+    """ Represents a list of constants of the same type, the values of an In operator
+    """
+
+    @property
+    def _tomstrstr(self):
+        if isinstance(self._value, (list, tuple)):
+            return [v.Value if isinstance(v, MSTRConstant) else str(v) for v in self._value]
+        return str(self._value)
+
+    def todict(self):
+        return dict(type="constants", dataType=self._dataType, values=self._tomstrstr)
+
+
 class MSTROperator:
     _symbols = None
     _expression = None
@@ -244,12 +407,242 @@ class MSTROperatorOr(MSTRBinaryOperator):
         super(MSTROperatorOr, self).__init__(symbol, 'Or')
 
 
+class MSTROperatorIn(MSTRBinaryOperator):
+
+    def __init__(self, symbol='in'):
+        super(MSTROperatorIn, self).__init__(symbol, 'In')
+
+
 class MSTROperatorNot(MSTRUnaryOperator):
 
     def __init__(self, symbol='not'):
         super(MSTROperatorNot, self).__init__(symbol, 'Not')
 
 
+class MSTRExpression:
+    """ Filter expression built with the operators of MSTRFilterOperand objects (ex. form == "North") and combined
+        with &, | and ~. Immutable and hashable, so it can be used as a cache key. And/Or of And/Or expressions
+        are kept flat, so long chains do not nest
+    """
+
+    __slots__ = ('_operator', '_operands', '_key')
+
+    _ORDER = {"Greater": operator.gt, "GreaterEqual": operator.ge, "Less": operator.lt, "LessEqual": operator.le}
+
+    def __init__(self, operator, operands):
+        """ operator: MSTROperator, operands: MSTRExpression, objects with todict (forms, metrics) and constants"""
+        expression = operator.Expression if isinstance(operator, MSTROperator) else operator
+        if expression in ExpressionTree.ASSOCIATIVE:
+            flat = []
+            for x in operands:
+                if isinstance(x, MSTRExpression) and x._operator == expression:
+                    flat.extend(x._operands)
+                else:
+                    flat.append(x)
+            operands = flat
+        self._operator = expression
+        self._operands = tuple(operands)
+        self._key = None
+
+    @property
+    def Operator(self):
+        return self._operator
+
+    @property
+    def Operands(self):
+        return self._operands
+
+    def iterLeaves(self):
+        """ Generator over the objects and constants of the expression, left to right """
+        stack = [self]
+        while stack:
+            x = stack.pop()
+            if isinstance(x, MSTRExpression):
+                stack.extend(reversed(x._operands))
+            else:
+                yield x
+
+    @property
+    def Constants(self):
+        return [x for x in self.iterLeaves() if isinstance(x, MSTRConstant)]
+
+    @staticmethod
+    def _leafKey(x, pValues):
+        if isinstance(x, MSTRConstant):
+            value = x.Value
+            return (type(x).__name__, x.DataType) + ((tuple(value) if isinstance(value, list) else value,)
+                                                     if pValues else ())
+        return type(x).__name__, json.dumps(x.todict(), sort_keys=True)
+
+    def _getKey(self, pValues):
+        # Operators and leaves in pre order with the number of operands, enough to tell the structure apart
+        key = []
+        stack = [self]
+        while stack:
+            x = stack.pop()
+            if isinstance(x, MSTRExpression):
+                key.append((x._operator, len(x._operands)))
+                stack.extend(reversed(x._operands))
+            else:
+                key.append(self._leafKey(x, pValues))
+        return tuple(key)
+
+    @property
+    def ShapeKey(self):
+        """ Structure of the expression: everything but the values of the constants """
+        return self._getKey(False)
+
+    def toTree(self, pConstants=None):
+        """ ExpressionTree of the expression, with the constants replaced by the pConstants list if given """
+        constants = iter(pConstants) if pConstants is not None else None
+        root = ExpressionTree(self._operator)
+        stack = [(root, x) for x in reversed(self._operands)]
+        while stack:
+            parent, x = stack.pop()
+            if isinstance(x, MSTRExpression):
+                node = ExpressionTree(x._operator)
+                stack.extend((node, y) for y in reversed(x._operands))
+            else:
+                node = ExpressionTree(next(constants) if constants is not None and isinstance(x, MSTRConstant)
+                                      else x)
+            parent.children.append(node)
+        return ExpressionTree.normalize(root)
+
+    def todict(self):
+        return self.toTree().todict()
+
+    def __and__(self, other):
+        return MSTRExpression(MSTROperatorAnd(), (self, other))
+
+    def __or__(self, other):
+        return MSTRExpression(MSTROperatorOr(), (self, other))
+
+    def __invert__(self):
+        return MSTRExpression(MSTROperatorNot(), (self,))
+
+    def __hash__(self):
+        if self._key is None:
+            self._key = self._getKey(True)
+        return hash(self._key)
+
+    def __eq__(self, other):
+        if not isinstance(other, MSTRExpression):
+            return NotImplemented
+        return hash(self) == hash(other) and self._key == other._key
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __bool__(self):
+        # Comparisons of an object as a plain Python object (ex. in, list.index, dict and set lookups, sorted):
+        # == and != against another object or a constant are its identity (an object never equals a constant),
+        # <, <=, > and >= between two objects order them by identity. Any other expression has no truth value
+        if len(self._operands) == 2 and isinstance(self._operands[0], MSTRFilterOperand):
+            left, right = self._operands
+            if self._operator in ("Equals", "NotEquals") and (isinstance(right, MSTRFilterOperand) or
+                                                              type(right) is MSTRConstant):
+                return MSTRFilterOperand.isSame(left, right) == (self._operator == "Equals")
+            if self._operator in self._ORDER and isinstance(right, MSTRFilterOperand):
+                return self._ORDER[self._operator](MSTRFilterOperand.sortKey(left),
+                                                   MSTRFilterOperand.sortKey(right))
+        raise TypeError("Use & and | instead of and/or to combine filter expressions")
+
+    def __repr__(self):
+        return "MSTRExpression(%s)" % self._operator
+
+
+class MSTRFilterOperand:
+    """ Mixin with the Python operators that build a MSTRExpression on an object (attribute form, metric):
+        ==, !=, >, >=, <, <= and the contains, beginsWith, endsWith, like and isin methods.
+        Plain values (str, numbers, dates and None) are turned into MSTRConstant of the ConstantDataType of the
+        object, other values are NotImplemented.
+        The truth value of == and != is the identity of the objects (getIdentity, the hash too), and the one of
+        <, <=, > and >= between two objects their order by identity, so objects still work in lists, sets, as dict
+        keys and with sorted
+    """
+
+    __slots__ = ()
+
+    ConstantDataType = None
+
+    def _constant(self, pValue):
+        if isinstance(pValue, MSTRConstant):
+            return pValue
+        dataType = self.ConstantDataType
+        if dataType is None:
+            dataType = 'Real' if isinstance(pValue, Number) and not isinstance(pValue, bool) else 'Char'
+        return MSTRConstant(pValue, dataType)
+
+    def _compare(self, pOperator, pValue):
+        if not isinstance(pValue, (MSTRFilterOperand, MSTRExpression)):
+            if pValue is not None and not isinstance(pValue, (MSTRConstant, str, Number, date)):
+                return NotImplemented
+            pValue = self._constant(pValue)
+        return MSTRExpression(pOperator, (self, pValue))
+
+    def __eq__(self, other):
+        return self._compare(MSTROperatorEquals(), other)
+
+    def __ne__(self, other):
+        return self._compare(MSTROperatorNotEquals(), other)
+
+    def __gt__(self, other):
+        return self._compare(MSTROperatorGreater(), other)
+
+    def __ge__(self, other):
+        return self._compare(MSTROperatorGreaterEqual(), other)
+
+    def __lt__(self, other):
+        return self._compare(MSTROperatorLess(), other)
+
+    def __le__(self, other):
+        return self._compare(MSTROperatorLessEqual(), other)
+
+    def __hash__(self):
+        return hash(self.getIdentity())
+
+    def getIdentity(self):
+        """ Immutable key of the object: its class and ID. Names and other fields change with update """
+        return type(self).__name__, self.ID
+
+    @staticmethod
+    def isSame(pLeft, pRight):
+        """ Equality of two objects by identity, consistent with __hash__ (== builds a filter expression) """
+        return pLeft is pRight or (type(pLeft) is type(pRight) and isinstance(pLeft, MSTRFilterOperand) and
+                                   pLeft.getIdentity() == pRight.getIdentity())
+
+    @staticmethod
+    def sortKey(pOperand):
+        """ Order of the objects as plain Python objects (ex. sorted), by identity """
+        return tuple("" if x is None else str(x) for x in pOperand.getIdentity())
+
+    def contains(self, pValue):
+        return self._compare(MSTROperatorContains(), pValue)
+
+    def beginsWith(self, pValue):
+        return self._compare(MSTROperatorBeginsWith(), pValue)
+
+    def endsWith(self, pValue):
+        return self._compare(MSTROperatorEndsWith(), pValue)
+
+    def like(self, pValue):
+        return self._compare(MSTROperatorLike(), pValue)
+
+    def isin(self, pValues):
+        """ In the list of values """
+        if not isinstance(pValues, MSTRConstants):
+            pValues = list(pValues)
+            pValues = MSTRConstants(pValues, self._constant(pValues[0]).DataType if pValues else self.ConstantDataType)
+        return MSTRExpression(MSTROperatorIn(), (self, pValues))
+
+
+# Per enum class: {upper case member name without the prefix: member}, built at import (see _indexNames)
+_enumNames = {}
+# Per enum class: {search string as given: member or None}, so repeated names (hits and misses) skip upper()
+_enumLookups = {}
+
+
 class BaseMSTREnum(IntEnum):
 
     @property
@@ -258,18 +651,43 @@ class BaseMSTREnum(IntEnum):
 
     @classmethod
     def searchName(cls, searchString):
-        localElem = None
-        for x in cls:
-            if x.prefix.upper() + searchString.upper() == x.name:
-                localElem = x
-                break
-
+        """ Member named prefix + searchString, case insensitive (ex. EnumDSSObjectType.searchName("Attribute")),
+            or None if there is none or searchString is None
+        """
+        if searchString is None:
+            return None
+        lookups = _enumLookups.get(cls)
+        if lookups is None:
+            _indexNames(cls)
+            lookups = _enumLookups[cls]
+        try:
+            return lookups[searchString]
+        except KeyError:
+            pass
+        localElem = _enumNames[cls].get(str(searchString).upper())
+        if len(lookups) >= ENUM_LOOKUP_SIZE:
+            lookups.clear()
+        lookups[searchString] = localElem
         return localElem
 
     def __str__(self):
         return "{0}: {1} ({2})".format(self.name, self.value, hex(self.value))
 
 
+ENUM_LOOKUP_SIZE = 4096  # Search strings remembered per enum class by searchName
+
+
+def _indexNames(pEnumClass):
+    """ Builds the searchName tables of the class. Aliases resolve to their canonical member """
+    names = {}
+    for name, member in pEnumClass.__members__.items():
+        prefix = member.prefix.upper()
+        if name.startswith(prefix):
+            names.setdefault(name[len(prefix):], member)
+    _enumNames[pEnumClass] = names
+    _enumLookups[pEnumClass] = {}
+
+
 class EnumDssXmlSearchType(BaseMSTREnum):
 
     @property
@@ -597,3 +1015,7 @@ class EnumDSSSubTypes(BaseMSTREnum):
 
     DSSSUBTYPESUBSCRIPTIONCONTACT = 0xFF02
     DSSSUBTYPESUBSCRIPTIONINSTANCE = 0xFF03
+
+
+for _lenum in (EnumDssXmlSearchType, EnumDSSObjectType, EnumDSSSubTypes):
+    _indexNames(_lenum)
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import logging as log
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+class MSTRCache:
+    """  Cache for metadata JSON payloads (object information, dataset definitions...)
+        Two tiers: an in-memory LRU and an optional on-disk tier (one JSON file per entry in path).
+        Entries expire after ttl seconds and are discarded when the version they were stored with (ex. the
+        dateModified of the object) differs from the one requested.
+        Thread safe, so it can be shared by several sessions
+    """
+
+    MAX_ENTRIES = 1024  # Entries kept in memory
+    TTL = 3600  # Seconds an entry is valid
+
+    def __init__(self, maxEntries=None, ttl=None, path=None):
+        self._maxEntries = maxEntries if maxEntries is not None else self.MAX_ENTRIES
+        self._ttl = ttl if ttl is not None else self.TTL
+        self._path = path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if self._path is not None:
+            os.makedirs(self._path, exist_ok=True)
+
+    @staticmethod
+    def getObjectKey(pProjectId, pObjectId, pType, pKind="object"):
+        """ Cache key of an object: project, object ID, object type and what was requested about it """
+        return pProjectId, pObjectId, pType, pKind
+
+    def get(self, pKey, pVersion=None):
+        """ Cached value for the key or None. An entry stored with a version different from pVersion is discarded
+            (pVersion None accepts any version)
+        """
+        with self._lock:
+            entry = self._entries.get(pKey)
+            if entry is not None:
+                self._entries.move_to_end(pKey)
+        if entry is None:
+            entry = self._load(pKey)
+
+        if entry is not None and self._isValid(entry, pVersion):
+            with self._lock:
+                self.hits += 1
+            log.debug("MSTR Cache hit for %s", pKey)
+            return entry[2]
+
+        if entry is not None:
+            self.invalidate(pKey)
+        with self._lock:
+            self.misses += 1
+        log.debug("MSTR Cache miss for %s", pKey)
+        return None
+
+    def set(self, pKey, pValue, pVersion=None):
+        entry = (time.time(), pVersion, pValue)
+        self._remember(pKey, entry)
+        if self._path is not None:
+            self._store(pKey, entry)
+
+    def invalidate(self, pKey):
+        with self._lock:
+            self._entries.pop(pKey, None)
+        if self._path is not None:
+            try:
+                os.remove(self._getFileName(pKey))
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self._path is not None:
+            for name in os.listdir(self._path):
+                if name.endswith(".json"):
+                    os.remove(os.path.join(self._path, name))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _isValid(self, pEntry, pVersion):
+        return time.time() - pEntry[0] <= self._ttl and (pVersion is None or pEntry[1] == pVersion)
+
+    def _remember(self, pKey, pEntry):
+        with self._lock:
+            self._entries[pKey] = pEntry
+            self._entries.move_to_end(pKey)
+            while len(self._entries) > self._maxEntries:
+                self._entries.popitem(last=False)
+
+    def _getFileName(self, pKey):
+        return os.path.join(self._path, hashlib.sha1(repr(pKey).encode("utf-8")).hexdigest() + ".json")
+
+    def _load(self, pKey):
+        if self._path is None:
+            return None
+        try:
+            with open(self._getFileName(pKey), "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            log.warning("MSTR Cache entry for %s could not be read: %s", pKey, e)
+            return None
+        entry = (stored["stored"], stored["version"], stored["value"])
+        self._remember(pKey, entry)
+        return entry
+
+    def _store(self, pKey, pEntry):
+        # Write to a temporary file and rename it, so readers never see a partial entry
+        fd, tmpName = tempfile.mkstemp(dir=self._path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"key": repr(pKey), "stored": pEntry[0], "version": pEntry[1], "value": pEntry[2]}, f)
+            os.replace(tmpName, self._getFileName(pKey))
+        except (OSError, TypeError, ValueError) as e:
+            log.warning("MSTR Cache entry for %s could not be written: %s", pKey, e)
+            try:
+                os.remove(tmpName)
+            except OSError:
+                pass
+
+
+class MSTRResultCache:
+    """  On-disk cache of dataset results, one file per entry in path.
+        Keys are a canonical hash of the request (see getKey), so the same dataset requested with the same objects
+        and view filter is read from disk instead of the server. The files are written by the caller (ex.
+        MSTRColumnarResults.save) and renamed atomically into place.
+        Thread safe, so it can be shared by several sessions
+    """
+
+    TTL = 86400  # Seconds an entry is valid
+    EXTENSION = ".mstrcol"
+
+    def __init__(self, path, ttl=None):
+        self._path = path
+        self._ttl = ttl if ttl is not None else self.TTL
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self._path, exist_ok=True)
+
+    @staticmethod
+    def getKey(pDatasetId, pProjectId, pBody, pVersion=None):
+        """ Hash of the dataset, project, request body (requested objects and view filter) and dataset version """
+        canonical = json.dumps({"dataset": pDatasetId, "project": pProjectId, "body": pBody, "version": pVersion},
+                               sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def getFileName(self, pKey):
+        return os.path.join(self._path, pKey + self.EXTENSION)
+
+    def get(self, pKey):
+        """ File name of a valid entry for the key or None """
+        fileName = self.getFileName(pKey)
+        try:
+            valid = time.time() - os.path.getmtime(fileName) <= self._ttl
+        except OSError:
+            valid = False
+        if valid:
+            with self._lock:
+                self.hits += 1
+            log.debug("MSTR Result cache hit for %s", pKey)
+            return fileName
+        with self._lock:
+            self.misses += 1
+        log.debug("MSTR Result cache miss for %s", pKey)
+        return None
+
+    def set(self, pKey, pWriter):
+        """ Stores an entry, pWriter is called with a binary file object to write it """
+        fd, tmpName = tempfile.mkstemp(dir=self._path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pWriter(f)
+            os.replace(tmpName, self.getFileName(pKey))
+        except (OSError, ValueError) as e:
+            log.warning("MSTR Result cache entry for %s could not be written: %s", pKey, e)
+            try:
+                os.remove(tmpName)
+            except OSError:
+                pass
+
+    def invalidate(self, pKey):
+        try:
+            os.remove(self.getFileName(pKey))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self._path):
+            if name.endswith(self.EXTENSION):
+                os.remove(os.path.join(self._path, name))
@@ -0,0 +1,174 @@
+import json
+import logging as log
+import sqlite3
+import threading
+import time
+
+import mstr.base as base
+from mstr.mstr import MSTRError, MSTRSearchResults
+
+
+class MSTRMetadataIndex:
+    """  Local index of the objects of projects, to search them without calling the server.
+        crawl lists the objects of a project (or of a folder tree) with MSTRSession.quickSearchProject and stores
+        ID, name, type, subtype, dateModified and ancestors in SQLite (in memory by default, or in the file path).
+        refresh lists them again and only writes the objects added, modified (dateModified changed) or deleted.
+        search runs the EnumDssXmlSearchType patterns on the names, case insensitive as in the server.
+        Thread safe
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS objects (
+            project TEXT NOT NULL, id TEXT NOT NULL, name TEXT, foldedName TEXT, type INTEGER, subtype INTEGER,
+            dateModified TEXT, json TEXT NOT NULL, PRIMARY KEY (project, id));
+        CREATE INDEX IF NOT EXISTS objectsName ON objects (project, foldedName);
+        CREATE TABLE IF NOT EXISTS ancestors (
+            project TEXT NOT NULL, id TEXT NOT NULL, ancestor TEXT NOT NULL, PRIMARY KEY (project, ancestor, id));
+        CREATE TABLE IF NOT EXISTS crawls (
+            project TEXT NOT NULL, root TEXT NOT NULL, crawledOn REAL NOT NULL, PRIMARY KEY (project, root));
+    """
+
+    def __init__(self, path=":memory:"):
+        self._path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(self.SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM objects").fetchone()[0]
+
+    def crawl(self, pMstrSession, pMstrProjectId=None, pRootFolderId=None):
+        """ Indexes all the objects of the project, or the ones under pRootFolderId, replacing the ones indexed
+            before for the same project and folder. Returns the number of objects indexed
+        """
+        _lproject, _lrows = self._listObjects(pMstrSession, pMstrProjectId, pRootFolderId)
+        with self._lock, self._db:
+            self._deleteObjects(_lproject, pRootFolderId, None)
+            self._insertObjects(_lproject, _lrows)
+            self._setCrawled(_lproject, pRootFolderId)
+        log.debug("MSTR Metadata index crawled %s objects of %s", len(_lrows), _lproject)
+        return len(_lrows)
+
+    def refresh(self, pMstrSession, pMstrProjectId=None, pRootFolderId=None):
+        """ Updates the index of the project or folder with the objects added, modified or deleted since the last
+            crawl. Returns the number of objects changed
+        """
+        _lproject, _lrows = self._listObjects(pMstrSession, pMstrProjectId, pRootFolderId)
+        with self._lock, self._db:
+            _lindexed = dict(self._db.execute(
+                "SELECT id, dateModified FROM objects o WHERE project = ?" + self._folderCondition(pRootFolderId),
+                (_lproject,) + self._folderParams(pRootFolderId)))
+            _lchanged = [r for r in _lrows if r["id"] not in _lindexed or
+                         _lindexed[r["id"]] != r.get("dateModified")]
+            _ldeleted = _lindexed.keys() - {r["id"] for r in _lrows}
+
+            self._deleteObjects(_lproject, None, [r["id"] for r in _lchanged] + list(_ldeleted))
+            self._insertObjects(_lproject, _lchanged)
+            self._setCrawled(_lproject, pRootFolderId)
+        log.debug("MSTR Metadata index refreshed %s objects of %s", len(_lchanged) + len(_ldeleted), _lproject)
+        return len(_lchanged) + len(_ldeleted)
+
+    def crawledOn(self, pMstrProjectId, pRootFolderId=None):
+        """ Time (as time.time) of the last crawl or refresh of the project or folder, or None """
+        with self._lock:
+            row = self._db.execute("SELECT crawledOn FROM crawls WHERE project = ? AND root = ?",
+                                   (pMstrProjectId, pRootFolderId or "")).fetchone()
+        return row[0] if row is not None else None
+
+    def search(self, pSearchString=None, pMstrProjectId=None, pRootFolderId=None,
+               pSearchType=base.EnumDssXmlSearchType.DSSXMLSEARCHTYPECONTAINS, pObjectTypes=None):
+        """ Indexed objects matching the search, as MSTRSearchResults like MSTRSession.quickSearchProject
+            pMstrProjectId None searches all the indexed projects
+        """
+        _lconditions = ["1 = 1"]
+        _lparams = []
+        if pMstrProjectId is not None:
+            _lconditions.append("project = ?")
+            _lparams.append(pMstrProjectId)
+        if pSearchString is not None:
+            _lcondition, _lnameParams = self.getNameCondition(pSearchString, pSearchType)
+            _lconditions.append(_lcondition)
+            _lparams.extend(_lnameParams)
+        if isinstance(pObjectTypes, list):
+            _lconditions.append("type IN (%s)" % ",".join("?" * len(pObjectTypes)))
+            _lparams.extend(t.value for t in pObjectTypes)
+        _lsql = "SELECT json FROM objects o WHERE " + " AND ".join(_lconditions) + \
+            self._folderCondition(pRootFolderId)
+        _lparams.extend(self._folderParams(pRootFolderId))
+
+        with self._lock:
+            _lrows = [json.loads(r[0]) for r in self._db.execute(_lsql + " ORDER BY foldedName, id", _lparams)]
+        return MSTRSearchResults({"result": _lrows})
+
+    @staticmethod
+    def getNameCondition(pSearchString, pSearchType):
+        """ SQL condition and parameters on the case folded name for the search type """
+        _lpattern = pSearchString.casefold()
+        _lescaped = _lpattern.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        like = "foldedName LIKE ? ESCAPE '\\'"
+        if pSearchType == base.EnumDssXmlSearchType.DSSXMLSEARCHTYPEEXACTLY:
+            return "foldedName = ?", [_lpattern]
+        if pSearchType == base.EnumDssXmlSearchType.DSSXMLSEARCHTYPEBEGINWITH:
+            return like, [_lescaped + "%"]
+        if pSearchType == base.EnumDssXmlSearchType.DSSXMLSEARCHTYPEENDWIDTH:
+            return like, ["%" + _lescaped]
+        if pSearchType == base.EnumDssXmlSearchType.DSSXMLSEARCHTYPEBEGINWITHPHRASE:
+            # The phrase starts a word of the name
+            return "(%s OR %s)" % (like, like), [_lescaped + "%", "% " + _lescaped + "%"]
+        if pSearchType == base.EnumDssXmlSearchType.DSSXMLSEARCHTYPECONTAINSANYWORD:
+            _lwords = [w.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") for w in _lpattern.split()]
+            if not _lwords:
+                return "1 = 1", []
+            return "(%s)" % " OR ".join([like] * len(_lwords)), ["%" + w + "%" for w in _lwords]
+        return like, ["%" + _lescaped + "%"]
+
+    @staticmethod
+    def _listObjects(pMstrSession, pMstrProjectId, pRootFolderId):
+        _lproject = pMstrSession._getProjectId(pMstrProjectId)
+        if _lproject is None:
+            raise MSTRError("No project to index")
+        _lresults = pMstrSession.quickSearchProject(None, pRootFolderId, pObjectTypes=None,
+                                                    pMstrProjectId=pMstrProjectId)
+        if _lresults is None:
+            raise MSTRError("Metadata index crawl failed. Invalid session")
+        return _lproject, list(_lresults.iterRows())
+
+    @staticmethod
+    def _folderCondition(pRootFolderId):
+        """ Condition on the objects o in the folder tree, appended to a WHERE clause """
+        if pRootFolderId is None:
+            return ""
+        return " AND EXISTS (SELECT 1 FROM ancestors a WHERE a.project = o.project AND a.id = o.id " \
+               "AND a.ancestor = ?)"
+
+    @staticmethod
+    def _folderParams(pRootFolderId):
+        return (pRootFolderId,) if pRootFolderId is not None else ()
+
+    def _deleteObjects(self, pProject, pRootFolderId, pIds):
+        if pIds is None:
+            _lids = [r[0] for r in self._db.execute(
+                "SELECT id FROM objects o WHERE project = ?" + self._folderCondition(pRootFolderId),
+                (pProject,) + self._folderParams(pRootFolderId))]
+        else:
+            _lids = pIds
+        self._db.executemany("DELETE FROM objects WHERE project = ? AND id = ?", [(pProject, i) for i in _lids])
+        self._db.executemany("DELETE FROM ancestors WHERE project = ? AND id = ?", [(pProject, i) for i in _lids])
+
+    def _insertObjects(self, pProject, pRows):
+        self._db.executemany(
+            "INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(pProject, r["id"], r.get("name"), (r.get("name") or "").casefold(), r.get("type"), r.get("subtype"),
+              r.get("dateModified"), json.dumps(r)) for r in pRows])
+        self._db.executemany(
+            "INSERT OR IGNORE INTO ancestors VALUES (?, ?, ?)",
+            [(pProject, r["id"], a["id"]) for r in pRows for a in r.get("ancestors") or [] if "id" in a])
+
+    def _setCrawled(self, pProject, pRootFolderId):
+        self._db.execute("INSERT OR REPLACE INTO crawls VALUES (?, ?, ?)",
+                         (pProject, pRootFolderId or "", time.time()))
@@ -0,0 +1,197 @@
+import json
+import re
+import threading
+from bisect import bisect_left
+from urllib.parse import urlsplit
+
+
+class MSTRMetrics:
+    """  Registry of request metrics per endpoint, fed by the MSTRSession.requestHooks of the sessions attached
+        (see attach, or the metrics argument of MSTRSession).
+        Endpoints are the method and the path after api/ with the object and instance IDs replaced by {id}
+        (ex. "POST reports/{id}/instances"). For each one it keeps the calls by status, a latency histogram
+        (LATENCY_BUCKETS, seconds), the bytes sent and received and the errors by MSTRError code and iServerCode.
+        The hits and misses of the caches registered (MSTRCache, MSTRResultCache) are read when exported.
+        Exported with todict or in the Prometheus text format with toprometheus. Thread safe
+    """
+
+    LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+    PREFIX = "mstr"
+
+    _ID = re.compile(r"^(?:[0-9A-Fa-f]{32}|[0-9]+)$")
+
+    def __init__(self, buckets=None):
+        self._buckets = tuple(sorted(buckets if buckets is not None else self.LATENCY_BUCKETS))
+        self._endpoints = {}
+        self._caches = {}
+        self._lock = threading.Lock()
+
+    def attach(self, pMstrSession, pName=None):
+        """ Records the requests of the session and registers its caches as pName.cache and pName.resultCache.
+            Without pName they are "cache" and "resultCache", numbered ("cache2") if other sessions registered
+            different caches. Caches shared by several sessions are only registered once
+        """
+        pMstrSession.requestHooks.append(self.record)
+        if pMstrSession.cache is not None:
+            self._addCache(pName + ".cache" if pName else "cache", pMstrSession.cache, not pName)
+        if pMstrSession.resultCache is not None:
+            self._addCache(pName + ".resultCache" if pName else "resultCache", pMstrSession.resultCache, not pName)
+
+    def addCache(self, pName, pCache):
+        """ Registers an object with hits and misses counters (MSTRCache, MSTRResultCache) as pName.
+            Returns the name it is registered with, an object already registered keeps its name.
+            Raises ValueError if another object is registered as pName
+        """
+        return self._addCache(pName, pCache, False)
+
+    def _addCache(self, pName, pCache, pNumbered):
+        with self._lock:
+            for name, cache in self._caches.items():
+                if cache is pCache:
+                    return name
+            name = pName
+            number = 1
+            while pNumbered and name in self._caches:
+                number += 1
+                name = "%s%s" % (pName, number)
+            if name in self._caches:
+                raise ValueError("Another cache is already registered as %s" % name)
+            self._caches[name] = pCache
+            return name
+
+    @classmethod
+    def getEndpoint(cls, pVerb, pURL):
+        """ Method and path after api/ with IDs replaced by {id} """
+        _lpath = urlsplit(pURL).path
+        _lindex = _lpath.find("/api/")
+        if _lindex >= 0:
+            _lpath = _lpath[_lindex + 5:]
+        _lpath = "/".join("{id}" if cls._ID.match(s) else s for s in _lpath.strip("/").split("/"))
+        return "%s %s" % (pVerb.upper(), _lpath)
+
+    @staticmethod
+    def getError(pTiming, pResponse):
+        """ (code, iServerCode) of a failed request: the MSTRError fields of the response JSON, the HTTP status
+            if it has none, or the exception name if there was no response. None if the request succeeded
+        """
+        if pResponse is None:
+            return pTiming.get("error") or "RequestException", None
+        if 200 <= pResponse.status_code < 300:
+            return None
+        try:
+            _ljson = pResponse.json()
+        except ValueError:
+            _ljson = None
+        if not isinstance(_ljson, dict):
+            return "HTTP %s" % pResponse.status_code, None
+        return _ljson.get("code") or "HTTP %s" % pResponse.status_code, _ljson.get("iServerCode")
+
+    def record(self, pTiming, pResponse):
+        """ MSTRSession.requestHooks callable """
+        _lendpoint = self.getEndpoint(pTiming["method"], pTiming["url"])
+        _lerror = self.getError(pTiming, pResponse)
+        _lbucket = bisect_left(self._buckets, pTiming["total"])
+        with self._lock:
+            stats = self._endpoints.get(_lendpoint)
+            if stats is None:
+                stats = self._endpoints[_lendpoint] = {
+                    "count": 0, "status": {}, "latency": [0] * (len(self._buckets) + 1), "latencySum": 0.0,
+                    "latencyMax": 0.0, "ttfbSum": 0.0, "bytesIn": 0, "bytesOut": 0, "errors": {}}
+            stats["count"] += 1
+            _lstatus = str(pTiming["status"])
+            stats["status"][_lstatus] = stats["status"].get(_lstatus, 0) + 1
+            stats["latency"][_lbucket] += 1
+            stats["latencySum"] += pTiming["total"]
+            stats["latencyMax"] = max(stats["latencyMax"], pTiming["total"])
+            stats["ttfbSum"] += pTiming["ttfb"] or 0.0
+            stats["bytesIn"] += pTiming["bytesIn"] or 0
+            stats["bytesOut"] += pTiming["bytesOut"] or 0
+            if _lerror is not None:
+                stats["errors"][_lerror] = stats["errors"].get(_lerror, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+    def todict(self):
+        """ {"endpoints": {endpoint: stats}, "caches": {name: {"hits", "misses", "hitRate"}}}
+            The latency histogram is a list of [upper bound, cumulative count], the last bound is None (+Inf)
+        """
+        with self._lock:
+            endpoints = {}
+            for name, stats in self._endpoints.items():
+                cumulative = 0
+                histogram = []
+                for bound, count in zip(self._buckets + (None,), stats["latency"]):
+                    cumulative += count
+                    histogram.append([bound, cumulative])
+                endpoints[name] = {
+                    "count": stats["count"], "status": dict(stats["status"]), "latency": histogram,
+                    "latencySum": stats["latencySum"], "latencyMax": stats["latencyMax"],
+                    "latencyMean": stats["latencySum"] / stats["count"],
+                    "ttfbMean": stats["ttfbSum"] / stats["count"], "bytesIn": stats["bytesIn"],
+                    "bytesOut": stats["bytesOut"],
+                    "errors": [{"code": code, "iServerCode": error, "count": count}
+                               for (code, error), count in stats["errors"].items()]}
+            caches = list(self._caches.items())
+        return {"endpoints": endpoints,
+                "caches": {name: {"hits": c.hits, "misses": c.misses,
+                                  "hitRate": c.hits / (c.hits + c.misses) if c.hits + c.misses else None}
+                           for name, c in caches}}
+
+    def tojson(self):
+        return json.dumps(self.todict())
+
+    def toprometheus(self):
+        """ Metrics in the Prometheus text exposition format """
+        _ldict = self.todict()
+        p = self.PREFIX
+        lines = []
+
+        def family(pName, pType, pHelp):
+            lines.append("# HELP %s_%s %s" % (p, pName, pHelp))
+            lines.append("# TYPE %s_%s %s" % (p, pName, pType))
+
+        def sample(pName, pLabels, pValue):
+            labels = ",".join('%s="%s"' % (k, self._escape(v)) for k, v in pLabels.items())
+            lines.append("%s_%s{%s} %s" % (p, pName, labels, repr(float(pValue)) if isinstance(pValue, float)
+                                           else pValue))
+
+        def endpointLabels(pEndpoint, **pExtra):
+            method, _, path = pEndpoint.partition(" ")
+            return dict(method=method, endpoint=path, **pExtra)
+
+        family("requests_total", "counter", "MSTR REST API requests by endpoint and HTTP status")
+        for name, stats in _ldict["endpoints"].items():
+            for status, count in stats["status"].items():
+                sample("requests_total", endpointLabels(name, status=status), count)
+        family("request_duration_seconds", "histogram", "MSTR REST API request latency")
+        for name, stats in _ldict["endpoints"].items():
+            for bound, count in stats["latency"]:
+                sample("request_duration_seconds_bucket",
+                       endpointLabels(name, le="+Inf" if bound is None else repr(float(bound))), count)
+            sample("request_duration_seconds_sum", endpointLabels(name), stats["latencySum"])
+            sample("request_duration_seconds_count", endpointLabels(name), stats["count"])
+        family("response_bytes_total", "counter", "MSTR REST API bytes received")
+        for name, stats in _ldict["endpoints"].items():
+            sample("response_bytes_total", endpointLabels(name), stats["bytesIn"])
+        family("request_bytes_total", "counter", "MSTR REST API bytes sent")
+        for name, stats in _ldict["endpoints"].items():
+            sample("request_bytes_total", endpointLabels(name), stats["bytesOut"])
+        family("request_errors_total", "counter", "MSTR REST API errors by MSTRError code and iServerCode")
+        for name, stats in _ldict["endpoints"].items():
+            for error in stats["errors"]:
+                sample("request_errors_total", endpointLabels(
+                    name, code=error["code"], iServerCode="" if error["iServerCode"] is None else error["iServerCode"]),
+                    error["count"])
+        family("cache_hits_total", "counter", "MSTR cache hits")
+        for name, stats in _ldict["caches"].items():
+            sample("cache_hits_total", {"cache": name}, stats["hits"])
+        family("cache_misses_total", "counter", "MSTR cache misses")
+        for name, stats in _ldict["caches"].items():
+            sample("cache_misses_total", {"cache": name}, stats["misses"])
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _escape(pValue):
+        return str(pValue).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
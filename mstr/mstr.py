@@ -1,10 +1,25 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import logging as log
+from array import array
+from collections import deque, namedtuple, OrderedDict
+from collections.abc import Mapping, Sequence
+from math import nan
+import importlib
+import operator
+import mmap
+import sys
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 from urllib.parse import urljoin
 import re
 import json
+import threading
 import mstr.base as base
+import mstr.stream as stream
+import mstr.cache as cache
 
 
 class MSTRError(Exception):
@@ -27,6 +42,35 @@ class MSTRError(Exception):
                       (" Error: %s" % self.error) if self.error is not None else "") + (
                       (" Code: %s" % self.code) if self.code is not None else ""))
 
+
+class MSTRLogData:
+    """  Log argument formatted only if the record is emitted, truncated to pLimit characters.
+        Header mappings are logged with the authentication token masked
+    """
+    __slots__ = ('_data', '_limit')
+
+    MASKED = frozenset(["x-mstr-authtoken"])
+
+    def __init__(self, pData, pLimit):
+        self._data = pData
+        self._limit = pLimit
+
+    def __str__(self):
+        data = self._data
+        if isinstance(data, (bytes, bytearray)):
+            size = len(data)
+            text = bytes(data[:self._limit]).decode("utf-8", "replace")
+        else:
+            if isinstance(data, Mapping):
+                data = {k: ("***" if str(k).lower() in self.MASKED else v) for k, v in data.items()}
+            text = str(data)
+            size = len(text)
+            text = text[:self._limit]
+        if size > self._limit:
+            text += "... (%s of %s)" % (self._limit, size)
+        return text
+
+
 class MSTRSession:
     """  This class manages the MSTR session and is the entry point to MSTR
         Limitations: Standard authentication only, does not handle session expire date
@@ -35,31 +79,80 @@ class MSTRSession:
     # Constants
     ContentType = "application/json"  # To be added in each request as a request header
     # Configuration
-    REQ_TIMEOUT = 30  # Requests timeout      TODO: Add to configuration
+    REQ_TIMEOUT = 30  # Requests read timeout in seconds, see readTimeout
+    CONNECT_TIMEOUT = 30  # Requests connect timeout in seconds, see connectTimeout
+    POOL_CONNECTIONS = 10  # Connection pools cached (one per host), see poolConnections
+    POOL_MAXSIZE = 10  # Connections kept alive per host, see poolMaxSize
+    POOL_BLOCK = False  # Wait for a free connection instead of opening a throwaway one, see poolBlock
+    RETRIES = 0  # Retries of failed idempotent requests, see retries
+    RETRY_BACKOFF = 0.5  # Backoff factor between retries in seconds, see backoffFactor
+    RETRY_STATUS = (502, 503, 504)  # Response status codes retried
+    RETRY_METHODS = frozenset(['GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'])  # Idempotent verbs retried
     TOKEN_LIFE = 300  # Time between token validations in seconds TODO: Add to configuration
+    KEEPALIVE_INTERVAL = 240  # Time between background validations in seconds, below TOKEN_LIFE, see keepAlive
+    PAGE_SIZE = 5000  # Rows per page when iterating over dataset instances
+    PAGE_WORKERS = 1  # Pages fetched concurrently when iterating over dataset instances
+    OBJECT_WORKERS = 8  # Object information requests run concurrently by getObjectsInformation
+    SEARCH_PAGE_SIZE = 1000  # Objects requested per page of search results
+    LOG_BODY_LIMIT = 2048  # Characters of request and response bodies logged in DEBUG
+    PROJECT_WORKERS = 4  # Projects queried concurrently by getColumnarDataForProjects
+    MAX_SERVER_QUERIES = 8  # Dataset queries run concurrently against one server URL across all the sessions
+
+    _serverQuerySlots = {}
+    _serverQueryLock = threading.Lock()
 
     # Properties
     @property
     def isValid(self):
         """  Check if the session is valid
-            The check is local now, but probably needs to be remote and cached. Local unless # of secs passed
-            since last remote check
-            Use /sessions remote method
+            With keepAlive the session is validated in the background, so the check is local.
+            Otherwise it is local unless TOKEN_LIFE secs passed since last remote check (/sessions remote method)
         """
         if self._authToken.isValid:
-            if self._authToken.validFor > self.TOKEN_LIFE:
-                req = self.request('GET', urljoin(self._mstr_url, "sessions"), raiseError=False)
-                if req.status_code == 204:
-                    self._authToken.validate()
-                else:
-                    # self.open(self._user, self._passw,autoload=False)
-                    self._valid = False
+            if self._keepAliveTimer is None and self._authToken.validFor > self.TOKEN_LIFE:
+                self._checkRemoteSession()
         else:
-            # self.open(self._user, self._passw,autoload=False)
             self._valid = False
 
         return self._valid
 
+    def _checkRemoteSession(self):
+        if not self._pingRemoteSession():
+            self._valid = False
+        return self._valid
+
+    def _pingRemoteSession(self):
+        """  True if the server still accepts the token (/sessions remote method), without changing isValid"""
+        req = self.request('GET', urljoin(self._mstr_url, "sessions"), raiseError=False, pReauthenticate=False)
+        if req.status_code == 204:
+            self._authToken.validate()
+            return True
+        return False
+
+    def _keepAlive(self):
+        """  Background validation of the session, logging in again if the server expired it
+             The session stays valid while it logs in again, it is only invalid if that fails
+        """
+        log.debug("MSTR Session keep alive for %s", self._user)
+        _ltoken = self._authToken.token
+        if self._pingRemoteSession():
+            return
+        if self._passw is None:
+            self._valid = False
+            return
+        try:
+            self._reauthenticate(_ltoken)
+        except Exception:
+            self._valid = False
+            raise
+
+    def _reauthenticate(self, pFailedToken):
+        """  Logs in again unless another thread already did since pFailedToken was rejected"""
+        with self._authLock:
+            if self._authToken.token == pFailedToken:
+                log.info("MSTR Session expired, logging in again for %s", self._user)
+                self.open(self._user, self._passw, autoload=False)
+
     @property
     def AuthToken(self):
         return self._authToken
@@ -73,9 +166,25 @@ class MSTRSession:
     def projectCount(self):
         return len(self._projects)
 
-    def __init__(self, mstr_api_url, username=None, userpassword=None, autoopen=True, autoload=True):
+    def __init__(self, mstr_api_url, username=None, userpassword=None, autoopen=True, autoload=True, cache=None,
+                 resultCache=None, poolConnections=None, poolMaxSize=None, poolBlock=None, connectTimeout=None,
+                 readTimeout=None, retries=None, backoffFactor=None, keepAlive=False, projectRefresh=None,
+                 metrics=None):
         """ MSTRSession Constructor
             mstr_api_url: full URL for MicroStrategy API (ex. https://demo.microstrategy.com/MicroStrategyLibrary/api/)
+            cache: optional MSTRCache for object information and dataset definitions, can be shared by sessions
+            resultCache: optional MSTRResultCache for getColumnarData
+            poolConnections, poolMaxSize, poolBlock: HTTP connection pool settings. poolMaxSize should be at least
+                the number of concurrent requests (ex. pWorkers of getDataPages) so connections are kept alive
+            connectTimeout, readTimeout: seconds to wait for the connection and for the response
+            retries, backoffFactor: retries with exponential backoff of idempotent requests that fail to connect or
+                get a RETRY_STATUS response
+            keepAlive: validate the session from a background thread every KEEPALIVE_INTERVAL seconds instead of
+                before the requests, logging in again if it expired. Stopped by close
+            projectRefresh: seconds between background reloads of the project list, None to load it only on open
+            metrics: optional MSTRMetrics recording the requests and the caches of the session, can be shared
+            Settings not given use the class constants
+            A request rejected with 401 because the session expired logs in again and is replayed once
         """
         log.debug("MSTR Session creation for %s", username)
         # Add final slash in case is missing, double slash is handled by the urljoin
@@ -86,16 +195,41 @@ class MSTRSession:
         # Initialize private fields
         # Create web Session
         self._session = requests.Session()
+        self._timeout = (connectTimeout if connectTimeout is not None else self.CONNECT_TIMEOUT,
+                         readTimeout if readTimeout is not None else self.REQ_TIMEOUT)
+        _lretries = retries if retries is not None else self.RETRIES
+        _ladapter = HTTPAdapter(
+            pool_connections=poolConnections if poolConnections is not None else self.POOL_CONNECTIONS,
+            pool_maxsize=poolMaxSize if poolMaxSize is not None else self.POOL_MAXSIZE,
+            pool_block=poolBlock if poolBlock is not None else self.POOL_BLOCK,
+            max_retries=Retry(total=_lretries, connect=_lretries, read=_lretries, status=_lretries,
+                              backoff_factor=backoffFactor if backoffFactor is not None else self.RETRY_BACKOFF,
+                              status_forcelist=self.RETRY_STATUS, allowed_methods=self.RETRY_METHODS,
+                              raise_on_status=False))
+        self._session.mount("http://", _ladapter)
+        self._session.mount("https://", _ladapter)
         # Add default headers to the session
         self._session.headers.update(
             {"ContentType": MSTRSession.ContentType, "Accept": MSTRSession.ContentType})  # Default Headers
         self._valid = False
         # Create token struct
         self._authToken = AuthorizationToken()
+        self._authLock = threading.RLock()
+        self._keepAliveEnabled = keepAlive
+        self._keepAliveTimer = None
         # Project List
-        self._projects = []
+        self._projects = MSTRProjectIndex([])
+        self._projectRefresh = projectRefresh
+        self._projectTimer = None
         # Default Project
         self.currentProject = None
+        # Metadata and results caches
+        self.cache = cache
+        self.resultCache = resultCache
+        # Called with the timing dict and the response (None if it failed) of every request, see request
+        self.requestHooks = []
+        if metrics is not None:
+            metrics.attach(self)
 
         if autoopen and self._user is not None and self._passw is not None:
             self.open(self._user, self._passw, autoload)
@@ -113,15 +247,20 @@ class MSTRSession:
                      "loginMode": 1}
         try:
             # Get the authentication token
-            req = self.request('POST', urljoin(self._mstr_url, "auth/login"), {}, open_body)
+            req = self.request('POST', urljoin(self._mstr_url, "auth/login"), {}, open_body, pReauthenticate=False)
             self._authToken.token = req.headers['X-MSTR-AuthToken']
             # Add the auth token to the session headers to be included in all future requests
             self._session.headers.update({"X-MSTR-AuthToken": self._authToken.token} if self._authToken.isValid else {})
             # Make the session valid
             self._valid = True
+            if self._keepAliveEnabled and self._keepAliveTimer is None:
+                self._keepAliveTimer = base.PeriodicTimer(self.KEEPALIVE_INTERVAL, self._keepAlive)
+                self._keepAliveTimer.start()
             if autoload:
-                # Only use projects with Status = Active (0)
-                self._projects = [elem for elem in self.getProjectList() if elem['status'] == 0]
+                self.loadProjects()
+            if self._projectRefresh is not None and self._projectTimer is None:
+                self._projectTimer = base.PeriodicTimer(self._projectRefresh, self.loadProjects)
+                self._projectTimer.start()
         except MSTRError:
             raise
         except KeyError as e:
@@ -134,9 +273,15 @@ class MSTRSession:
         """  Close MSTR Session
         """
         log.debug("MSTR Session closing for %s", self._user)
+        if self._keepAliveTimer is not None:
+            self._keepAliveTimer.cancel()
+            self._keepAliveTimer = None
+        if self._projectTimer is not None:
+            self._projectTimer.cancel()
+            self._projectTimer = None
         if self.isValid:
 
-            self.request('POST', urljoin(self._mstr_url, "auth/logout"))
+            self.request('POST', urljoin(self._mstr_url, "auth/logout"), pReauthenticate=False)
             self._valid = False
 
             log.debug("MSTR Session closed for %s", self._user)
@@ -156,46 +301,106 @@ class MSTRSession:
             log.debug("MSTR Session Project List failed. Invalid session for %s", self._user)
             return None
 
+    def loadProjects(self):
+        """  Reload the project list and index the active ones for searchForProject
+             Returns the list of projects, None if the session is invalid
+        """
+        _lprojects = self.getProjectList()
+        if _lprojects is not None:
+            # Only use projects with Status = Active (0)
+            self._projects = MSTRProjectIndex([elem for elem in _lprojects if elem.get('status') == 0])
+        return _lprojects
+
     def getObjectInformation(self, pMstrObject, pMstrProjectId=None):
         """  Get information for an specific object"""
         log.debug("MSTR Session Object Info for %s", self._user)
-        if self.isValid:
+        _lkey = self.getCacheKey(pMstrObject, pMstrProjectId, "object")
+        _lcached = self._getCached(_lkey, pMstrObject)
+        if _lcached is not None:
+            pMstrObject.update(_lcached)
+            return pMstrObject
 
-            r = self.request('GET', urljoin(self._mstr_url, "objects") + "/" + pMstrObject.ID,
-                             pHeaders=self.getProjectHeader(pMstrProjectId), pParams={"type": pMstrObject.Type.value})
+        if self.isValid:
 
-            log.debug("MSTR Session Object Info for %s", self._user)
-            pMstrObject.update(r.json())
+            pMstrObject.update(self._requestObjectInformation(pMstrObject, pMstrProjectId, _lkey))
             return pMstrObject
         else:
             log.debug("MSTR Session Object Info failed. Invalid session for %s", self._user)
             return None
 
+    def getObjectsInformation(self, pMstrObjectList, pMstrProjectId=None, pWorkers=None, pErrors=None):
+        """  Get information for a list of objects, updating them in place
+             Objects repeated in the list (same ID and type) are requested once and the requests run in up to
+             pWorkers threads (OBJECT_WORKERS by default). Cached objects are updated even if the session is invalid.
+             A failed object does not stop the others: with a pErrors dict the failures are added to it by
+             (ID, Type) and the list is returned, otherwise the first failure is raised once all the objects are
+             done (None is returned if the session is invalid)
+        """
+        log.debug("MSTR Session Objects Info for %s", self._user)
+        _lgroups = {}
+        for _lobject in pMstrObjectList:
+            _lgroups.setdefault((_lobject.ID, _lobject.Type), []).append(_lobject)
+
+        _lpending = []
+        for _lobjects in _lgroups.values():
+            _lkey = self.getCacheKey(_lobjects[0], pMstrProjectId, "object")
+            _lcached = self._getCached(_lkey, _lobjects[0])
+            if _lcached is not None:
+                for _lobject in _lobjects:
+                    _lobject.update(_lcached)
+            else:
+                _lpending.append((_lkey, _lobjects))
+
+        if not _lpending:
+            return pMstrObjectList
+        if not self.isValid:
+            log.debug("MSTR Session Objects Info failed. Invalid session for %s", self._user)
+            if pErrors is None:
+                return None
+            for _, _lobjects in _lpending:
+                pErrors[(_lobjects[0].ID, _lobjects[0].Type)] = MSTRError(
+                    "Object information request failed for %s. Invalid session" % _lobjects[0].ID)
+            return pMstrObjectList
+
+        _lerrors = {}
+        _lworkers = min(pWorkers if pWorkers is not None else self.OBJECT_WORKERS, len(_lpending))
+        with ThreadPoolExecutor(max_workers=_lworkers) as executor:
+            _lfutures = [(executor.submit(self._requestObjectInformation, _lobjects[0], pMstrProjectId, _lkey),
+                          _lobjects) for _lkey, _lobjects in _lpending]
+            for _lfuture, _lobjects in _lfutures:
+                try:
+                    _ljson = _lfuture.result()
+                except Exception as err:
+                    log.warning("MSTR Session Object Info failed for %s: %s", _lobjects[0].ID, err)
+                    _lerrors[(_lobjects[0].ID, _lobjects[0].Type)] = err
+                    continue
+                for _lobject in _lobjects:
+                    _lobject.update(_ljson)
+        if pErrors is not None:
+            pErrors.update(_lerrors)
+        elif _lerrors:
+            raise next(iter(_lerrors.values()))
+        return pMstrObjectList
+
+    def _requestObjectInformation(self, pMstrObject, pMstrProjectId, pKey):
+        r = self.request('GET', urljoin(self._mstr_url, "objects") + "/" + pMstrObject.ID,
+                         pHeaders=self.getProjectHeader(pMstrProjectId), pParams={"type": pMstrObject.Type.value})
+
+        log.debug("MSTR Session Object Info for %s", self._user)
+        _ljson = r.json()
+        self._setCached(pKey, _ljson, MSTRObject(pMstrObject.ID, _ljson))
+        return _ljson
+
     def getData(self, pMstrDataset, pMstrObjectList=None, pMstrFilterList=None, pMstrProjectId=None):
         """  Get information for an specific object"""
         log.debug("MSTR Session Data request for %s", self._user)
         if self.isValid:
 
-            if pMstrDataset.Object.Subtype == base.EnumDSSSubTypes.DSSSUBTYPEREPORTCUBE:
-                _lmethod = "cubes"
-            else:
-                _lmethod = "reports"
-
-            body = {}
-
-            if pMstrObjectList is not None:
-                requestedObjects = dict(attributes=[dict(id=e.ID) for e in pMstrObjectList if isinstance(e, MSTRAttribute)],
-                                          forms=[dict(id=e.ID) for e in pMstrObjectList if isinstance(e, MSTRAttributeForm)],
-                                          metrics=[dict(id=e.ID) for e in pMstrObjectList if isinstance(e, MSTRMetric)])
-                body["requestedObjects"] = requestedObjects
-
-            if pMstrFilterList is not None:
-                filter = MSTRViewFiler(pMstrFilterList)
-                body["viewFilter"] = filter.todict()
+            body = self.getDataBody(pMstrObjectList, pMstrFilterList)
 
             try:
-                r = self.request('POST', urljoin(self._mstr_url, _lmethod + "/" + pMstrDataset.Object.ID) +
-                                 '/instances', pHeaders=self.getProjectHeader(pMstrProjectId), pBody=body)
+                r = self.request('POST', self.getInstancesURL(pMstrDataset), pHeaders=self.getProjectHeader(pMstrProjectId),
+                                 pBody=body)
 
 
                 log.debug("MSTR Session Data request for %s", self._user)
@@ -208,54 +413,256 @@ class MSTRSession:
             log.debug("MSTR Session Data request failed. Invalid session for %s", self._user)
             return None
 
+    def getDataPages(self, pMstrDataset, pMstrObjectList=None, pMstrFilterList=None, pMstrProjectId=None,
+                     pPageSize=None, pWorkers=None, pStream=False):
+        """  Generator over the pages of a dataset.
+             The instance is created once with the first page and the following pages are requested with
+             offset/limit against /instances/{instanceId}, so only one page is held in memory at a time.
+             With pWorkers > 1 up to pWorkers pages are prefetched concurrently, sharing the session and its
+             auth token, and are still returned in order.
+             With pStream every page is a MSTRStreamedResults decoded while it is downloaded, so memory is bound
+             by one row instead of one page. Streamed pages are always fetched sequentially.
+             Unlike getData, errors are raised as MSTRError instead of silently truncating the results
+        """
+        log.debug("MSTR Session Data pages request for %s", self._user)
+        if not self.isValid:
+            log.debug("MSTR Session Data pages request failed. Invalid session for %s", self._user)
+            return
+
+        _lpageSize = pPageSize if pPageSize is not None else self.PAGE_SIZE
+        _lworkers = pWorkers if pWorkers is not None else self.PAGE_WORKERS
+        _lurl = self.getInstancesURL(pMstrDataset)
+        _lheaders = self.getProjectHeader(pMstrProjectId)
+
+        r = self.request('POST', _lurl, pHeaders=_lheaders, pBody=self.getDataBody(pMstrObjectList, pMstrFilterList),
+                         pParams={"offset": 0, "limit": _lpageSize}, pStream=pStream)
+        page = MSTRStreamedResults(r) if pStream else MSTRDatasetResults(r.json())
+        yield page
+
+        if pStream:
+            # Paging information is only complete once the page has been read
+            page.consume()
+        _linstanceId = page.InstanceId
+        _ltotal = page.Total
+
+        def getPage(pOffset):
+            log.debug("MSTR Session Data page request offset %s of %s", pOffset, _ltotal)
+            rp = self.request('GET', _lurl + "/" + _linstanceId, pHeaders=_lheaders,
+                              pParams={"offset": pOffset, "limit": _lpageSize}, pStream=pStream)
+            return MSTRStreamedResults(rp) if pStream else MSTRDatasetResults(rp.json())
+
+        _loffsets = range(_lpageSize, _ltotal if _linstanceId is not None else 0, _lpageSize)
+
+        if pStream or _lworkers <= 1 or len(_loffsets) <= 1:
+            for _loffset in _loffsets:
+                page = getPage(_loffset)
+                yield page
+                if pStream:
+                    page.consume()
+            return
+
+        # Keep at most _lworkers pages in flight and hand them back in request order
+        executor = ThreadPoolExecutor(max_workers=_lworkers)
+        pending = deque()
+        try:
+            for _loffset in _loffsets:
+                pending.append(executor.submit(getPage, _loffset))
+                if len(pending) >= _lworkers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def iterData(self, pMstrDataset, pMstrObjectList=None, pMstrFilterList=None, pMstrProjectId=None,
+                 pPageSize=None, pWorkers=None, pStream=False):
+        """  Generator over the flattened rows of a dataset, fetched page by page (see getDataPages)"""
+        for page in self.getDataPages(pMstrDataset, pMstrObjectList, pMstrFilterList, pMstrProjectId, pPageSize,
+                                      pWorkers, pStream):
+            yield from page.iterRows()
+
+    def getColumnarData(self, pMstrDataset, pMstrObjectList=None, pMstrFilterList=None, pMstrProjectId=None,
+                        pPageSize=None, pWorkers=None, pUseCache=True):
+        """  Get the dataset decoded page by page into a MSTRColumnarResults (see getDataPages)
+             If the session has a resultCache, the same request (dataset, project, requested objects and view filter)
+             is read back memory-mapped from disk while the entry is valid
+        """
+        _lkey = None
+        if self.resultCache is not None and pUseCache:
+            _lkey = cache.MSTRResultCache.getKey(
+                pMstrDataset.Object.ID, self._getProjectId(pMstrProjectId),
+                self.getDataBody(pMstrObjectList, pMstrFilterList), self.getCacheVersion(pMstrDataset.Object))
+            _lfile = self.resultCache.get(_lkey)
+            if _lfile is not None:
+                try:
+                    return MSTRColumnarResults.load(_lfile)
+                except MSTRError:
+                    self.resultCache.invalidate(_lkey)
+
+        builder = None
+        for page in self.getDataPages(pMstrDataset, pMstrObjectList, pMstrFilterList, pMstrProjectId, pPageSize,
+                                      pWorkers):
+            if builder is None:
+                builder = MSTRColumnarBuilder(page.AttributeNames, page.MetricNames)
+            builder.add(page)
+        if builder is None:
+            return None
+
+        _lresults = builder.build()
+        if _lkey is not None:
+            self.resultCache.set(_lkey, _lresults.save)
+        return _lresults
+
+    def getColumnarDataForProjects(self, pMstrDataset, pProjects, pMstrObjectList=None, pMstrFilterList=None,
+                                   pPageSize=None, pWorkers=None, pProjectColumn="Project"):
+        """  Runs the same dataset in several projects (ID, alias or name, see searchForProject) and appends the
+             results, with an attribute pProjectColumn holding the name of the project of every row
+             Up to pWorkers projects (PROJECT_WORKERS by default) run concurrently, and never more than
+             MAX_SERVER_QUERIES against the server across the sessions of the process.
+             A project that fails is reported in the Errors of the MSTRProjectsResults instead of failing the rest
+        """
+        log.debug("MSTR Session Data request for %s projects for %s", len(pProjects), self._user)
+        _lresults = MSTRProjectsResults()
+        _lprojects = []
+        for _lproject in pProjects:
+            _lcurProject = self.searchForProject(_lproject)
+            if _lcurProject is None:
+                _lresults.Errors[_lproject] = MSTRError("Project %s not found" % _lproject)
+            else:
+                _lprojects.append((_lproject, _lcurProject))
+        if not _lprojects:
+            _lresults.Results = MSTRColumnarResults.concat([], pProjectColumn)
+            return _lresults
+
+        _lslots = self._getServerQuerySlots()
+
+        def query(pProject):
+            with _lslots:
+                return self.getColumnarData(pMstrDataset, pMstrObjectList, pMstrFilterList, pProject["id"],
+                                            pPageSize)
+
+        _lworkers = min(pWorkers if pWorkers is not None else self.PROJECT_WORKERS, len(_lprojects))
+        _lparts = []
+        with ThreadPoolExecutor(max_workers=_lworkers) as executor:
+            _lfutures = [(executor.submit(query, _lcurProject), _lproject, _lcurProject)
+                         for _lproject, _lcurProject in _lprojects]
+            for _lfuture, _lproject, _lcurProject in _lfutures:
+                try:
+                    _lpart = _lfuture.result()
+                except Exception as err:
+                    # Any failure of a project (ex. parsing errors) is reported without losing the others
+                    log.warning("MSTR Session Data request failed for project %s: %s", _lproject, err)
+                    _lresults.Errors[_lproject] = err
+                    continue
+                if _lpart is None:
+                    _lresults.Errors[_lproject] = MSTRError("Data request failed for project %s. Invalid session"
+                                                            % _lproject)
+                    continue
+                _lresults.Projects.append(_lcurProject["name"])
+                _lparts.append((_lcurProject["name"], _lpart))
+
+        _lresults.Results = MSTRColumnarResults.concat([p for _, p in _lparts], pProjectColumn,
+                                                       [n for n, _ in _lparts])
+        return _lresults
+
+    def _getServerQuerySlots(self):
+        with MSTRSession._serverQueryLock:
+            return MSTRSession._serverQuerySlots.setdefault(
+                self._mstr_url, threading.BoundedSemaphore(self.MAX_SERVER_QUERIES))
+
+    @staticmethod
+    def getDataBody(pMstrObjectList=None, pMstrFilterList=None):
+        """  Request body for the dataset instances: requested objects and view filter
+             pMstrFilterList is an expression list or a base.MSTRExpression, see MSTRViewFiler
+        """
+        body = {}
+
+        if pMstrObjectList is not None:
+            requestedObjects = dict(attributes=[dict(id=e.ID) for e in pMstrObjectList if isinstance(e, MSTRAttribute)],
+                                    forms=[dict(id=e.ID) for e in pMstrObjectList if isinstance(e, MSTRAttributeForm)],
+                                    metrics=[dict(id=e.ID) for e in pMstrObjectList if isinstance(e, MSTRMetric)])
+            body["requestedObjects"] = requestedObjects
+
+        if pMstrFilterList is not None:
+            filter = MSTRViewFiler(pMstrFilterList)
+            body.update(filter.todict())
+
+        return body
+
+    @staticmethod
+    def getDatasetMethod(pMstrObject):
+        """  REST resource of the dataset: cubes for Intelligent Cubes, reports otherwise"""
+        if pMstrObject.Subtype == base.EnumDSSSubTypes.DSSSUBTYPEREPORTCUBE:
+            return "cubes"
+        else:
+            return "reports"
+
+    def getInstancesURL(self, pMstrDataset):
+        return self.getDatasetInstancesURL(self._mstr_url, pMstrDataset)
+
+    @staticmethod
+    def getDatasetInstancesURL(pMstrURL, pMstrDataset):
+        """  URL of the instances of a report or cube, pMstrURL is the API URL (shared with MSTRAsyncSession)"""
+        return urljoin(pMstrURL, MSTRSession.getDatasetMethod(pMstrDataset.Object) + "/" + pMstrDataset.Object.ID) + \
+               '/instances'
+
     def searchForProject(self, pProject):
         """ 
         Searches for project in ID, Alias and Name (in this order until find first ocurrence)
         Need to check if multiple IS ar connected
         """
         log.debug("MSTR Session Default Project searching for %s", pProject)
-        # Search by ID
-        _lcurProject = next((elem for elem in self._projects if elem['id'] == pProject), None)
-        log.debug("MSTR Session Default Project searched by ID = %s", _lcurProject)
-
-        if _lcurProject is None:
-            # Search by Alias if there is an alias for the project
-            _lcurProject = next(
-                (elem for elem in self._projects if elem['alias'] == pProject and len(elem['alias']) > 0), None)
-            log.debug("MSTR Session Default Project searched by Alias = %s", _lcurProject)
-
-        if _lcurProject is None:
-            # Search by Name
-            _lcurProject = next((elem for elem in self._projects if elem['name'] == pProject), None)
-            log.debug("MSTR Session Default Project searched by Name = %s", _lcurProject)
+        return self.findProject(self._projects, pProject)
 
+    @staticmethod
+    def findProject(pProjects, pProject):
+        """  Searches for project in ID, Alias and Name of a project list or MSTRProjectIndex, see searchForProject"""
+        if not isinstance(pProjects, MSTRProjectIndex):
+            pProjects = MSTRProjectIndex(pProjects)
+        _lcurProject = pProjects.find(pProject)
+        log.debug("MSTR Session Default Project searched = %s", _lcurProject)
         return _lcurProject
 
     def quickSearchProject(self, pSearchString=None, pRootFolderId=None,
                            pSearchType=base.EnumDssXmlSearchType.DSSXMLSEARCHTYPECONTAINS,
-                           pObjectTypes=[base.EnumDSSObjectType.DSSTYPEREPORTDEFINITION], pMstrProjectId=None):
-        """  Get the list of projects available for the session"""
+                           pObjectTypes=[base.EnumDSSObjectType.DSSTYPEREPORTDEFINITION], pMstrProjectId=None,
+                           pPageSize=None):
+        """  Search objects in the project
+             The results are requested in pages of pPageSize objects (SEARCH_PAGE_SIZE by default) as they are
+             accessed, see MSTRSearchResults
+        """
         log.debug("MSTR Session Quick Search for %s", self._user)
         if self.isValid:
-            payload = {"pattern": pSearchType.value, "getAncestors": True}
-            if pSearchString is not None:
-                payload.update({"name": str(pSearchString)})
-
-            if pRootFolderId is not None:
-                payload.update({"root": str(pRootFolderId)})
+            payload = self.getSearchParams(pSearchString, pRootFolderId, pSearchType, pObjectTypes)
+            _lpageSize = pPageSize if pPageSize is not None else self.SEARCH_PAGE_SIZE
+            _lheaders = self.getProjectHeader(pMstrProjectId)
 
-            if isinstance(pObjectTypes, list):
-                payload.update({"type": list(map((lambda x: x.value), pObjectTypes))})
-
-            r = self.request('GET', urljoin(self._mstr_url, "searches/results"),
-                             pHeaders=self.getProjectHeader(pMstrProjectId), pParams=payload)
+            def fetchPage(pOffset, pLimit):
+                log.debug("MSTR Session Quick Search page %s for %s", pOffset, self._user)
+                return self.request('GET', urljoin(self._mstr_url, "searches/results"), pHeaders=_lheaders,
+                                    pParams=dict(payload, offset=pOffset, limit=pLimit)).json()
 
             log.debug("MSTR Session Quick Search for %s", self._user)
-            return MSTRSearchResults(r.json())
+            return MSTRSearchResults(fetchPage(0, _lpageSize), fetchPage, _lpageSize)
         else:
             log.debug("MSTR Session Quick Search failed. Invalid session for %s", self._user)
             return None
 
+    @staticmethod
+    def getSearchParams(pSearchString, pRootFolderId, pSearchType, pObjectTypes):
+        """  Query parameters of searches/results"""
+        payload = {"pattern": pSearchType.value, "getAncestors": True}
+        if pSearchString is not None:
+            payload.update({"name": str(pSearchString)})
+
+        if pRootFolderId is not None:
+            payload.update({"root": str(pRootFolderId)})
+
+        if isinstance(pObjectTypes, list):
+            payload.update({"type": list(map((lambda x: x.value), pObjectTypes))})
+
+        return payload
+
     def setDefaultProject(self, pProject):
         """  Set the default project to be used if none is selected.
         """
@@ -278,18 +685,23 @@ class MSTRSession:
 
         """
         log.debug("MSTR Session Dataset Definition for %s", self._user)
+        _lkey = self.getCacheKey(pMstrObject, pMstrProjectId, "definition")
+        _lcached = self._getCached(_lkey, pMstrObject)
+        if _lcached is not None:
+            return MSTRDatasetDefinition(pMstrObject, _lcached)
+
         if self.isValid:
 
-            if pMstrObject.Subtype == base.EnumDSSSubTypes.DSSSUBTYPEREPORTCUBE:
-                _lmethod = "cubes"
-            else:
-                _lmethod = "reports"
+            _lmethod = self.getDatasetMethod(pMstrObject)
             try:
                 r = self.request('GET', urljoin(self._mstr_url, _lmethod + "/" + pMstrObject.ID),
                                  pHeaders=self.getProjectHeader(pMstrProjectId))
 
                 log.debug("MSTR Session Dataset Definition for %s", self._user)
-                return MSTRDatasetDefinition(pMstrObject, r.json())
+                _ljson = r.json()
+                _ldefinition = MSTRDatasetDefinition(pMstrObject, _ljson)
+                self._setCached(_lkey, _ljson, pMstrObject)
+                return _ldefinition
             except MSTRError as err:
                 log.debug("MSTR Session Dataset Definition failed. HTTP Error: %s", err)
                 return None
@@ -297,31 +709,121 @@ class MSTRSession:
             log.debug("MSTR Session Dataset Definition failed. Invalid session for %s", self._user)
             return None
 
-    def request(self, pVerb, pURL, pHeaders={}, pBody=None, pParams={}, raiseError=True):
-        """  Runs request request        """
+    def getCacheKey(self, pMstrObject, pMstrProjectId, pKind):
+        """  Metadata cache key: project, object ID, object type and kind of information requested"""
+        return self.getObjectCacheKey(pMstrObject, self._getProjectId(pMstrProjectId), pKind)
+
+    @staticmethod
+    def getObjectCacheKey(pMstrObject, pProjectId, pKind):
+        """  Metadata cache key of an object in the project pProjectId (shared with MSTRAsyncSession)"""
+        return cache.MSTRCache.getObjectKey(pProjectId, pMstrObject.ID,
+                                            pMstrObject.Type.value if pMstrObject.Type is not None else None, pKind)
+
+    def _getProjectId(self, pMstrProjectId):
+        return self.getRequestProjectId(pMstrProjectId, self.currentProject)
+
+    @staticmethod
+    def getRequestProjectId(pMstrProjectId, pCurrentProject):
+        """  Project a request goes to: the one requested or the default project"""
+        return pMstrProjectId if pMstrProjectId is not None else (
+            pCurrentProject["id"] if pCurrentProject is not None else None)
+
+    @staticmethod
+    def getCacheVersion(pMstrObject):
+        """  Version the cached metadata must match: dateModified, or version if the server did not send it"""
+        return pMstrObject.DateModified if pMstrObject.DateModified is not None else pMstrObject.Version
+
+    def _getCached(self, pKey, pMstrObject):
+        if self.cache is None:
+            return None
+        return self.cache.get(pKey, self.getCacheVersion(pMstrObject))
+
+    def _setCached(self, pKey, pJson, pMstrObject):
+        if self.cache is not None:
+            self.cache.set(pKey, pJson, self.getCacheVersion(pMstrObject))
+
+    def request(self, pVerb, pURL, pHeaders={}, pBody=None, pParams={}, raiseError=True, pStream=False,
+                pReauthenticate=True):
+        """  Runs request request
+             With pStream the body is not read here, the caller consumes it (ex. with iter_content)
+             With pReauthenticate a 401 response logs in again and the request is replayed once
+             Every request is timed (see getRequestTiming) and logged with its status in INFO. Headers and bodies,
+             truncated to LOG_BODY_LIMIT, are only formatted when DEBUG is enabled
+        """
+        _ltoken = self._authToken.token
+        r = self._request(pVerb, pURL, pHeaders, pBody, pParams, raiseError and not pReauthenticate, pStream)
+        if r.status_code == 401 and pReauthenticate and self._passw is not None:
+            r.close()
+            self._reauthenticate(_ltoken)
+            r = self._request(pVerb, pURL, pHeaders, pBody, pParams, raiseError, pStream)
+        elif (r.status_code < 200 or r.status_code >= 300) and raiseError:
+            raise MSTRError(pjson=r.json())
+        return r
+
+    def _request(self, pVerb, pURL, pHeaders, pBody, pParams, raiseError, pStream):
+        _ldebug = log.root.isEnabledFor(log.DEBUG)
+        if _ldebug:
+            log.debug("Session Headers: %s", MSTRLogData(self._session.headers, self.LOG_BODY_LIMIT))
+            log.debug("Request Headers: %s", MSTRLogData(pHeaders, self.LOG_BODY_LIMIT))
+            log.debug("Request Content: %s", MSTRLogData(pBody, self.LOG_BODY_LIMIT))
+        _lstart = time.perf_counter()
         try:
-            log.debug("Session Headers: %s", self._session.headers)
-            log.debug("Request Headers: %s", pHeaders)
-            log.debug("Request Content: %s", pBody)
-            r = self._session.request(method=pVerb, url=pURL, headers=pHeaders, timeout=MSTRSession.REQ_TIMEOUT,
-                                      json=pBody, params=pParams)
-            # r.raise_for_status()
-            log.info("Open session Status code:" + str(r.status_code))
-            log.debug("Response Headers: %s", r.headers)
-            log.debug("Response Content: %s", r.content)
+            r = self._session.request(method=pVerb, url=pURL, headers=pHeaders, timeout=self._timeout,
+                                      json=pBody, params=pParams, stream=pStream)
+        except requests.exceptions.RequestException as e:
+            self._onRequest(self.getRequestTiming(pVerb, pURL, None, time.perf_counter() - _lstart, pStream, e),
+                            None)
+            raise MSTRError("Details: %s" % e, e)
+
+        _ltiming = self.getRequestTiming(pVerb, pURL, r, time.perf_counter() - _lstart, pStream)
+        log.info("MSTR Request %s %s status %s in %.3fs", pVerb, pURL, r.status_code, _ltiming["total"])
+        if _ldebug:
+            log.debug("MSTR Request timing: %s", _ltiming)
+            log.debug("Response Headers: %s", MSTRLogData(r.headers, self.LOG_BODY_LIMIT))
+            if not pStream:
+                log.debug("Response Content: %s", MSTRLogData(r.content, self.LOG_BODY_LIMIT))
+        self._onRequest(_ltiming, r)
 
+        try:
             if (r.status_code < 200 or r.status_code >= 300) and raiseError:
                 raise MSTRError(pjson=r.json())
         except ValueError as err:
             log.error(err)
             raise
-        except requests.exceptions.RequestException as e:
-            raise MSTRError("Details: %s" % r.text, e)
 
         return r
 
+    @staticmethod
+    def getRequestTiming(pVerb, pURL, pResponse, pTotal, pStream, pError=None):
+        """  Timing of a request in seconds: total, ttfb (until the response headers were parsed) and download
+             (reading the body, None when streamed as the caller reads it), and bytesOut/bytesIn of the bodies
+             requests does not expose DNS resolution and connection times, they are part of ttfb
+        """
+        timing = {"method": pVerb, "url": pURL, "status": None, "total": pTotal, "ttfb": None, "download": None,
+                  "bytesOut": 0, "bytesIn": None, "error": type(pError).__name__ if pError is not None else None}
+        if pResponse is not None:
+            timing["status"] = pResponse.status_code
+            ttfb = pResponse.elapsed.total_seconds() if pResponse.elapsed is not None else None
+            timing["ttfb"] = ttfb
+            if not pStream:
+                timing["download"] = max(pTotal - ttfb, 0.0) if ttfb is not None else None
+                timing["bytesIn"] = len(pResponse.content)
+            elif pResponse.headers.get("Content-Length", "").isdigit():
+                timing["bytesIn"] = int(pResponse.headers["Content-Length"])
+            body = pResponse.request.body if pResponse.request is not None else None
+            timing["bytesOut"] = len(body) if body is not None else 0
+        return timing
+
+    def _onRequest(self, pTiming, pResponse):
+        for hook in self.requestHooks:
+            try:
+                hook(pTiming, pResponse)
+            except Exception as e:
+                log.error("MSTR Session request hook %s failed: %s", hook, e)
+
 
 class MSTRObjDefinition:
+    __slots__ = ('_json',)
 
     def __init__(self, pJsonObjDefinition):
         self._json = pJsonObjDefinition
@@ -336,80 +838,817 @@ class MSTRDatasetResults(MSTRObjDefinition):
     """
     _attributes = []
     _metrics = []
+    _header = None
 
     def __init__(self, pJsonObjDefinition):
         super(MSTRDatasetResults, self).__init__(pJsonObjDefinition)
-        # print(pJsonObjDefinition)
+        self._parseDefinition(pJsonObjDefinition)
+
+    def _parseDefinition(self, pJsonObjDefinition):
+        self._json = pJsonObjDefinition
         try:
-            pass
+            self._attributes = [x["name"] for x in pJsonObjDefinition["result"]["definition"]["attributes"]]
+            # Reports with attributes only have no metrics in their definition nor in their leaves
+            self._metrics = [x["name"] for x in pJsonObjDefinition["result"]["definition"].get("metrics", [])]
+            self._header = MSTRResultHeader(self._attributes + self._metrics)
         except KeyError as e:
             log.error("Error parsing objects dataset definition")
             raise MSTRError(msg="Error parsing dataset definition", original_exception=e)
 
-    def getQueryResults(self, pJsonObjDefinition):
-        def getChildrenResults(pchildren, attrNames=[], pbase=[], pparent={}):
-            """ Recursive function to normalize the results """
+    @property
+    def InstanceId(self):
+        return self._json.get("instanceId", None)
 
-            for x in pchildren:
+    @property
+    def Paging(self):
+        return self._json.get("result", {}).get("data", {}).get("paging", {})
 
-                # Get attribute definition. Removes the key attributeForms for the initial version.
-                # Might be needed later...
-                t = {(attrNames[x["element"]["attributeIndex"]] if len(attrNames) > x["element"][
-                    "attributeIndex"] else "element" + str(x["depth"])): {k: x["element"][k] for k in x["element"] if
-                                                                          k != 'formValues'}}
-                t.update(pparent)
+    @property
+    def Total(self):
+        """ Total number of rows of the instance, not only the ones in this page """
+        return self.Paging.get("total", 0)
 
-                if "children" in x:
-                    getChildrenResults(x["children"], attrNames, pbase, t)
-                else:
-                    pbase.append({"attributes": t, "metrics": x["metrics"]})
+    @property
+    def AttributeNames(self):
+        return self._attributes
 
-            return pbase
+    @property
+    def MetricNames(self):
+        return self._metrics
 
+    @property
+    def Header(self):
+        """ Shared header of the rows returned by iterRows """
+        return self._header
+
+    def iterLeaves(self):
+        """ Walks result.data.root.children with an explicit stack, yielding for every leaf the list of elements
+            in its path, indexed by attributeIndex, and the leaf metrics.
+            The elements list is reused between leaves, copy it if it needs to be kept
+        """
+        nattrs = len(self._attributes)
+        current = [None] * nattrs
         try:
+            stack = [iter(self._json["result"]["data"]["root"].get("children", []))]
+            # Attribute set by the element of every level, cleared when the branch ends (ragged trees)
+            levels = [-1]
+            while stack:
+                x = next(stack[-1], None)
+                if levels[-1] >= 0:
+                    current[levels[-1]] = None
+                    levels[-1] = -1
+                if x is None:
+                    stack.pop()
+                    levels.pop()
+                    continue
+                element = x["element"]
+                if element["attributeIndex"] < nattrs:
+                    current[element["attributeIndex"]] = element
+                    levels[-1] = element["attributeIndex"]
 
-            rows = getChildrenResults(pJsonObjDefinition["result"]["data"]["root"]["children"],
-                                      [x["name"] for x in pJsonObjDefinition["result"]["definition"]["attributes"]])
+                if "children" in x:
+                    stack.append(iter(x["children"]))
+                    levels.append(-1)
+                else:
+                    yield current, x.get("metrics", {})
         except KeyError as e:
             log.error("Error parsing dataset results")
             raise MSTRError(msg="Error parsing dataset results", original_exception=e)
 
-    def getDataframeResults(self, pJsonObjDefinition):
-        def getChildrenResults(pchildren, attrNames=(), pbase=(), pparent={}):
-            """ Recursive function to normalize the results """
+    def iterRows(self):
+        """ Generator over the rows of the page as MSTRResultRow, with the element name of every attribute and
+            the raw value of every metric (None if the metric is missing)
+        """
+        header = metricNames = None
+        for elements, metrics in self.iterLeaves():
+            if header is None:
+                # Read after the first leaf, streamed results only know their definition at that point
+                header, metricNames = self._header, self._metrics
+            values = [e["name"] if e is not None else None for e in elements]
+            for name in metricNames:
+                m = metrics.get(name)
+                values.append(m["rv"] if m is not None else None)
+            yield MSTRResultRow(header, tuple(values))
+
+    def getQueryResults(self, pJsonObjDefinition=None):
+        """ List of rows as dicts with the attribute elements (without formValues) and the metrics of each leaf """
+        if pJsonObjDefinition is not None:
+            return MSTRDatasetResults(pJsonObjDefinition).getQueryResults()
+
+        rows = []
+        for elements, metrics in self.iterLeaves():
+            rows.append({"attributes": {name: {k: e[k] for k in e if k != 'formValues'}
+                                        for name, e in zip(self._attributes, elements) if e is not None},
+                         "metrics": metrics})
+        return rows
+
+    def getColumnarResults(self):
+        """ Decodes the page into a MSTRColumnarResults """
+        builder = MSTRColumnarBuilder(self._attributes, self._metrics)
+        builder.add(self)
+        return builder.build()
+
+    def getDataframeResults(self, pJsonObjDefinition=None):
+        """ Decodes the results into a pandas DataFrame with one categorical column per attribute """
+        if pJsonObjDefinition is not None:
+            return MSTRDatasetResults(pJsonObjDefinition).getDataframeResults()
+        return self.getColumnarResults().toPandas()
+
 
-            for x in pchildren:
+class MSTRStreamedResults(MSTRDatasetResults):
+    """  Dataset results decoded while the response is still being read (see stream.MSTRResultStreamParser).
+        The rows can be iterated only once. InstanceId, Total and the attribute and metric names are available
+        once the first row arrives, or after consume
+    """
+    CHUNK_SIZE = 64 * 1024  # Bytes read from the response at a time
+
+    def __init__(self, pResponse):
+        # The definition is parsed from the stream, not in the constructor
+        MSTRObjDefinition.__init__(self, None)
+        self._response = pResponse
+        self._parser = stream.MSTRResultStreamParser()
+
+    def iterLeaves(self):
+        if self._response is None:
+            raise MSTRError("The dataset results stream has already been read")
+        response, self._response = self._response, None
+        try:
+            for leaf in self._parser.iterLeaves(response.iter_content(self.CHUNK_SIZE)):
+                if self._json is None:
+                    self._parseDefinition(self._parser.Document)
+                yield leaf
+            # Skeleton of the whole response, including anything after the rows
+            self._parseDefinition(self._parser.Document)
+        except ValueError as e:
+            log.error("Error parsing dataset results stream")
+            raise MSTRError(msg="Error parsing dataset results stream", original_exception=e)
+        finally:
+            response.close()
+
+    def _getJson(self):
+        if self._json is None:
+            raise MSTRError("The dataset results stream has not been read yet, the definition and paging "
+                            "are available once the first row arrives, or after consume")
+        return self._json
 
-                # Get attribute definition. 
-                t = {(attrNames[x["element"]["attributeIndex"]] if len(attrNames) > x["element"][
-                    "attributeIndex"] else "element" + str(x["depth"])): x["element"]["name"]}
-                t.update(pparent)
+    @property
+    def InstanceId(self):
+        return self._getJson().get("instanceId", None)
 
-                if "children" in x:
-                    getChildrenResults(x["children"], attrNames, pbase, t)
+    @property
+    def Paging(self):
+        return self._getJson().get("result", {}).get("data", {}).get("paging", {})
+
+    def consume(self):
+        """ Reads what is left of the stream, discarding the rows """
+        if self._response is not None:
+            for _ in self.iterLeaves():
+                pass
+
+    def getColumnarResults(self):
+        raise MSTRError("Columnar decoding is not available for streamed results, use iterRows")
+
+
+class MSTRResultHeader:
+    """  Column names shared by all the rows of a result set """
+    __slots__ = ('names', 'index')
+
+    def __init__(self, pNames):
+        self.names = tuple(pNames)
+        self.index = {name: n for n, name in enumerate(self.names)}
+
+    def __len__(self):
+        return len(self.names)
+
+
+class MSTRResultRow(Mapping):
+    """  Compact read-only row: a tuple of values plus a reference to the shared MSTRResultHeader.
+        Values can be read by column name or by position
+    """
+    __slots__ = ('_header', '_values')
+
+    def __init__(self, pHeader, pValues):
+        self._header = pHeader
+        self._values = pValues
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return self._values[key]
+        return self._values[self._header.index[key]]
+
+    def __iter__(self):
+        return iter(self._header.names)
+
+    def __len__(self):
+        return len(self._values)
+
+    @property
+    def Values(self):
+        return self._values
+
+    def asdict(self):
+        return dict(zip(self._header.names, self._values))
+
+    def __repr__(self):
+        return "MSTRResultRow(" + repr(self.asdict()) + ")"
+
+
+class MSTRColumnarResults:
+    """  Column oriented dataset results
+        Attributes are dictionary encoded: an array of int codes per attribute plus the list of element names
+        (categories) the codes point to. Metrics are arrays of floats, with NaN for missing values
+    """
+
+    # Binary file format: magic, header length, JSON header and the column buffers aligned to 8 bytes
+    MAGIC = b'MSTRCOL1'
+    _ALIGN = 8
+
+    def __init__(self, pAttributes, pMetrics):
+        """ pAttributes: dict attribute name -> (categories list, codes array)
+            pMetrics: dict metric name -> values array
+        """
+        self._attributes = pAttributes
+        self._metrics = pMetrics
+        self._mmap = None
+
+    def save(self, pFile):
+        """ Writes the results to a binary file object in a format that load can memory-map """
+        columns = [(name, "attribute", codes, categories) for name, (categories, codes) in self._attributes.items()]
+        columns += [(name, "metric", values, None) for name, values in self._metrics.items()]
+
+        header = {"rows": len(self), "byteorder": sys.byteorder, "columns": []}
+        offset = 0
+        for name, kind, buffer, categories in columns:
+            column = {"name": name, "kind": kind, "format": "i" if kind == "attribute" else "d", "offset": offset}
+            if categories is not None:
+                column["categories"] = categories
+            header["columns"].append(column)
+            offset += self._aligned(memoryview(buffer).nbytes)
+
+        jheader = json.dumps(header).encode("utf-8")
+        start = self._aligned(len(self.MAGIC) + 8 + len(jheader))
+        pFile.write(self.MAGIC + len(jheader).to_bytes(8, "little") + jheader)
+        pFile.write(bytes(start - len(self.MAGIC) - 8 - len(jheader)))
+        for _, _, buffer, _ in columns:
+            data = memoryview(buffer).cast('B')
+            pFile.write(data)
+            pFile.write(bytes(self._aligned(len(data)) - len(data)))
+
+    @classmethod
+    def load(cls, pFileName):
+        """ Reads results saved with save. The columns are memory-mapped views of the file, not copies
+            Raises MSTRError if the file can not be read, is empty, truncated or not a columnar results file
+        """
+        try:
+            with open(pFileName, "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            raise MSTRError("Error reading columnar results file %s" % pFileName, e)
+        try:
+            if mm[:len(cls.MAGIC)] != cls.MAGIC:
+                raise ValueError("Not a columnar results file")
+            length = int.from_bytes(mm[len(cls.MAGIC):len(cls.MAGIC) + 8], "little")
+            header = json.loads(mm[len(cls.MAGIC) + 8:len(cls.MAGIC) + 8 + length])
+            if header["byteorder"] != sys.byteorder:
+                raise ValueError("Columnar results file saved with another byte order")
+            start = cls._aligned(len(cls.MAGIC) + 8 + length)
+            # Checked before any view of the file is taken, so the map can still be closed on errors
+            columns = []
+            for column in header["columns"]:
+                offset = start + column["offset"]
+                end = offset + header["rows"] * array(column["format"]).itemsize
+                if offset < start or end > len(mm):
+                    raise ValueError("Columnar results file truncated")
+                if column["format"] not in ("i", "d"):
+                    raise ValueError("Unknown column format %s" % column["format"])
+                columns.append((column["name"], column["format"], offset, end,
+                                column["categories"] if column["kind"] == "attribute" else None))
+        except (KeyError, TypeError, ValueError) as e:
+            mm.close()
+            raise MSTRError("Error reading columnar results file %s" % pFileName, e)
+
+        view = memoryview(mm)
+        attributes = {}
+        metrics = {}
+        for name, format, offset, end, categories in columns:
+            buffer = view[offset:end].cast(format)
+            if categories is not None:
+                attributes[name] = (categories, buffer)
+            else:
+                metrics[name] = buffer
+
+        results = cls(attributes, metrics)
+        results._mmap = mm
+        return results
+
+    @classmethod
+    def _aligned(cls, pSize):
+        return (pSize + cls._ALIGN - 1) // cls._ALIGN * cls._ALIGN
+
+    @classmethod
+    def concat(cls, pResults, pLabelColumn=None, pLabels=None):
+        """ Appends results with the same columns. The categories of every attribute are merged.
+            With pLabelColumn an attribute with that name is added, with the pLabels item of every results as
+            the element of its rows (ex. the project the results come from). It can not be a column of the results
+        """
+        pResults = list(pResults)
+        if not pResults:
+            return cls({pLabelColumn: ([], array('i'))} if pLabelColumn is not None else {}, {})
+        attributeNames = pResults[0].AttributeNames
+        metricNames = pResults[0].MetricNames
+        for results in pResults[1:]:
+            if results.AttributeNames != attributeNames or results.MetricNames != metricNames:
+                raise MSTRError("Columnar results with different columns can not be appended")
+        if pLabelColumn is not None and (pLabelColumn in attributeNames or pLabelColumn in metricNames):
+            raise MSTRError("Label column %s is already a column of the results" % pLabelColumn)
+
+        attributes = {}
+        if pLabelColumn is not None:
+            labels = list(dict.fromkeys(pLabels))
+            codes = array('i')
+            for results, label in zip(pResults, pLabels):
+                codes.extend(array('i', [labels.index(label)]) * len(results))
+            attributes[pLabelColumn] = (labels, codes)
+        for name in attributeNames:
+            lookup = {}
+            codes = array('i')
+            for results in pResults:
+                remap = [lookup.setdefault(c, len(lookup)) for c in results.getCategories(name)]
+                codes.extend(remap[c] if c >= 0 else -1 for c in results.getCodes(name))
+            attributes[name] = (list(lookup), codes)
+        metrics = {}
+        for name in metricNames:
+            values = array('d')
+            for results in pResults:
+                values.extend(results.getValues(name))
+            metrics[name] = values
+        return cls(attributes, metrics)
+
+    @property
+    def AttributeNames(self):
+        return list(self._attributes.keys())
+
+    @property
+    def MetricNames(self):
+        return list(self._metrics.keys())
+
+    def getCategories(self, pAttributeName):
+        return self._attributes[pAttributeName][0]
+
+    def getCodes(self, pAttributeName):
+        return self._attributes[pAttributeName][1]
+
+    def getValues(self, pMetricName):
+        return self._metrics[pMetricName]
+
+    def __len__(self):
+        for _, codes in self._attributes.values():
+            return len(codes)
+        for values in self._metrics.values():
+            return len(values)
+        return 0
+
+    def todict(self):
+        """ Plain python dict of lists, attributes decoded to element names (None for missing elements) """
+        retval = {}
+        for name, (categories, codes) in self._attributes.items():
+            retval[name] = [categories[c] if c >= 0 else None for c in codes]
+        for name, values in self._metrics.items():
+            retval[name] = values.tolist()
+        return retval
+
+    def toNumpy(self):
+        """ Dict of NumPy arrays. Attributes are returned as their int32 codes, see getCategories """
+        np = _importOptional("numpy")
+        retval = {}
+        for name, (_, codes) in self._attributes.items():
+            retval[name] = np.frombuffer(codes, dtype=np.int32) if len(codes) > 0 else np.empty(0, dtype=np.int32)
+        for name, values in self._metrics.items():
+            retval[name] = np.frombuffer(values, dtype=np.float64) if len(values) > 0 else np.empty(0)
+        return retval
+
+    def filter(self, pFilter):
+        """ Rows matching a view filter (expression list, base.MSTRExpression or MSTRViewFiler), evaluated locally,
+            see MSTRColumnarFilter
+        """
+        return MSTRColumnarFilter(self).filter(pFilter)
+
+    def take(self, pIndexes):
+        """ Results with the rows in pIndexes (list of row numbers or NumPy int array) """
+        attributes = {}
+        metrics = {}
+        if isinstance(pIndexes, list):
+            for name, (categories, codes) in self._attributes.items():
+                attributes[name] = (categories, array('i', [codes[i] for i in pIndexes]))
+            for name, values in self._metrics.items():
+                metrics[name] = array('d', [values[i] for i in pIndexes])
+        else:
+            for name, values in self.toNumpy().items():
+                column = array('i' if name in self._attributes else 'd')
+                column.frombytes(values[pIndexes].tobytes())
+                if name in self._attributes:
+                    attributes[name] = (self._attributes[name][0], column)
                 else:
-                    t.update({g: x["metrics"][g]["rv"] for g in x["metrics"].keys()})
-                    pbase.append(t)
+                    metrics[name] = column
+        return MSTRColumnarResults(attributes, metrics)
+
+    def toPandas(self):
+        """ pandas DataFrame with one categorical column per attribute and one float column per metric """
+        pd = _importOptional("pandas")
+        columns = {}
+        for name, values in self.toNumpy().items():
+            if name in self._attributes:
+                columns[name] = pd.Categorical.from_codes(values, categories=self._attributes[name][0])
+            else:
+                columns[name] = values
+        return pd.DataFrame(columns)
 
-            return pbase
 
+class MSTRProjectsResults:
+    """  Results of a dataset run in several projects, see MSTRSession.getColumnarDataForProjects
+        Results: MSTRColumnarResults of the projects that succeeded, Projects: their names,
+        Errors: dict project requested -> exception of the ones that failed
+    """
+
+    def __init__(self):
+        self.Results = None
+        self.Projects = []
+        self.Errors = {}
+
+    @property
+    def isComplete(self):
+        return not self.Errors
+
+
+class MSTRColumnarFilter:
+    """  Evaluates view filters over MSTRColumnarResults without calling the server.
+        Attribute predicates are evaluated once per element (category) and mapped to the rows through the codes,
+        metric predicates run on the values. Rows with missing values do not match, not even negated (ex.
+        ~(metric > 10)): as in SQL, every node is evaluated to the rows where it is true and the rows where it is
+        false, and missing values are neither.
+        Forms are compared with the element names in the results, as those are the only values kept.
+        Uses NumPy masks if it is installed and Python lists otherwise
+    """
+
+    _LIKE = re.compile(r'[%_]|[^%_]+')
+
+    COMPARISONS = {
+        'Equals': operator.eq,
+        'NotEquals': operator.ne,
+        'Greater': operator.gt,
+        'GreaterEqual': operator.ge,
+        'Less': operator.lt,
+        'LessEqual': operator.le,
+    }
+
+    TEXT = {
+        'BeginsWith': lambda v, c: v.startswith(c),
+        'EndsWith': lambda v, c: v.endswith(c),
+        'Contains': lambda v, c: c in v,
+        'Like': lambda v, c: MSTRColumnarFilter.likePattern(c).fullmatch(v) is not None,
+    }
+
+    def __init__(self, pResults):
+        self._results = pResults
+        try:
+            self._np = importlib.import_module("numpy")
+        except ImportError:
+            self._np = None
+        self._numpyColumns = None
+
+    @classmethod
+    def likePattern(cls, pPattern):
+        """ Regular expression of a Like pattern (% any characters, _ one character) """
+        return re.compile("".join(".*" if t == "%" else "." if t == "_" else re.escape(t)
+                                  for t in cls._LIKE.findall(pPattern)), re.DOTALL)
+
+    def filter(self, pFilter):
+        mask = self.getMask(pFilter)
+        if self._np is not None:
+            return self._results.take(self._np.flatnonzero(mask))
+        return self._results.take([i for i, match in enumerate(mask) if match])
+
+    def getMask(self, pFilter):
+        """ Boolean mask (NumPy array or list) of the rows matching the filter """
+        tree = pFilter.Tree if isinstance(pFilter, MSTRViewFiler) else MSTRViewFiler.buildExpressionTree(pFilter)
+        masks = {}
+        stack = [(tree, False)]
+        while stack:
+            node, visited = stack.pop()
+            logical = isinstance(node.key, str) and node.key in ('And', 'Or', 'Not')
+            if not visited:
+                stack.append((node, True))
+                if logical:
+                    stack.extend((c, False) for c in node.children)
+                continue
+            if logical:
+                masks[id(node)] = self._combine(node.key, [masks.pop(id(c)) for c in node.children])
+            else:
+                masks[id(node)] = self._predicate(node)
+        return masks[id(tree)][0]
+
+    def _combine(self, pOperator, pMasks):
+        """ (true, false) masks of the operator from the (true, false) masks of its operands """
+        if pOperator == 'Not':
+            return pMasks[0][1], pMasks[0][0]
+        trues = [m[0] for m in pMasks]
+        falses = [m[1] for m in pMasks]
+        # And is true if all the operands are and false if any is, Or the other way round
+        if pOperator == 'And':
+            return self._reduce(trues, True), self._reduce(falses, False)
+        return self._reduce(trues, False), self._reduce(falses, True)
+
+    def _reduce(self, pMasks, pAll):
+        np = self._np
+        if np is not None:
+            return (np.logical_and if pAll else np.logical_or).reduce(pMasks)
+        reduce = all if pAll else any
+        return [reduce(row) for row in zip(*pMasks)]
+
+    def _getColumn(self, pObject):
+        if isinstance(pObject, MSTRAttributeForm):
+            name, isAttribute = pObject.Attribute.Name, True
+        elif isinstance(pObject, MSTRAttribute):
+            name, isAttribute = pObject.Name, True
+        elif isinstance(pObject, MSTRMetric):
+            name, isAttribute = pObject.Name, False
+        else:
+            raise MSTRError("Filter operand %s is not a column" % pObject)
+        if name not in (self._results.AttributeNames if isAttribute else self._results.MetricNames):
+            raise MSTRError("Column %s is not in the results" % name)
+        return name, isAttribute
+
+    def _getTest(self, pOperator, pConstant):
+        """ Function of a value for the operator and constant, whether values must be converted to float and
+            whether the result is negated (NotContains, NotLike...)
+        """
+        negate = pOperator.startswith("Not") and pOperator[3:] in self.TEXT
+        key = pOperator[3:] if negate else pOperator
+        isReal = pConstant.DataType == "Real"
+        if key == "In":
+            values = set(float(v) for v in pConstant.Value) if isReal else set(pConstant.Value)
+            return (lambda v: v in values), isReal, False
+        if key in self.COMPARISONS:
+            function, constant = self.COMPARISONS[key], float(pConstant.Value) if isReal else pConstant.Value
+            return (lambda v: function(v, constant)), isReal, False
+        if key in self.TEXT:
+            function, constant = self.TEXT[key], pConstant.Value
+            return (lambda v: function(v, constant)), False, negate
+        raise MSTRError("Operator %s can not be evaluated locally" % pOperator)
+
+    def _predicate(self, pNode):
+        """ (true, false) masks of a comparison, rows with missing values are in neither """
+        if len(pNode.children) != 2 or not isinstance(pNode.children[1].key, base.MSTRConstant):
+            raise MSTRError("Filter %s can not be evaluated locally" % pNode.key)
+        name, isAttribute = self._getColumn(pNode.children[0].key)
+        test, isReal, negate = self._getTest(pNode.key, pNode.children[1].key)
+        np = self._np
+
+        if isAttribute:
+            trues, falses = [], []
+            for category in self._results.getCategories(name):
+                try:
+                    match = bool(test(float(category) if isReal else category))
+                except (TypeError, ValueError):
+                    trues.append(False)
+                    falses.append(False)
+                    continue
+                trues.append(match != negate)
+                falses.append(match == negate)
+            # Code -1 (missing element) picks the last item, that is neither true nor false
+            trues.append(False)
+            falses.append(False)
+            if np is not None:
+                codes = self._toNumpy()[name]
+                return np.array(trues, dtype=bool)[codes], np.array(falses, dtype=bool)[codes]
+            codes = self._results.getCodes(name)
+            return [trues[c] for c in codes], [falses[c] for c in codes]
+
+        if isReal and pNode.key in self.COMPARISONS and np is not None:
+            values = self._toNumpy()[name]
+            present = ~np.isnan(values)
+            match = self.COMPARISONS[pNode.key](values, float(pNode.children[1].key.Value))
+            return match & present, ~match & present
+        if not isReal and pNode.key != "In":
+            raise MSTRError("Operator %s can not be evaluated on metric %s" % (pNode.key, name))
+        trues, falses = [], []
+        for v in self._results.getValues(name):
+            match = v == v and test(v)
+            trues.append(match)
+            falses.append(v == v and not match)
+        if np is not None:
+            return np.array(trues, dtype=bool), np.array(falses, dtype=bool)
+        return trues, falses
+
+    def _toNumpy(self):
+        if self._numpyColumns is None:
+            self._numpyColumns = self._results.toNumpy()
+        return self._numpyColumns
+
+
+class MSTRColumnarBuilder:
+    """  Decodes dataset results pages into column arrays.
+        Each page tree (result.data.root.children) is walked once, filling arrays preallocated to the page size
+    """
+
+    def __init__(self, pAttributeNames, pMetricNames):
+        self._attributeNames = list(pAttributeNames)
+        self._metricNames = list(pMetricNames)
+        self._lookups = [{} for _ in self._attributeNames]
+        self._codes = [array('i') for _ in self._attributeNames]
+        self._values = [array('d') for _ in self._metricNames]
+
+    def add(self, pDatasetResults):
+        """ Adds the rows of a MSTRDatasetResults page """
         try:
+            children = pDatasetResults._json["result"]["data"]["root"].get("children", [])
+            size = pDatasetResults.Paging.get("current", None)
+            if size is None:
+                size = self._countLeaves(children)
+
+            nattrs = len(self._attributeNames)
+            codes = [array('i', [-1]) * size for _ in range(nattrs)]
+            values = [array('d', [nan]) * size for _ in self._metricNames]
+            lookups = self._lookups
+            current = [-1] * nattrs
+            row = 0
+
+            stack = [iter(children)]
+            # Attribute set by the element of every level, cleared when the branch ends (ragged trees)
+            levels = [-1]
+            while stack:
+                x = next(stack[-1], None)
+                if levels[-1] >= 0:
+                    current[levels[-1]] = -1
+                    levels[-1] = -1
+                if x is None:
+                    stack.pop()
+                    levels.pop()
+                    continue
+                element = x["element"]
+                index = element["attributeIndex"]
+                if index < nattrs:
+                    lookup = lookups[index]
+                    code = lookup.get(element["name"])
+                    if code is None:
+                        code = lookup[element["name"]] = len(lookup)
+                    current[index] = code
+                    levels[-1] = index
 
-            rows = getChildrenResults(pJsonObjDefinition["result"]["data"]["root"]["children"],
-                                      [x["name"] for x in pJsonObjDefinition["result"]["definition"]["attributes"]])
+                if "children" in x:
+                    stack.append(iter(x["children"]))
+                    levels.append(-1)
+                    continue
+
+                if row == size:
+                    # The page had more rows than announced by the paging information
+                    for c in codes:
+                        c.append(-1)
+                    for v in values:
+                        v.append(nan)
+                    size += 1
+                for a in range(nattrs):
+                    codes[a][row] = current[a]
+                metrics = x.get("metrics", {})
+                for m, name in enumerate(self._metricNames):
+                    values[m][row] = self._tofloat(metrics.get(name))
+                row += 1
         except KeyError as e:
             log.error("Error parsing dataset results")
             raise MSTRError(msg="Error parsing dataset results", original_exception=e)
 
+        for a in range(nattrs):
+            self._codes[a].extend(codes[a][:row])
+        for m in range(len(self._metricNames)):
+            self._values[m].extend(values[m][:row])
+
+    def build(self):
+        return MSTRColumnarResults(
+            {name: (list(self._lookups[a].keys()), self._codes[a]) for a, name in enumerate(self._attributeNames)},
+            {name: self._values[m] for m, name in enumerate(self._metricNames)})
+
+    @staticmethod
+    def _tofloat(pMetric):
+        if pMetric is None:
+            return nan
+        try:
+            return float(pMetric["rv"])
+        except (TypeError, ValueError):
+            return nan
+
+    @staticmethod
+    def _countLeaves(pChildren):
+        count = 0
+        stack = [pChildren]
+        while stack:
+            for x in stack.pop():
+                if "children" in x:
+                    stack.append(x["children"])
+                else:
+                    count += 1
+        return count
+
+
+def _importOptional(pModule):
+    """ Imports an optional dependency, raising MSTRError if it is not installed """
+    try:
+        return importlib.import_module(pModule)
+    except ImportError as e:
+        raise MSTRError("%s is required for this operation" % pModule, e)
+
+
+def _intern(pValue):
+    """ Interned string, other values unchanged """
+    return sys.intern(pValue) if type(pValue) is str else pValue
+
 
 class MSTRViewFiler:
+    """  View filter from an infix expression list of '(', ')', operators, objects and MSTRConstant, or from a
+        base.MSTRExpression built with the operators of forms and metrics (ex. (form == "North") & (metric > 10))
+        The filter is compiled once per shape: filters with the same objects and operators and different constants
+        share a compiled MSTRViewFilterTemplate (see compile), and todict only binds the constants
+    """
+
+    TEMPLATE_CACHE_SIZE = 256  # Filter shapes kept compiled
+
+    _templates = OrderedDict()
+    _templatesLock = threading.Lock()
 
     _expressions = None
     _tree = None
 
     def __init__(self,expressionList):
         self._expressions = expressionList
-        self._tree = self.buildParseTree(expressionList)
+        self._template = self.compile(expressionList)
+
+    @property
+    def Template(self):
+        return self._template
+
+    @property
+    def Tree(self):
+        """  Expression tree of the list (see buildExpressionTree), built on first use"""
+        if self._tree is None:
+            self._tree = self.buildExpressionTree(self._expressions)
+        return self._tree
+
+    @classmethod
+    def buildExpressionTree(cls, fplist, pConstants=None):
+        """  N-ary base.ExpressionTree of the list or expression, with And/Or chains flattened and Or of Equals as In
+             pConstants replaces the constants, in order
+        """
+        if isinstance(fplist, base.MSTRExpression):
+            return fplist.toTree(pConstants)
+        if pConstants is not None:
+            constants = iter(pConstants)
+            fplist = [next(constants) if isinstance(i, base.MSTRConstant) else i for i in fplist]
+        return base.ExpressionTree.fromBinaryTree(cls.buildParseTree(fplist))
+
+    @property
+    def Constants(self):
+        return self.getConstants(self._expressions)
+
+    @staticmethod
+    def getConstants(fplist):
+        if isinstance(fplist, base.MSTRExpression):
+            return fplist.Constants
+        return [i for i in fplist if isinstance(i, base.MSTRConstant)]
+
+    @staticmethod
+    def getShapeKey(fplist):
+        """  Structure of an expression list or expression: everything but the values of the constants"""
+        if isinstance(fplist, base.MSTRExpression):
+            return fplist.ShapeKey
+        key = []
+        for i in fplist:
+            if isinstance(i, str):
+                key.append(i)
+            elif isinstance(i, base.MSTRConstants):
+                key.append(("constants", i.DataType))
+            elif isinstance(i, base.MSTRConstant):
+                key.append(("constant", i.DataType))
+            elif isinstance(i, base.MSTROperator):
+                key.append(("operator", i.Expression))
+            else:
+                key.append(("object", json.dumps(i.todict(), sort_keys=True)))
+        return tuple(key)
+
+    @classmethod
+    def compile(cls, fplist):
+        """  Template of the expression list shape, compiled once and cached (up to TEMPLATE_CACHE_SIZE shapes)"""
+        key = cls.getShapeKey(fplist)
+        with cls._templatesLock:
+            template = cls._templates.get(key)
+            if template is not None:
+                cls._templates.move_to_end(key)
+                return template
+
+        template = MSTRViewFilterTemplate(fplist)
+        with cls._templatesLock:
+            cls._templates[key] = template
+            while len(cls._templates) > cls.TEMPLATE_CACHE_SIZE:
+                cls._templates.popitem(last=False)
+        return template
 
     @staticmethod
     def buildParseTree(fplist):
@@ -419,16 +1658,25 @@ class MSTRViewFiler:
         pstack.push(etree)
         currenttree = etree
         for n, i in enumerate(fplist):
-            if i == '(':
+            # Forms and metrics overload ==, so the parentheses are compared only with strings
+            isstr = isinstance(i, str)
+            if isstr and i == '(':
                 if not isinstance(fplist[n + 1], base.MSTRUnaryOperator):
                     currenttree.insertLeft('')
                     pstack.push(currenttree)
                     currenttree = currenttree.getLeftChild()
-            elif not isinstance(i, base.MSTROperator) and i != ')':
+            elif not isinstance(i, base.MSTROperator) and not (isstr and i == ')'):
                 currenttree.setRootVal(i)
                 parent = pstack.pop()
                 currenttree = parent
             elif isinstance(i, base.MSTRBinaryOperator):
+                if isinstance(currenttree.getRootVal(), str) and currenttree.getRootVal() != '' and \
+                        currenttree.getRightChild() is not None:
+                    # Chain without parentheses (a And b And c), grouped from the left
+                    previous = base.BinaryTree(currenttree.getRootVal())
+                    previous.insertLeft(currenttree.getLeftChild())
+                    previous.insertRight(currenttree.getRightChild())
+                    currenttree.insertLeft(previous)
                 currenttree.setRootVal(i.Expression)
                 currenttree.insertRight('')
                 pstack.push(currenttree)
@@ -438,7 +1686,7 @@ class MSTRViewFiler:
                 currenttree.insertLeft('')
                 pstack.push(currenttree)
                 currenttree = currenttree.getLeftChild()
-            elif i == ')':
+            elif isstr and i == ')':
                 currenttree = pstack.pop()
             else:
                 raise ValueError
@@ -448,35 +1696,120 @@ class MSTRViewFiler:
 
 
     def todict(self):
-        return  self._tree.todict()
+        return self._template.bind(self.Constants)
+
+    def tojson(self):
+        return self._template.bindJSON(self.Constants)
+
+
+class MSTRViewFilterTemplate:
+    """  Compiled view filter shape. The viewFilter JSON is kept split around the values of the constants, so
+        binding new values is a string interleave instead of a parse and a tree walk
+    """
+
+    _SLOT = "\x00slot%s\x00"
+
+    def __init__(self, fplist):
+        constants = MSTRViewFiler.getConstants(fplist)
+        slots = [c.DataType for c in constants]
+        self._slots = slots
+        self._lists = [isinstance(c, base.MSTRConstants) for c in constants]
+        # Same class, so lists of constants are still In values
+        placeholders = [type(c)(self._SLOT % n, c.DataType) for n, c in enumerate(constants)]
+        text = json.dumps({"viewFilter": MSTRViewFiler.buildExpressionTree(fplist, placeholders).todict()})
+        self._fragments = []
+        for n in range(len(slots)):
+            head, found, text = text.partition(json.dumps(self._SLOT % n))
+            if not found:
+                raise ValueError("Constant %s is not an operand of the filter expression" % n)
+            self._fragments.append(head)
+        self._fragments.append(text)
 
+    @property
+    def Slots(self):
+        """  Data types of the constants to bind, in order"""
+        return list(self._slots)
+
+    def bindJSON(self, pValues):
+        """  viewFilter JSON text with the values (MSTRConstant or plain values) in the slots"""
+        if len(pValues) != len(self._slots):
+            raise ValueError("Filter template expects %s values, got %s" % (len(self._slots), len(pValues)))
+        parts = [self._fragments[0]]
+        for value, isList, fragment in zip(pValues, self._lists, self._fragments[1:]):
+            if isinstance(value, base.MSTRConstant):
+                value = value.Value
+            elif isList:
+                value = [str(v) for v in value]
+            else:
+                value = str(value)
+            parts.append(json.dumps(value))
+            parts.append(fragment)
+        return "".join(parts)
+
+    def bind(self, pValues):
+        """  viewFilter dict with the values in the slots, see bindJSON"""
+        return json.loads(self.bindJSON(pValues))
+
+
+
+class MSTRAncestor(namedtuple("MSTRAncestor", ("id", "name", "level"))):
+    """  Immutable folder in the path of an object (see MSTRObject.Ancestors). Fields are read as attributes or by
+        key as in the JSON (ex. ancestor["name"]); other keys of the JSON are not kept
+    """
+    __slots__ = ()
+
+    def __getitem__(self, pKey):
+        if isinstance(pKey, str):
+            try:
+                return tuple.__getitem__(self, self._fields.index(pKey))
+            except ValueError:
+                raise KeyError(pKey)
+        return tuple.__getitem__(self, pKey)
+
+    def get(self, pKey, pDefault=None):
+        return self[pKey] if pKey in self._fields else pDefault
 
 
 class MSTRObject:
     """  Base MSTR Object
-    The constructor receives an optional param with json object definition"""
-
-    _name = None
-    _type = None
-    _abbreviation = None
-    _description = None
-    _hidden = None
-    _subtype = None
-    _extType = None
-    _dateCreated = None
-    _dateModified = None
-    _version = None
-    _acg = None
-    _iconPath = None
-    _viewMedia = None
-    _comments = []
-    _ancestors = []
+    The constructor receives an optional param with json object definition
+    Objects use __slots__ and interned IDs, and objects in the same folder share one Ancestors tuple (see
+    getAncestors), to keep large catalogs small. For bulk loads see MSTRObjectTable"""
+
+    __slots__ = ('_ID', '_name', '_type', '_abbreviation', '_description', '_hidden', '_subtype', '_extType',
+                 '_dateCreated', '_dateModified', '_version', '_acg', '_iconPath', '_viewMedia', '_comments',
+                 '_ancestors')
+
+    ANCESTOR_PATHS = 65536  # Distinct ancestor paths shared by getAncestors before starting over
+
+    _ancestorPaths = {}
+    _ancestorLock = threading.Lock()
 
     def __init__(self, Id, pJsonObjDefinition=None):
-        self._ID = Id
+        self._ID = _intern(Id)
+        self._name = self._type = self._abbreviation = self._description = self._hidden = self._subtype = None
+        self._extType = self._dateCreated = self._dateModified = self._version = self._acg = None
+        self._iconPath = self._viewMedia = self._comments = None
+        self._ancestors = ()
         if pJsonObjDefinition is not None:
             self.update(pJsonObjDefinition)
 
+    @classmethod
+    def getAncestors(cls, pAncestors):
+        """ Ancestors (folder path) list of an object JSON as a tuple of MSTRAncestor, the same tuple for the
+            objects of the same folder
+        """
+        if not pAncestors:
+            return ()
+        path = tuple(MSTRAncestor(a.get("id"), a.get("name"), a.get("level")) for a in pAncestors)
+        with cls._ancestorLock:
+            shared = cls._ancestorPaths.get(path)
+            if shared is None:
+                if len(cls._ancestorPaths) >= cls.ANCESTOR_PATHS:
+                    cls._ancestorPaths.clear()
+                shared = cls._ancestorPaths[path] = path
+        return shared
+
     def update(self, pJsonObjDefinition):
 
         self._name = pJsonObjDefinition.get("name", None)
@@ -501,8 +1834,8 @@ class MSTRObject:
         self._acg = pJsonObjDefinition.get("acg", None)
         self._iconPath = pJsonObjDefinition.get("iconPath", None)
         self._viewMedia = pJsonObjDefinition.get("viewMedia", None)
-        self._comments = pJsonObjDefinition.get("comments", [])
-        self._ancestors = pJsonObjDefinition.get("ancestors", [])
+        self._comments = pJsonObjDefinition.get("comments", None)
+        self._ancestors = self.getAncestors(pJsonObjDefinition.get("ancestors", None))
 
     # Read only properties
     @property
@@ -563,7 +1896,7 @@ class MSTRObject:
 
     @property
     def Comments(self):
-        return self._comments
+        return self._comments if self._comments is not None else []
 
     @property
     def Ancestors(self):
@@ -578,7 +1911,7 @@ class MSTRObject:
             self._dateCreated) + " | DateModified: " + str(self._dateModified) + " | Version: " + str(
             self._version) + " | Acg: " + str(self._acg) + "  | IconPath: " + str(
             self._iconPath) + " | ViewMedia: " + str(self._viewMedia) + " | Comments: " + str(
-            self._comments) + " | Ancestors: " + str(self._ancestors)
+            self.Comments) + " | Ancestors: " + str(list(self._ancestors))
         # .format(self._ID,self._name,str(self._type),self._abbreviation,self._description,self._hidden,str(self._subtype),self._extType,self._dateCreated,self._dateModified,self._version,self._acg,self._iconPath,self._viewMedia,self._comments,self._ancestors)
 
     def __str__(self):
@@ -627,22 +1960,27 @@ class AuthorizationToken:
         return "token:[{0}] - isValid: {1} - issuedOn: {2}".format(self.token, self.isValid, self.issuedOn)
 
 
-class MSTRAttributeForm(MSTRObjDefinition):
-    _parent = None
-    _formID = None
-    _formName = None
-    _formDataType = None
+class MSTRAttributeForm(MSTRObjDefinition, base.MSTRFilterOperand):
+    """  Form of an attribute. Python operators on a form build filter expressions, see base.MSTRFilterOperand"""
+
+    # Form data types sent as Real constants
+    NUMERIC_TYPES = frozenset(["Real", "Integer", "Numeric", "Decimal", "Double", "Float", "BigDecimal", "Long",
+                               "Short", "Unsigned"])
+
+    __slots__ = ('_parent', '_formID', '_formName', '_formDataType')
 
     def __init__(self, parent, pJsonObjDefinition=None):
         super(MSTRAttributeForm, self).__init__(pJsonObjDefinition)
         self._parent = parent
+        self._formID = self._formName = self._formDataType = None
         if pJsonObjDefinition is not None:
             self.update(pJsonObjDefinition)
 
     def update(self, pJsonObjDefinition):
-        self._formID = pJsonObjDefinition.get("id", None)
-        self._formName = pJsonObjDefinition.get("name", None)
-        self._formDataType = pJsonObjDefinition.get("dataType", None)
+        # The same forms (ex. ID, DESC) repeat in every attribute
+        self._formID = _intern(pJsonObjDefinition.get("id", None))
+        self._formName = _intern(pJsonObjDefinition.get("name", None))
+        self._formDataType = _intern(pJsonObjDefinition.get("dataType", None))
 
     @property
     def Attribute(self):
@@ -660,10 +1998,19 @@ class MSTRAttributeForm(MSTRObjDefinition):
     def DataType(self):
         return self._formDataType
 
+    @property
+    def ConstantDataType(self):
+        if self._formDataType in self.NUMERIC_TYPES:
+            return "Real"
+        return self._formDataType
+
     def todict(self):
         return dict(type="form", attribute=dict(id=self.Attribute.ID, name=self.Attribute.Name),
                     form=dict(id=self.ID, name=self.Name))
 
+    def getIdentity(self):
+        return type(self).__name__, self.Attribute.ID, self.ID
+
     def __repr__(self):
         """ Textual representation of the object """
         return " | Form ID: " + str(self._formID) + " | Form Name: " + str(self._formName) + " | Form DataType: " + \
@@ -671,12 +2018,11 @@ class MSTRAttributeForm(MSTRObjDefinition):
 
 
 class MSTRAttribute(MSTRObject):
-    _forms = {}
+    __slots__ = ('_forms',)
 
     def __init__(self, ID, pJsonObjDefinition=None):
+        self._forms = {}
         super(MSTRAttribute, self).__init__(ID, pJsonObjDefinition)
-        if pJsonObjDefinition is not None:
-            self.update(pJsonObjDefinition)
 
     def update(self, pJsonObjDefinition):
         super(MSTRAttribute, self).update(pJsonObjDefinition)
@@ -694,13 +2040,15 @@ class MSTRAttribute(MSTRObject):
         return super().__repr__() + " | Forms: " + str(self._forms)
 
 
-class MSTRMetric(MSTRObject):
-    _isDerived = False
+class MSTRMetric(MSTRObject, base.MSTRFilterOperand):
+    """  Metric. Python operators on a metric build filter expressions, see base.MSTRFilterOperand"""
+    __slots__ = ('_isDerived',)
+
+    ConstantDataType = "Real"
 
     def __init__(self, ID, pJsonObjDefinition=None):
+        self._isDerived = False
         super(MSTRMetric, self).__init__(ID, pJsonObjDefinition)
-        if pJsonObjDefinition is not None:
-            self.update(pJsonObjDefinition)
 
     def update(self, pJsonObjDefinition):
         super(MSTRMetric, self).update(pJsonObjDefinition)
@@ -764,21 +2112,261 @@ class MSTRDatasetDefinition(MSTRObjDefinition):
         return "Attributes: [{0}]\nMetrics:[{1}]".format(retvalA, retvalM)
 
 
-class MSTRSearchResults:
-    _results = []
+class MSTRProjectIndex:
+    """  Projects of a session indexed by ID, alias and name, see MSTRSession.searchForProject
+        Names are matched exactly first and then case insensitive. With repeated keys the first project wins
+    """
+
+    def __init__(self, pProjects):
+        self._projects = list(pProjects)
+        self._byId = {}
+        self._byAlias = {}
+        self._byName = {}
+        self._byFoldedName = {}
+        for elem in self._projects:
+            self._byId.setdefault(elem['id'], elem)
+            if elem.get('alias'):
+                self._byAlias.setdefault(elem['alias'], elem)
+            if elem.get('name') is not None:
+                self._byName.setdefault(elem['name'], elem)
+                self._byFoldedName.setdefault(elem['name'].casefold(), elem)
+
+    def find(self, pProject):
+        """  Project with ID, Alias or Name pProject (in this order) or None"""
+        _lcurProject = self._byId.get(pProject)
+        if _lcurProject is None:
+            _lcurProject = self._byAlias.get(pProject)
+        if _lcurProject is None:
+            _lcurProject = self._byName.get(pProject)
+        if _lcurProject is None and isinstance(pProject, str):
+            _lcurProject = self._byFoldedName.get(pProject.casefold())
+        return _lcurProject
+
+    def __len__(self):
+        return len(self._projects)
+
+    def __iter__(self):
+        return iter(self._projects)
+
+
+class MSTRSearchResults(Sequence):
+    """  Lazy sequence of the objects found by a search, supports len, indexes and slices
+        pJsonSearchResult is the first page of results. With pFetchPage(offset, limit), that returns the JSON of
+        another page, the rest of the totalItems are requested in pages of pPageSize when accessed, and the page
+        after the one accessed is requested in the background.
+        MSTRObject instances are only built for the rows accessed
+    """
+
+    PREFETCH_WORKERS = 4  # Background page requests across all the search results of the process
+
+    _prefetchExecutor = None
+    _prefetchLock = threading.Lock()
 
-    def __init__(self, pJsonSearchResult):
-        self._results = list(map((lambda x: MSTRObject(x["id"], x)), pJsonSearchResult.get("result", [])))
+    def __init__(self, pJsonSearchResult, pFetchPage=None, pPageSize=None):
+        _lrows = pJsonSearchResult.get("result", [])
+        self._fetchPage = pFetchPage
+        self._pageSize = pPageSize if pPageSize is not None else max(len(_lrows), 1)
+        self._total = pJsonSearchResult.get("totalItems", len(_lrows)) if pFetchPage is not None else len(_lrows)
+        self._pages = {0: _lrows}
+        self._pending = {}
+        self._objects = {}
+        self._lock = threading.Lock()
 
     @property
     def Results(self):
-        return self._results
+        return list(self)
+
+    @property
+    def Total(self):
+        return self._total
+
+    def __len__(self):
+        return self._total
+
+    def __getitem__(self, pIndex):
+        if isinstance(pIndex, slice):
+            return [self[i] for i in range(*pIndex.indices(self._total))]
+        if pIndex < 0:
+            pIndex += self._total
+        if pIndex < 0 or pIndex >= self._total:
+            raise IndexError("Search result index out of range")
+
+        _lobject = self._objects.get(pIndex)
+        if _lobject is None:
+            _lpage, _loffset = divmod(pIndex, self._pageSize)
+            _lrows = self._getPage(_lpage)
+            if _loffset >= len(_lrows):
+                raise IndexError("Search result %s not returned by the server" % pIndex)
+            _lobject = self._objects[pIndex] = MSTRObject(_lrows[_loffset]["id"], _lrows[_loffset])
+        return _lobject
+
+    def __iter__(self):
+        for i in range(self._total):
+            try:
+                yield self[i]
+            except IndexError:
+                return
+
+    def iterRows(self):
+        """ Generator over the JSON of the results, without building MSTRObject instances """
+        for _lpage in range(max((self._total + self._pageSize - 1) // self._pageSize, 1)):
+            _lrows = self._getPage(_lpage)
+            if not _lrows:
+                return
+            yield from _lrows
+
+    def _getPage(self, pPage):
+        _lrequest = None
+        with self._lock:
+            _lrows = self._pages.get(pPage)
+            _lfuture = self._pending.get(pPage) if _lrows is None else None
+            if _lrows is None and _lfuture is None:
+                # Registered before requesting it, so other threads wait for this request instead of repeating it
+                _lfuture = _lrequest = self._pending[pPage] = Future()
+        if _lrequest is not None:
+            try:
+                _lrequest.set_result(self._requestPage(pPage))
+            except BaseException as e:
+                _lrequest.set_exception(e)
+        if _lrows is None:
+            try:
+                _lrows = _lfuture.result()
+            finally:
+                with self._lock:
+                    # A failed request is dropped, so the page is requested again next time
+                    if _lfuture.done() and _lfuture.exception() is None:
+                        self._pages[pPage] = _lfuture.result()
+                    if self._pending.get(pPage) is _lfuture:
+                        del self._pending[pPage]
+        self._prefetch(pPage + 1)
+        return _lrows
+
+    def _requestPage(self, pPage):
+        if self._fetchPage is None:
+            return []
+        return self._fetchPage(pPage * self._pageSize, self._pageSize).get("result", [])
+
+    def _prefetch(self, pPage):
+        if self._fetchPage is None or pPage * self._pageSize >= self._total:
+            return
+        with self._lock:
+            if pPage in self._pages or pPage in self._pending:
+                return
+            self._pending[pPage] = self._getPrefetchExecutor().submit(self._requestPage, pPage)
+
+    @classmethod
+    def _getPrefetchExecutor(cls):
+        with MSTRSearchResults._prefetchLock:
+            if MSTRSearchResults._prefetchExecutor is None:
+                MSTRSearchResults._prefetchExecutor = ThreadPoolExecutor(max_workers=cls.PREFETCH_WORKERS,
+                                                                         thread_name_prefix="MSTRSearchResults")
+            return MSTRSearchResults._prefetchExecutor
 
     def __str__(self):
         retval = ""
-        for x in self._results:
+        for x in self:
             retval += str(x)
         return retval
 
+
+class MSTRObjectTable(Sequence):
+    """  Columnar table of objects for bulk catalog loads (ex. all the objects of a project, see fromSearchResults)
+        Keeps one column per field (ID, name, type, subtype, dateCreated, dateModified, version and ancestors)
+        instead of one MSTRObject per object: IDs are interned, types are packed in arrays and every distinct
+        ancestor path is stored once. Other fields of the JSON are not kept.
+        Indexes and find build the MSTRObject of a row when accessed
+    """
+
+    COLUMNS = ("id", "name", "type", "subtype", "dateCreated", "dateModified", "version", "ancestors")
+
+    _NONE = -0x80000000  # Missing type or subtype in the arrays
+
+    def __init__(self, pRows=()):
+        self._ids = []
+        self._names = []
+        self._types = array('i')
+        self._subtypes = array('i')
+        self._dateCreated = []
+        self._dateModified = []
+        self._versions = []
+        self._paths = array('i')
+        self._ancestors = []
+        self._pathIndex = {}
+        self._index = {}
+        self.extend(pRows)
+
+    @classmethod
+    def fromSearchResults(cls, pSearchResults):
+        """ Table of the rows of a MSTRSearchResults (ex. MSTRSession.quickSearchProject), without building an
+            MSTRObject per row
+        """
+        return cls(pSearchResults.iterRows())
+
+    def append(self, pJsonObjDefinition):
+        """ Adds the object JSON (as returned by searches/results) """
+        _lid = _intern(pJsonObjDefinition["id"])
+        self._index.setdefault(_lid, len(self._ids))
+        self._ids.append(_lid)
+        self._names.append(pJsonObjDefinition.get("name", None))
+        _ltype = pJsonObjDefinition.get("type", None)
+        if type(_ltype) is not int:
+            _ltype = base.EnumDSSObjectType.searchName(_ltype)
+        self._types.append(int(_ltype) if _ltype is not None else self._NONE)
+        _lsubtype = pJsonObjDefinition.get("subtype", None)
+        self._subtypes.append(_lsubtype if type(_lsubtype) is int else self._NONE)
+        self._dateCreated.append(_intern(pJsonObjDefinition.get("dateCreated", None)))
+        self._dateModified.append(_intern(pJsonObjDefinition.get("dateModified", None)))
+        self._versions.append(pJsonObjDefinition.get("version", None))
+        _lancestors = MSTRObject.getAncestors(pJsonObjDefinition.get("ancestors", None))
+        _lpath = self._pathIndex.get(id(_lancestors))
+        if _lpath is None:
+            _lpath = self._pathIndex[id(_lancestors)] = len(self._ancestors)
+            self._ancestors.append(_lancestors)
+        self._paths.append(_lpath)
+
+    def extend(self, pRows):
+        for row in pRows:
+            self.append(row)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __getitem__(self, pIndex):
+        if isinstance(pIndex, slice):
+            return [self[i] for i in range(*pIndex.indices(len(self._ids)))]
+        if pIndex < 0:
+            pIndex += len(self._ids)
+        if pIndex < 0 or pIndex >= len(self._ids):
+            raise IndexError("Object table index out of range")
+        return MSTRObject(self._ids[pIndex], self.getRow(pIndex))
+
+    def find(self, pId):
+        """ MSTRObject with the ID, or None """
+        _lrow = self._index.get(pId)
+        return self[_lrow] if _lrow is not None else None
+
+    def getRow(self, pIndex):
+        """ JSON of the row with the columns of the table """
+        _ltype = self._types[pIndex]
+        _lsubtype = self._subtypes[pIndex]
+        return {"id": self._ids[pIndex], "name": self._names[pIndex],
+                "type": _ltype if _ltype != self._NONE else None,
+                "subtype": _lsubtype if _lsubtype != self._NONE else None,
+                "dateCreated": self._dateCreated[pIndex], "dateModified": self._dateModified[pIndex],
+                "version": self._versions[pIndex], "ancestors": self._ancestors[self._paths[pIndex]]}
+
+    def getColumn(self, pName):
+        """ List of the values of one of the COLUMNS """
+        if pName in ("type", "subtype"):
+            return [v if v != self._NONE else None for v in (self._types if pName == "type" else self._subtypes)]
+        if pName == "ancestors":
+            return [self._ancestors[p] for p in self._paths]
+        _lcolumns = {"id": self._ids, "name": self._names, "dateCreated": self._dateCreated,
+                     "dateModified": self._dateModified, "version": self._versions}
+        if pName not in _lcolumns:
+            raise KeyError(pName)
+        return list(_lcolumns[pName])
+
+
 if __name__ == '__main__':
     pass
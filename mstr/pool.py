@@ -0,0 +1,146 @@
+import logging as log
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from mstr.mstr import MSTRSession, MSTRError
+
+
+class MSTRSessionPool:
+    """  Pool of authenticated MSTRSession for the same server, user and project.
+        Sessions are created on demand up to size, handed out with checkout and given back with checkin (or
+        with the session context manager), so the workers of a process reuse the logins instead of opening one
+        each. Before being handed out a session is checked with isValid and logged in again if it has expired.
+        The number of sessions opened against one server is capped across all the pools of the process, see
+        MAX_SERVER_SESSIONS
+    """
+
+    MAX_SIZE = 4  # Sessions per pool
+    MAX_SERVER_SESSIONS = 16  # Sessions per server URL across all the pools
+    CHECKOUT_TIMEOUT = 30  # Seconds to wait for a free session
+    POLL_INTERVAL = 0.5  # Seconds between checks of the server limit while waiting
+
+    _pools = {}
+    _serverSlots = {}
+    _registryLock = threading.RLock()
+
+    def __init__(self, mstr_api_url, username, userpassword, project=None, size=None, maxServerSessions=None,
+                 **sessionArgs):
+        """ mstr_api_url, username, userpassword: as in MSTRSession
+            project: ID, alias or name of the default project of the sessions (see MSTRSession.setDefaultProject)
+            maxServerSessions: limit of sessions against the server, only used by the first pool of the URL
+            sessionArgs: other MSTRSession arguments (ex. cache)
+        """
+        self._url = mstr_api_url
+        self._user = username
+        self._passw = userpassword
+        self._project = project
+        self._size = size if size is not None else self.MAX_SIZE
+        self._sessionArgs = sessionArgs
+        self._idle = deque()
+        self._created = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        with MSTRSessionPool._registryLock:
+            self._slots = MSTRSessionPool._serverSlots.setdefault(
+                mstr_api_url, threading.BoundedSemaphore(
+                    maxServerSessions if maxServerSessions is not None else self.MAX_SERVER_SESSIONS))
+
+    @classmethod
+    def getPool(cls, mstr_api_url, username, userpassword, project=None, **poolArgs):
+        """ Shared pool for (URL, user, project), created on first use """
+        key = (mstr_api_url, username, project)
+        with cls._registryLock:
+            pool = cls._pools.get(key)
+            if pool is None or pool._closed:
+                pool = cls._pools[key] = cls(mstr_api_url, username, userpassword, project, **poolArgs)
+        return pool
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def created(self):
+        """ Sessions currently opened by the pool, idle or checked out """
+        return self._created
+
+    @property
+    def idle(self):
+        return len(self._idle)
+
+    def checkout(self, timeout=None):
+        """ Gets a valid session, waiting up to timeout seconds if all of them are in use """
+        deadline = time.monotonic() + (timeout if timeout is not None else self.CHECKOUT_TIMEOUT)
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise MSTRError("MSTR Session pool is closed")
+                if self._idle:
+                    session = self._idle.pop()
+                    break
+                if self._created < self._size and self._slots.acquire(blocking=False):
+                    self._created += 1
+                    session = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise MSTRError("Timeout waiting for a session of the pool for %s" % self._user)
+                self._cond.wait(min(remaining, self.POLL_INTERVAL))
+
+        try:
+            if session is None:
+                log.debug("MSTR Session pool opening session for %s", self._user)
+                session = MSTRSession(self._url, self._user, self._passw, autoopen=True,
+                                      autoload=self._project is not None, **self._sessionArgs)
+                if self._project is not None:
+                    session.setDefaultProject(self._project)
+            elif not session.isValid:
+                log.debug("MSTR Session pool reopening expired session for %s", self._user)
+                session.open(self._user, self._passw, autoload=False)
+        except Exception:
+            self._release()
+            raise
+        return session
+
+    def checkin(self, session):
+        """ Gives back a session obtained with checkout """
+        with self._cond:
+            if not self._closed:
+                self._idle.append(session)
+                self._cond.notify()
+                return
+        self._discard(session)
+
+    @contextmanager
+    def session(self, timeout=None):
+        """ Context manager that checks out a session and gives it back at the end """
+        session = self.checkout(timeout)
+        try:
+            yield session
+        finally:
+            self.checkin(session)
+
+    def close(self):
+        """ Logs out the idle sessions. The ones checked out are logged out when they are given back """
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for session in idle:
+            self._discard(session)
+
+    def _discard(self, session):
+        try:
+            session.close()
+        except MSTRError as err:
+            log.debug("MSTR Session pool logout failed: %s", err)
+        self._release()
+
+    def _release(self):
+        with self._cond:
+            self._created -= 1
+            self._slots.release()
+            self._cond.notify()
@@ -0,0 +1,229 @@
+import json
+import re
+
+# Tokens of the incremental scanner
+_WHITESPACE = re.compile(rb'[ \t\r\n]*')
+_STRING = re.compile(rb'"(?:[^"\\]|\\.)*"')
+_SCALAR = re.compile(rb'[^ \t\r\n,:\]}]+')
+_SPECIAL = re.compile(rb'["\[\]{}]')
+
+_OBJ = 0
+_ARR = 1
+
+# Frame states
+_KEY = 0  # Object waiting for a key, a separator or its end
+_COLON = 1  # Object waiting for the colon after the key
+_VALUE = 2  # Object waiting for the value of the key
+
+# Frame roles
+_PATH = 0  # Object in the path to the results tree
+_NODES = 1  # Array of tree nodes
+_NODE = 2  # Tree node
+
+_CLOSERS = {_OBJ: b'}', _ARR: b']'}
+
+
+class _Frame:
+    __slots__ = ('kind', 'role', 'state', 'key', 'metrics', 'index', 'children')
+
+    def __init__(self, kind, role):
+        self.kind = kind
+        self.role = role
+        self.state = _KEY
+        self.key = None
+        self.metrics = None
+        self.index = -1
+        self.children = False
+
+
+class MSTRResultStreamParser:
+    """  Incremental decoder of a dataset instance response.
+        The response is read chunk by chunk and the nodes of result.data.root.children are decoded while the
+        bytes arrive: only the element of every node in the current path is kept, so memory is bound by the
+        size of one row instead of the whole payload.
+        Everything outside the tree is kept as a skeleton document with an empty children list (see Document).
+        Assumes, as the server does, that the definition comes before the data and that the element of a node
+        comes before its children.
+    """
+
+    TREE_PATH = ("result", "data", "root", "children")
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._pos = 0
+        self._stack = []
+        self._skeleton = bytearray()
+        self._intree = False
+        self._document = None
+        self._current = []
+
+    @property
+    def Document(self):
+        """ Skeleton of the response without the tree rows. Available once the tree starts """
+        return self._document
+
+    def iterLeaves(self, pChunks):
+        """ Generator over the leaves of the tree, as (elements in the path indexed by attributeIndex, metrics)
+            like MSTRDatasetResults.iterLeaves. pChunks is an iterable of bytes (ex. Response.iter_content)
+        """
+        for chunk in pChunks:
+            if chunk:
+                self._buffer += chunk
+                yield from self._process(False)
+        yield from self._process(True)
+
+        if self._stack or not self._skeleton:
+            raise ValueError("Incomplete dataset results stream")
+        self._document = json.loads(bytes(self._skeleton))
+
+    def _startTree(self):
+        """ Parses the skeleton read so far, closing the open containers, to get the definition of the results """
+        closers = b''.join(_CLOSERS[f.kind] for f in reversed(self._stack))
+        self._document = json.loads(bytes(self._skeleton) + b'[]' + closers)
+        self._skeleton += b'[]'
+        try:
+            self._current = [None] * len(self._document["result"]["definition"]["attributes"])
+        except (KeyError, TypeError):
+            raise ValueError("Dataset definition not found before the results tree")
+        self._intree = True
+
+    def _consume(self, pEnd):
+        """ Moves the position to pEnd, keeping the bytes in the skeleton when outside the tree """
+        if not self._intree:
+            self._skeleton += self._buffer[self._pos:pEnd]
+        self._pos = pEnd
+
+    def _valueEnd(self, pPos, pEof):
+        """ End of the JSON value starting in pPos or None if it is not complete in the buffer yet """
+        buf = self._buffer
+        c = buf[pPos]
+        if c == 0x22:  # "
+            m = _STRING.match(buf, pPos)
+            return m.end() if m is not None else None
+        if c == 0x7b or c == 0x5b:  # { [
+            depth = 0
+            i = pPos
+            while True:
+                m = _SPECIAL.search(buf, i)
+                if m is None:
+                    return None
+                ch = buf[m.start()]
+                if ch == 0x22:
+                    sm = _STRING.match(buf, m.start())
+                    if sm is None:
+                        return None
+                    i = sm.end()
+                    continue
+                depth += 1 if ch == 0x7b or ch == 0x5b else -1
+                i = m.end()
+                if depth == 0:
+                    return i
+        m = _SCALAR.match(buf, pPos)
+        if m is None:
+            raise ValueError("Invalid JSON value at %s" % pPos)
+        if m.end() == len(buf) and not pEof:
+            return None
+        return m.end()
+
+    def _isTreePath(self, pKey):
+        return len(self._stack) == len(self.TREE_PATH) and \
+            all(f.key == k for f, k in zip(self._stack, self.TREE_PATH[:-1])) and pKey == self.TREE_PATH[-1]
+
+    def _isInPath(self, pKey):
+        depth = len(self._stack)
+        return depth < len(self.TREE_PATH) and self.TREE_PATH[depth - 1] == pKey and \
+            all(f.key == k for f, k in zip(self._stack[:-1], self.TREE_PATH))
+
+    def _process(self, pEof):
+        buf = self._buffer
+        stack = self._stack
+        while True:
+            pos = _WHITESPACE.match(buf, self._pos).end()
+            if pos > self._pos:
+                self._consume(pos)
+            if pos >= len(buf):
+                break
+            c = buf[pos]
+
+            if not stack:
+                if c != 0x7b:
+                    raise ValueError("Invalid dataset results stream at %s" % pos)
+                stack.append(_Frame(_OBJ, _PATH))
+                self._consume(pos + 1)
+                continue
+
+            frame = stack[-1]
+            if frame.kind == _ARR:
+                if c == 0x2c:  # ,
+                    self._consume(pos + 1)
+                elif c == 0x5d:  # ]
+                    stack.pop()
+                    self._consume(pos + 1)
+                    if stack[-1].role == _PATH:
+                        self._intree = False
+                elif c == 0x7b:
+                    stack.append(_Frame(_OBJ, _NODE))
+                    self._consume(pos + 1)
+                else:
+                    raise ValueError("Invalid results tree node at %s" % pos)
+                continue
+
+            if frame.state == _KEY:
+                if c == 0x2c:
+                    self._consume(pos + 1)
+                elif c == 0x7d:  # }
+                    stack.pop()
+                    if frame.role == _NODE and not frame.children:
+                        # Leaves of reports with attributes only have no metrics
+                        yield self._current, frame.metrics if frame.metrics is not None else {}
+                    if frame.index >= 0:
+                        # The element does not apply to the next branch (ragged trees)
+                        self._current[frame.index] = None
+                    self._consume(pos + 1)
+                else:
+                    m = _STRING.match(buf, pos)
+                    if m is None:
+                        break
+                    frame.key = json.loads(buf[pos:m.end()])
+                    frame.state = _COLON
+                    self._consume(m.end())
+            elif frame.state == _COLON:
+                if c != 0x3a:  # :
+                    raise ValueError("Expected ':' at %s" % pos)
+                frame.state = _VALUE
+                self._consume(pos + 1)
+            else:
+                key = frame.key
+                if frame.role == _PATH and c == 0x5b and self._isTreePath(key):
+                    frame.state = _KEY
+                    self._startTree()
+                    stack.append(_Frame(_ARR, _NODES))
+                    self._consume(pos + 1)
+                elif frame.role == _PATH and c == 0x7b and self._isInPath(key):
+                    frame.state = _KEY
+                    stack.append(_Frame(_OBJ, _PATH))
+                    self._consume(pos + 1)
+                elif frame.role == _NODE and c == 0x5b and key == "children":
+                    frame.state = _KEY
+                    frame.children = True
+                    stack.append(_Frame(_ARR, _NODES))
+                    self._consume(pos + 1)
+                else:
+                    end = self._valueEnd(pos, pEof)
+                    if end is None:
+                        break
+                    if frame.role == _NODE and key == "element":
+                        element = json.loads(buf[pos:end])
+                        index = element["attributeIndex"]
+                        # Elements of attributes not in the definition are ignored, as in the buffered results
+                        if index < len(self._current):
+                            self._current[index] = element
+                            frame.index = index
+                    elif frame.role == _NODE and key == "metrics":
+                        frame.metrics = json.loads(buf[pos:end])
+                    frame.state = _KEY
+                    self._consume(end)
+
+        # Drop the bytes already processed
+        del buf[:self._pos]
+        self._pos = 0
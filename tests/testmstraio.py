@@ -0,0 +1,138 @@
+import asyncio
+import testtools
+import mstr
+
+try:
+    from aiohttp import web
+    from aiohttp.test_utils import TestServer
+except ImportError:
+    web = None
+
+TOKEN = "FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF"
+REPORT_ID = "0123456789ABCDEF0123456789ABCDEF"
+PROJECT_ID = "B7CA92F04B9FAE8D941C3E9B7E0CD754"
+REGIONS = ("North", "South")
+
+
+def datasetResult(pOffset=0, pLimit=None):
+    """ Instance response with Region -> Year rows and one Revenue metric per row"""
+    rows = [(r, y) for r in REGIONS for y in ("2017", "2018")]
+    page = rows[pOffset:pOffset + pLimit if pLimit is not None else len(rows)]
+    children = []
+    for r, y in page:
+        if len(children) == 0 or children[-1]["element"]["name"] != r:
+            children.append({"depth": 0, "element": {"attributeIndex": 0, "name": r, "id": "h" + r}, "children": []})
+        children[-1]["children"].append({"depth": 1, "element": {"attributeIndex": 1, "name": y, "id": "h" + y},
+                                         "metrics": {"Revenue": {"rv": len(r) * int(y), "fv": str(len(r))}}})
+    return {"instanceId": "FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF",
+            "result": {"definition": {"attributes": [{"name": "Region", "id": "A1"}, {"name": "Year", "id": "A2"}],
+                                      "metrics": [{"name": "Revenue", "id": "M1"}]},
+                       "data": {"paging": {"total": len(rows), "current": len(page), "offset": pOffset,
+                                           "limit": pLimit},
+                                "root": {"isPartial": False, "children": children}}}}
+
+
+def buildApp(pRequests):
+    """ Minimal Library REST API. Requests received are appended to pRequests """
+
+    async def login(request):
+        return web.Response(status=204, headers={"X-MSTR-AuthToken": TOKEN})
+
+    async def logout(request):
+        return web.Response(status=204)
+
+    async def projects(request):
+        return web.json_response([{"id": PROJECT_ID, "name": "MicroStrategy Tutorial", "alias": "", "status": 0}])
+
+    async def objects(request):
+        return web.json_response({"id": request.match_info["id"], "name": "Object " + request.match_info["id"],
+                                  "type": int(request.query["type"]), "dateModified": "2017-11-23T15:16:56.589Z"})
+
+    async def search(request):
+        return web.json_response({"totalItems": 1, "result": [
+            {"id": REPORT_ID, "name": request.query["name"], "type": 3, "subtype": 768}]})
+
+    async def definition(request):
+        return web.json_response({"result": {"definition": {"availableObjects": {"attributes": [], "metrics": []}}}})
+
+    async def instances(request):
+        return web.json_response(datasetResult(int(request.query.get("offset", 0)),
+                                               int(request.query["limit"]) if "limit" in request.query else None))
+
+    @web.middleware
+    async def record(request, handler):
+        pRequests.append(request)
+        if request.path != "/api/auth/login" and request.headers.get("X-MSTR-AuthToken") != TOKEN:
+            return web.json_response({"code": "ERR009", "message": "Invalid session"}, status=401)
+        return await handler(request)
+
+    app = web.Application(middlewares=[record])
+    app.add_routes([web.post("/api/auth/login", login), web.post("/api/auth/logout", logout),
+                    web.get("/api/projects", projects), web.get("/api/objects/{id}", objects),
+                    web.get("/api/searches/results", search), web.get("/api/reports/{id}", definition),
+                    web.post("/api/reports/{id}/instances", instances),
+                    web.get("/api/reports/{id}/instances/{instanceId}", instances)])
+    return app
+
+
+@testtools.skipIf(web is None, "aiohttp is not installed")
+class TestMSTRAsyncSession(testtools.TestCase):
+
+    def run_async(self, pTest):
+        async def runner():
+            requests = []
+            server = TestServer(buildApp(requests))
+            await server.start_server()
+            try:
+                await pTest(str(server.make_url("/api")), requests)
+            finally:
+                await server.close()
+        asyncio.run(runner())
+
+    def test_mstrasyncsession(self):
+        """testing MSTRAsyncSession Class"""
+        async def test(url, requests):
+            async with mstr.MSTRAsyncSession(url, 'user', 'password') as s:
+                self.assertEqual(s.AuthToken.token, TOKEN, "Reading token failed")
+                self.assertEqual(s.projectCount, 1, "Reading project list failed")
+                s.setDefaultProject("MicroStrategy Tutorial")
+                self.assertEqual(s.currentProject["id"], PROJECT_ID, "Setting default project failed")
+
+                results = await s.quickSearchProject("Revenue", pObjectTypes=[
+                    mstr.EnumDSSObjectType.DSSTYPEREPORTDEFINITION, mstr.EnumDSSObjectType.DSSTYPEDOCUMENTDEFINITION])
+                self.assertEqual(results.Results[0].Name, "Revenue", "Reading search results failed")
+                self.assertEqual(requests[-1].query.getall("type"), ["3", "55"], "Wrong search parameters")
+                self.assertEqual(requests[-1].headers["X-MSTR-ProjectID"], PROJECT_ID, "Project header not sent")
+
+                objects = [mstr.MSTRObject("%032X" % i, {"type": 4}) for i in range(20)]
+                await asyncio.gather(*[s.getObjectInformation(o) for o in objects])
+                self.assertEqual(objects[7].Name, "Object %032X" % 7, "Reading object information failed")
+
+                d = await s.getDatasetDefinition(results.Results[0])
+                data = await s.getData(d)
+                self.assertEqual(len(list(data.iterRows())), 4, "Reading data failed")
+                pages = [p async for p in s.getDataPages(d, pPageSize=3)]
+                self.assertEqual(sum(len(list(p.iterRows())) for p in pages), 4, "Reading data pages failed")
+            self.assertEqual(requests[-1].path, "/api/auth/logout", "Session not closed")
+
+        self.run_async(test)
+
+    def test_mstrasyncsessionerror(self):
+        """testing MSTRAsyncSession Class errors"""
+        async def test(url, requests):
+            s = mstr.MSTRAsyncSession(url, 'user', 'password')
+            await s.open('user', 'password', autoload=False)
+            s._headers["X-MSTR-AuthToken"] = "invalid"
+            with testtools.ExpectedException(mstr.MSTRError):
+                await s.request('GET', url + "/projects", pReauthenticate=False)
+
+            # Expired session: logs in once and replays the requests
+            s._authToken.token = s._headers["X-MSTR-AuthToken"] = "E" * 32
+            logins = len([r for r in requests if r.path == "/api/auth/login"])
+            projects = await asyncio.gather(*[s.request('GET', url + "/projects") for _ in range(3)])
+            self.assertEqual([p.status_code for p in projects], [200] * 3, "Requests not replayed after login")
+            self.assertEqual(len([r for r in requests if r.path == "/api/auth/login"]), logins + 1,
+                             "Expired session should log in once")
+            await s.close()
+
+        self.run_async(test)
@@ -0,0 +1,101 @@
+import math
+import os
+import threading
+import time
+from array import array
+import fixtures
+import testtools
+import mstr
+
+
+class TestMSTRCache(testtools.TestCase):
+
+    def test_mstrcachelru(self):
+        """ Testing MSTRCache in memory tier"""
+        c = mstr.MSTRCache(maxEntries=2)
+        c.set(("P", "A", 3, "object"), {"name": "A"}, "v1")
+        c.set(("P", "B", 3, "object"), {"name": "B"})
+        self.assertEqual(c.get(("P", "A", 3, "object")), {"name": "A"}, "Reading cached entry failed")
+        c.set(("P", "C", 3, "object"), {"name": "C"})
+        self.assertEqual(c.get(("P", "B", 3, "object")), None, "Least recently used entry should be evicted")
+        self.assertEqual(len(c), 2, "Wrong number of entries")
+        self.assertEqual(c.get(("P", "A", 3, "object"), "v2"), None, "Entry with other version should be discarded")
+        self.assertEqual(c.get(("P", "A", 3, "object")), None, "Discarded entry still cached")
+        self.assertEqual((c.hits, c.misses), (1, 3), "Wrong hit and miss counts")
+
+    def test_mstrcachettl(self):
+        """ Testing MSTRCache expiration"""
+        c = mstr.MSTRCache(ttl=0.1)
+        c.set("key", [1, 2, 3])
+        self.assertEqual(c.get("key"), [1, 2, 3], "Reading cached entry failed")
+        time.sleep(0.2)
+        self.assertEqual(c.get("key"), None, "Expired entry should not be returned")
+
+    def test_mstrcachedisk(self):
+        """ Testing MSTRCache on disk tier"""
+        path = self.useFixture(fixtures.TempDir()).path
+        c = mstr.MSTRCache(path=path)
+        c.set(("P", "A", 3, "definition"), {"result": {"definition": {}}}, "2017-11-23T15:16:56.589Z")
+
+        c = mstr.MSTRCache(path=path)
+        self.assertEqual(c.get(("P", "A", 3, "definition"), "2017-11-23T15:16:56.589Z"), {"result": {"definition": {}}},
+                         "Reading entry from disk failed")
+        self.assertEqual(c.get(("P", "A", 3, "definition"), "2018-01-01T00:00:00.000Z"), None,
+                         "Entry with other version should be discarded")
+        self.assertEqual(mstr.MSTRCache(path=path).get(("P", "A", 3, "definition")), None,
+                         "Discarded entry still on disk")
+
+    def test_mstrresultcachekey(self):
+        """ Testing MSTRResultCache canonical keys"""
+        body = {"requestedObjects": {"attributes": [{"id": "A1"}], "metrics": [{"id": "M1"}]},
+                "viewFilter": {"operator": "Equals", "operands": [{"type": "constant", "value": "1"}]}}
+        reordered = {"viewFilter": {"operands": [{"value": "1", "type": "constant"}], "operator": "Equals"},
+                     "requestedObjects": {"metrics": [{"id": "M1"}], "attributes": [{"id": "A1"}]}}
+        key = mstr.MSTRResultCache.getKey("D", "P", body)
+        self.assertEqual(key, mstr.MSTRResultCache.getKey("D", "P", reordered), "Keys should not depend on order")
+        self.assertNotEqual(key, mstr.MSTRResultCache.getKey("D", "P", {}), "Keys should depend on the body")
+        self.assertNotEqual(key, mstr.MSTRResultCache.getKey("D", "Q", body), "Keys should depend on the project")
+
+    def test_mstrresultcache(self):
+        """ Testing MSTRResultCache storage of columnar results"""
+        path = self.useFixture(fixtures.TempDir()).path
+        c = mstr.MSTRResultCache(path)
+        results = mstr.MSTRColumnarResults({"Region": (["North", "South"], array('i', [0, 0, 1])),
+                                            "Year": (["2017", "2018"], array('i', [0, 1, 0]))},
+                                           {"Revenue": array('d', [10, 20, 30]),
+                                            "Cost": array('d', [4.5, math.nan, math.nan])})
+
+        self.assertEqual(c.get("key"), None, "Missing entry should not be returned")
+        c.set("key", results.save)
+        loaded = mstr.MSTRColumnarResults.load(c.get("key"))
+        self.assertEqual(len(loaded), 3, "Wrong number of rows")
+        self.assertEqual(loaded.getCategories("Region"), ["North", "South"], "Wrong categories")
+        self.assertEqual(list(loaded.getCodes("Year")), [0, 1, 0], "Wrong codes")
+        d = loaded.todict()
+        self.assertEqual(d["Revenue"], [10.0, 20.0, 30.0], "Wrong metric values")
+        self.assertTrue(math.isnan(d["Cost"][2]), "Missing metrics should be NaN")
+        self.assertEqual((c.hits, c.misses), (1, 1), "Wrong hit and miss counts")
+
+        c = mstr.MSTRResultCache(path, ttl=60)
+        os.utime(c.getFileName("key"), (time.time() - 120, time.time() - 120))
+        self.assertEqual(c.get("key"), None, "Expired entry should not be returned")
+
+    def test_mstrcachecounters(self):
+        """ Testing MSTRCache and MSTRResultCache hit and miss counts from several threads"""
+        path = self.useFixture(fixtures.TempDir()).path
+        c = mstr.MSTRCache()
+        c.set("key", 1)
+        r = mstr.MSTRResultCache(path)
+        r.set("key", lambda f: f.write(b"data"))
+
+        def lookups():
+            for i in range(500):
+                c.get("key" if i % 2 else "missing")
+                r.get("key" if i % 2 else "missing")
+        threads = [threading.Thread(target=lookups) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual((c.hits, c.misses), (2000, 2000), "Lost MSTRCache counts")
+        self.assertEqual((r.hits, r.misses), (2000, 2000), "Lost MSTRResultCache counts")
@@ -0,0 +1,86 @@
+from requests_mock.contrib import fixture
+import testtools
+import mstr
+
+
+class TestMSTRMetadataIndex(testtools.TestCase):
+
+    BASE_URL = 'http://demo.pxltd.ca:8080/MicroStrategyLibrary/api'
+    PROJECT_ID = "B19DEDCC11D4E0EFC000EB9495D0F44F"
+    FOLDER_ID = "D3C7D461F69C4610AA6BAA5EF51F4125"
+
+    def setUp(self):
+        super(TestMSTRMetadataIndex, self).setUp()
+        self.requests_mock = self.useFixture(fixture.Fixture())
+        self.requests_mock.register_uri('POST', self.BASE_URL + '/auth/login',
+                                        headers={"X-MSTR-AuthToken": "FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF"})
+        self.objects = [self.getObject(i, name) for i, name in enumerate(
+            ["Revenue by Region", "Regional Revenue", "Cost by Region", "Revenue_Forecast", "Profit"])]
+
+        def search(request, context):
+            offset, limit = int(request.qs["offset"][0]), int(request.qs["limit"][0])
+            found = [o for o in self.objects if "root" not in request.qs or
+                     self.FOLDER_ID in [a["id"] for a in o["ancestors"]]]
+            return {"totalItems": len(found), "result": found[offset:offset + limit]}
+        self.requests_mock.register_uri('GET', self.BASE_URL + '/searches/results', json=search)
+        self.session = mstr.MSTRSession(self.BASE_URL + '/', 'user', 'password', autoopen=True, autoload=False)
+
+    def getObject(self, pIndex, pName, pDateModified="2017-11-23T15:16:56.589Z"):
+        return {"id": "%032X" % pIndex, "name": pName, "type": 3 if pIndex < 4 else 4, "subtype": 768,
+                "dateModified": pDateModified,
+                "ancestors": [{"name": "Public Objects", "id": "98FE182C2A10427EACE0CD30B6768258", "level": 2},
+                              {"name": "Reports", "id": self.FOLDER_ID if pIndex % 2 == 0 else "0", "level": 1}]}
+
+    def search(self, pIndex, pSearchString, pSearchType, **args):
+        return [o.Name for o in pIndex.search(pSearchString, pSearchType=pSearchType, **args)]
+
+    def test_mstrindexsearch(self):
+        """ Testing MSTRMetadataIndex search types"""
+        index = mstr.MSTRMetadataIndex()
+        self.assertEqual(index.crawl(self.session, self.PROJECT_ID), 5, "Wrong number of objects indexed")
+        calls = self.requests_mock.call_count
+
+        self.assertEqual(self.search(index, "revenue", mstr.EnumDssXmlSearchType.DSSXMLSEARCHTYPECONTAINS),
+                         ["Regional Revenue", "Revenue by Region", "Revenue_Forecast"])
+        self.assertEqual(self.search(index, "Revenue", mstr.EnumDssXmlSearchType.DSSXMLSEARCHTYPEBEGINWITH),
+                         ["Revenue by Region", "Revenue_Forecast"])
+        self.assertEqual(self.search(index, "region", mstr.EnumDssXmlSearchType.DSSXMLSEARCHTYPEENDWIDTH),
+                         ["Cost by Region", "Revenue by Region"])
+        self.assertEqual(self.search(index, "PROFIT", mstr.EnumDssXmlSearchType.DSSXMLSEARCHTYPEEXACTLY),
+                         ["Profit"])
+        self.assertEqual(self.search(index, "region", mstr.EnumDssXmlSearchType.DSSXMLSEARCHTYPEBEGINWITHPHRASE),
+                         ["Cost by Region", "Regional Revenue", "Revenue by Region"])
+        self.assertEqual(self.search(index, "cost profit", mstr.EnumDssXmlSearchType.DSSXMLSEARCHTYPECONTAINSANYWORD),
+                         ["Cost by Region", "Profit"])
+        self.assertEqual(self.search(index, "e_f", mstr.EnumDssXmlSearchType.DSSXMLSEARCHTYPECONTAINS),
+                         ["Revenue_Forecast"], "Wildcards in the search string should be literal")
+        self.assertEqual(self.search(index, "r", mstr.EnumDssXmlSearchType.DSSXMLSEARCHTYPECONTAINS,
+                                     pObjectTypes=[mstr.EnumDSSObjectType.DSSTYPEMETRIC],
+                                     pMstrProjectId=self.PROJECT_ID), ["Profit"], "Wrong type filter")
+        self.assertEqual(self.search(index, None, None, pRootFolderId=self.FOLDER_ID),
+                         ["Cost by Region", "Profit", "Revenue by Region"], "Wrong folder filter")
+        results = index.search("profit")
+        self.assertEqual(results[0].Ancestors[1]["name"], "Reports", "Ancestors not indexed")
+        self.assertEqual(self.requests_mock.call_count, calls, "Search should not call the server")
+
+    def test_mstrindexrefresh(self):
+        """ Testing MSTRMetadataIndex incremental refresh"""
+        index = mstr.MSTRMetadataIndex()
+        index.crawl(self.session, self.PROJECT_ID)
+        self.assertIsNotNone(index.crawledOn(self.PROJECT_ID))
+        self.assertEqual(index.refresh(self.session, self.PROJECT_ID), 0, "Unchanged objects should not be updated")
+
+        self.objects[0] = self.getObject(0, "Revenue by Country", "2018-01-01T00:00:00.000Z")
+        del self.objects[4]
+        self.objects.append(self.getObject(5, "Margin"))
+        self.assertEqual(index.refresh(self.session, self.PROJECT_ID), 3, "Wrong number of changes")
+        self.assertEqual(len(index), 5)
+        self.assertEqual(self.search(index, "country", mstr.EnumDssXmlSearchType.DSSXMLSEARCHTYPECONTAINS),
+                         ["Revenue by Country"], "Modified object not updated")
+        self.assertEqual(self.search(index, "profit", mstr.EnumDssXmlSearchType.DSSXMLSEARCHTYPECONTAINS), [],
+                         "Deleted object not removed")
+
+        del self.objects[2]
+        self.assertEqual(index.refresh(self.session, self.PROJECT_ID, self.FOLDER_ID), 1,
+                         "Folder refresh should only change the objects of the folder")
+        self.assertEqual(len(index), 4)
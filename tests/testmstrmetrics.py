@@ -0,0 +1,68 @@
+from requests_mock.contrib import fixture
+import testtools
+import mstr
+
+
+class TestMSTRMetrics(testtools.TestCase):
+
+    BASE_URL = 'http://demo.pxltd.ca:8080/MicroStrategyLibrary/api'
+    REPORT_ID = "0123456789ABCDEF0123456789ABCDEF"
+
+    def setUp(self):
+        super(TestMSTRMetrics, self).setUp()
+        self.requests_mock = self.useFixture(fixture.Fixture())
+        self.requests_mock.register_uri('POST', self.BASE_URL + '/auth/login',
+                                        headers={"X-MSTR-AuthToken": "FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF"})
+        self.requests_mock.register_uri('GET', self.BASE_URL + '/projects', json=[])
+        self.requests_mock.register_uri('GET', self.BASE_URL + '/reports/' + self.REPORT_ID, status_code=400,
+                                        json={"code": "ERR004", "iServerCode": -2147072488, "message": "Not found"})
+        self.metrics = mstr.MSTRMetrics()
+        self.cache = mstr.MSTRCache()
+        self.session = mstr.MSTRSession(self.BASE_URL + '/', 'user', 'password', autoopen=True, autoload=False,
+                                        cache=self.cache, metrics=self.metrics)
+
+    def test_mstrmetricsendpoints(self):
+        """ Testing MSTRMetrics counts, errors and cache hit rates per endpoint"""
+        self.assertEqual(mstr.MSTRMetrics.getEndpoint("post", self.BASE_URL + "/cubes/" + self.REPORT_ID +
+                                                      "/instances/" + "F" * 32 + "?offset=0"),
+                         "POST cubes/{id}/instances/{id}")
+        self.session.getProjectList()
+        self.session.getProjectList()
+        with testtools.ExpectedException(mstr.MSTRError):
+            self.session.request("GET", self.BASE_URL + '/reports/' + self.REPORT_ID)
+        self.cache.get("missing")
+
+        data = self.metrics.todict()
+        self.assertEqual(data["endpoints"]["POST auth/login"]["count"], 1)
+        projects = data["endpoints"]["GET projects"]
+        self.assertEqual(projects["status"], {"200": 2})
+        self.assertEqual(projects["latency"][-1], [None, 2], "Histogram should count every request")
+        self.assertEqual(projects["bytesIn"], 4)
+        self.assertEqual(data["endpoints"]["GET reports/{id}"]["errors"],
+                         [{"code": "ERR004", "iServerCode": -2147072488, "count": 1}])
+        self.assertEqual(data["caches"]["cache"], {"hits": 0, "misses": 1, "hitRate": 0.0})
+
+    def test_mstrmetricscaches(self):
+        """ Testing MSTRMetrics cache names"""
+        other = mstr.MSTRSession(self.BASE_URL + '/', 'user', 'password', autoopen=False, autoload=False,
+                                 cache=mstr.MSTRCache(), metrics=self.metrics)
+        shared = mstr.MSTRSession(self.BASE_URL + '/', 'user', 'password', autoopen=False, autoload=False,
+                                  cache=self.cache, metrics=self.metrics)
+        self.metrics.attach(mstr.MSTRSession(self.BASE_URL + '/', 'user', 'password', autoopen=False,
+                                             autoload=False, cache=mstr.MSTRCache()), "reports")
+        other.cache.get("missing")
+        caches = self.metrics.todict()["caches"]
+        self.assertEqual(sorted(caches), ["cache", "cache2", "reports.cache"], "Caches lost or repeated")
+        self.assertEqual(caches["cache2"]["misses"], 1)
+        self.assertEqual(self.metrics.addCache("other", shared.cache), "cache", "Shared cache registered twice")
+        with testtools.ExpectedException(ValueError):
+            self.metrics.addCache("cache", mstr.MSTRCache())
+
+    def test_mstrmetricsprometheus(self):
+        """ Testing MSTRMetrics Prometheus text format"""
+        self.session.getProjectList()
+        text = self.metrics.toprometheus()
+        self.assertIn('# TYPE mstr_request_duration_seconds histogram', text)
+        self.assertIn('mstr_requests_total{method="GET",endpoint="projects",status="200"} 1', text)
+        self.assertIn('mstr_request_duration_seconds_bucket{method="GET",endpoint="projects",le="+Inf"} 1', text)
+        self.assertIn('mstr_cache_misses_total{cache="cache"} 0', text)
@@ -1,5 +1,41 @@
+import json
+import math
+from array import array
 import testtools
 import mstr
+import mstr.stream
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+RESULTS = {"instanceId": "FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF",
+           "result": {"definition": {"attributes": [{"name": "Region", "id": "A1"}, {"name": "Year", "id": "A2"}],
+                                     "metrics": [{"name": "Revenue", "id": "M1"}, {"name": "Cost", "id": "M2"}]},
+                      "data": {"paging": {"total": 3, "current": 3, "offset": 0, "limit": 5000},
+                               "root": {"isPartial": False, "children": [
+                                   {"depth": 0, "element": {"attributeIndex": 0, "name": "North", "id": "hN"},
+                                    "children": [
+                                        {"depth": 1, "element": {"attributeIndex": 1, "name": "2017", "id": "h7"},
+                                         "metrics": {"Revenue": {"rv": 10, "fv": "10"},
+                                                     "Cost": {"rv": 4.5, "fv": "4.5"}}},
+                                        {"depth": 1, "element": {"attributeIndex": 1, "name": "2018", "id": "h8"},
+                                         "metrics": {"Revenue": {"rv": 20, "fv": "20"}}}]},
+                                   {"depth": 0, "element": {"attributeIndex": 0, "name": "South", "id": "hS"},
+                                    "children": [
+                                        {"depth": 1, "element": {"attributeIndex": 1, "name": "2017", "id": "h7"},
+                                         "metrics": {"Revenue": {"rv": 30, "fv": "30"},
+                                                     "Cost": {"rv": None, "fv": ""}}}]}]}}}}
+
+# Ragged tree: the second branch has no Year and the third no Region
+RAGGED_RESULTS = {"result": {
+    "definition": {"attributes": [{"name": "Region"}, {"name": "Year"}], "metrics": [{"name": "Revenue"}]},
+    "data": {"root": {"children": [
+        {"element": {"attributeIndex": 0, "name": "North"}, "children": [
+            {"element": {"attributeIndex": 1, "name": "2017"}, "metrics": {"Revenue": {"rv": 10}}}]},
+        {"element": {"attributeIndex": 0, "name": "South"}, "metrics": {"Revenue": {"rv": 30}}},
+        {"element": {"attributeIndex": 1, "name": "2018"}, "metrics": {"Revenue": {"rv": 5}}}]}}}}
 
 
 class TestMSTR(testtools.TestCase):
@@ -66,6 +102,52 @@ class TestMSTR(testtools.TestCase):
         self.assertEqual(a.Type, mstr.EnumDSSObjectType.DSSTYPEMETRIC, "Reading property Type failed. Should be None")
         self.assertEqual(a.isDerived, True, "Reading property isDerived failed")
 
+    def test_mstrobjecttable(self):
+        """ Testing compact MSTRObject and MSTRObjectTable"""
+        rows = [{"id": "%032X" % i, "name": "Report %s" % i, "type": 3 if i % 2 else "Metric", "subtype": 768,
+                 "dateModified": "2017-11-23T15:16:56.589Z",
+                 "ancestors": [{"name": "Public Objects", "id": "98FE182C2A10427EACE0CD30B6768258", "level": 1}]}
+                for i in range(4)]
+        rows = json.loads(json.dumps(rows))
+        a, b = mstr.MSTRObject(rows[0]["id"], rows[0]), mstr.MSTRObject(rows[1]["id"], rows[1])
+        self.assertFalse(hasattr(a, "__dict__"), "MSTRObject should use __slots__")
+        self.assertIs(a.Ancestors, b.Ancestors, "Ancestor paths should be shared")
+        self.assertEqual(a.Ancestors[0]["name"], "Public Objects")
+        self.assertEqual(a.Ancestors[0].level, 1)
+        with testtools.ExpectedException(TypeError):
+            a.Ancestors[0]["name"] = "Other"
+        c = mstr.MSTRObject("C", {"ancestors": [dict(rows[0]["ancestors"][0], extra=1)]})
+        self.assertIs(c.Ancestors, a.Ancestors, "Only id, name and level are kept")
+        self.assertEqual(a.Comments, [])
+        metric = mstr.MSTRMetric("M1", {"name": "Revenue", "type": "Metric"})
+        self.assertFalse(hasattr(metric, "__dict__"), "MSTRMetric should use __slots__")
+        self.assertEqual(hash(metric), hash(mstr.MSTRMetric("M1", {"name": "Revenue"})), "Wrong hash of metrics")
+        self.assertEqual((metric > 10).todict()["operands"][0], metric.todict())
+
+        table = mstr.MSTRObjectTable(rows)
+        self.assertEqual(len(table), 4)
+        self.assertEqual(table[1].Name, "Report 1")
+        self.assertEqual(table[-1].ID, "%032X" % 3)
+        self.assertEqual(table.find("%032X" % 2).Type, mstr.EnumDSSObjectType.DSSTYPEMETRIC)
+        self.assertIsNone(table.find("missing"))
+        self.assertEqual(table.getColumn("type"), [4, 3, 4, 3])
+        self.assertEqual(table[0].Subtype, mstr.EnumDSSSubTypes.DSSSUBTYPEREPORTGRID)
+        self.assertEqual(len({id(p) for p in table.getColumn("ancestors")}), 1, "Ancestor paths should be shared")
+        self.assertEqual([o.Name for o in table[1:3]], ["Report 1", "Report 2"])
+
+    def test_mstrenumsearchname(self):
+        """ Testing BaseMSTREnum searchName lookups"""
+        self.assertEqual(mstr.EnumDSSObjectType.searchName("Attribute"), mstr.EnumDSSObjectType.DSSTYPEATTRIBUTE)
+        self.assertEqual(mstr.EnumDSSObjectType.searchName("aTTRIBUTE"), mstr.EnumDSSObjectType.DSSTYPEATTRIBUTE)
+        self.assertEqual(mstr.EnumDSSSubTypes.searchName("ReportCube"), mstr.EnumDSSSubTypes.DSSSUBTYPEREPORTCUBE)
+        self.assertEqual(mstr.EnumDssXmlSearchType.searchName("Contains"),
+                         mstr.EnumDssXmlSearchType.DSSXMLSEARCHTYPECONTAINS)
+        self.assertIsNone(mstr.EnumDSSObjectType.searchName("DSSTYPEATTRIBUTE"), "The prefix is not part of the name")
+        self.assertIsNone(mstr.EnumDSSObjectType.searchName("NotAType"))
+        self.assertIsNone(mstr.EnumDSSObjectType.searchName("NotAType"), "Wrong cached miss")
+        self.assertIsNone(mstr.EnumDSSObjectType.searchName(None))
+        self.assertIsNone(mstr.MSTRObject("1", {"type": "NotAType"}).Type)
+
     def test_mstrconstant(self):
         """ Testing MSTRConstant class"""
         m = mstr.MSTRConstant(3)
@@ -112,4 +194,321 @@ class TestMSTR(testtools.TestCase):
             "form": {"id": "45C11FA478E745FEA08D781CEA190FE5", "name": "ID"},
         }, {
             "type": "constant", "dataType": "Real", "value": "1"
-        }]}]}}, "Reading dict expression failed")
\ No newline at end of file
+        }]}]}}, "Reading dict expression failed")
+
+    def test_mstrviewfiltertemplate(self):
+        """ Testing MSTRViewFiler compiled templates
+        """
+        d = {"name": "Region", "id": "8D679D4B11D3E4981000E787EC6DE8A4", "type": "Attribute",
+             "forms": [{"id": "CCFBE2A5EADB4F50941FB879CCF1721C", "name": "DESC", "dataType": "Char"},
+                       {"id": "45C11FA478E745FEA08D781CEA190FE5", "name": "ID", "dataType": "Real"}]}
+        a = mstr.MSTRAttribute(d["id"], d)
+
+        def explist(pId, pName):
+            return ['(', '(', a.Forms["ID"], mstr.MSTROperatorEquals(), mstr.MSTRConstant(pId, 'Real'), ')',
+                    mstr.MSTROperatorOr(), '(', a.Forms["DESC"], mstr.MSTROperatorBeginsWith(),
+                    mstr.MSTRConstant(pName), ')', ')']
+
+        m1 = mstr.MSTRViewFiler(explist(1, "North"))
+        m2 = mstr.MSTRViewFiler(explist(2, 'So"uth'))
+        self.assertIs(m1.Template, m2.Template, "Same filter shape should share the template")
+        self.assertEqual(m2.todict(), {"viewFilter": m2.Tree.todict()}, "Bound template differs from parse tree")
+        self.assertEqual(m1.Template.Slots, ["Real", "Char"], "Wrong template slots")
+        self.assertEqual(m1.Template.bind([3, "East"])["viewFilter"]["operands"][1]["operands"][1]["value"], "East",
+                         "Wrong bound value")
+        self.assertEqual(json.loads(m2.tojson()), m2.todict())
+        with testtools.ExpectedException(ValueError):
+            m1.Template.bindJSON([1])
+
+        m3 = mstr.MSTRViewFiler(['(', a.Forms["DESC"], mstr.MSTROperatorEquals(), mstr.MSTRConstant("North"), ')'])
+        self.assertIsNot(m1.Template, m3.Template, "Other filter shape should be compiled")
+
+    def test_mstrviewfilterflatten(self):
+        """ Testing MSTRViewFiler n-ary expressions
+        """
+        d = {"name": "Region", "id": "8D679D4B11D3E4981000E787EC6DE8A4", "type": "Attribute",
+             "forms": [{"id": "CCFBE2A5EADB4F50941FB879CCF1721C", "name": "DESC", "dataType": "Char"},
+                       {"id": "45C11FA478E745FEA08D781CEA190FE5", "name": "ID", "dataType": "Real"}]}
+        a = mstr.MSTRAttribute(d["id"], d)
+
+        # (ID = 0 Or (ID = 1 Or (ID = 2 ...)))
+        explist = []
+        for i in range(4999):
+            explist += ['(', '(', a.Forms["ID"], mstr.MSTROperatorEquals(), mstr.MSTRConstant(i, 'Real'), ')',
+                        mstr.MSTROperatorOr()]
+        explist += ['(', a.Forms["ID"], mstr.MSTROperatorEquals(), mstr.MSTRConstant(4999, 'Real'), ')']
+        explist += [')'] * 4999
+        f = mstr.MSTRViewFiler(explist).todict()["viewFilter"]
+        self.assertEqual(f["operator"], "In", "Or of Equals should be an In")
+        self.assertEqual(f["operands"][0]["form"]["name"], "ID")
+        self.assertEqual(f["operands"][1], {"type": "constants", "dataType": "Real",
+                                            "values": [str(i) for i in range(5000)]}, "Wrong In values")
+
+        explist = ['(', '(', a.Forms["ID"], mstr.MSTROperatorEquals(), mstr.MSTRConstant(1, 'Real'), ')',
+                   mstr.MSTROperatorAnd(), '(', a.Forms["DESC"], mstr.MSTROperatorBeginsWith(),
+                   mstr.MSTRConstant("N"), ')', mstr.MSTROperatorAnd(), '(', a.Forms["DESC"],
+                   mstr.MSTROperatorNotEquals(), mstr.MSTRConstant("North"), ')', ')']
+        f = mstr.MSTRViewFiler(explist).todict()["viewFilter"]
+        self.assertEqual(f["operator"], "And")
+        self.assertEqual([o["operator"] for o in f["operands"]], ["Equals", "BeginsWith", "NotEquals"],
+                         "And chain should be flattened")
+
+        explist = ['(', a.Forms["DESC"], mstr.MSTROperatorIn(), mstr.MSTRConstants(["North", "South"]), ')']
+        m = mstr.MSTRViewFiler(explist)
+        self.assertEqual(m.todict()["viewFilter"]["operands"][1]["values"], ["North", "South"])
+        self.assertEqual(m.Template.bind([["East", "West", "Central"]])["viewFilter"]["operands"][1]["values"],
+                         ["East", "West", "Central"], "Wrong bound In values")
+
+    def test_mstrfilterexpressions(self):
+        """ Testing filter expressions built with operators
+        """
+        d = {"name": "Region", "id": "8D679D4B11D3E4981000E787EC6DE8A4", "type": "Attribute",
+             "forms": [{"id": "CCFBE2A5EADB4F50941FB879CCF1721C", "name": "DESC", "dataType": "Char"},
+                       {"id": "45C11FA478E745FEA08D781CEA190FE5", "name": "ID", "dataType": "Integer"}]}
+        a = mstr.MSTRAttribute(d["id"], d)
+        m = mstr.MSTRMetric("4C05177011D3E877C000B3B2D86C964F", {"name": "Revenue", "type": 4})
+
+        e = (a.Forms["ID"] == 1) & ~a.Forms["DESC"].beginsWith("N") & (m > 10)
+        explist = ['(', '(', '(', a.Forms["ID"], mstr.MSTROperatorEquals(), mstr.MSTRConstant(1, 'Real'), ')',
+                   mstr.MSTROperatorAnd(), '(', mstr.MSTROperatorNot(), '(', a.Forms["DESC"],
+                   mstr.MSTROperatorBeginsWith(), mstr.MSTRConstant("N", 'Char'), ')', ')', ')',
+                   mstr.MSTROperatorAnd(), '(', m, mstr.MSTROperatorGreater(), mstr.MSTRConstant(10, 'Real'), ')',
+                   ')']
+        self.assertEqual(mstr.MSTRViewFiler(e).todict(), mstr.MSTRViewFiler(explist).todict(),
+                         "Expression differs from the expression list")
+        self.assertEqual(e.Operator, "And")
+        self.assertEqual(len(e.Operands), 3, "And chain should be flat")
+
+        self.assertEqual(hash(e), hash((a.Forms["ID"] == 1) & ~a.Forms["DESC"].beginsWith("N") & (m > 10)))
+        self.assertEqual(e, (a.Forms["ID"] == 1) & ~a.Forms["DESC"].beginsWith("N") & (m > 10))
+        self.assertNotEqual(e, (a.Forms["ID"] == 2) & ~a.Forms["DESC"].beginsWith("N") & (m > 10))
+        self.assertIs(mstr.MSTRViewFiler(e).Template,
+                      mstr.MSTRViewFiler((a.Forms["ID"] == 5) & ~a.Forms["DESC"].beginsWith("S") & (m > 0)).Template,
+                      "Same expression shape should share the template")
+        self.assertEqual(len({a.Forms["ID"], a.Forms["ID"], a.Forms["DESC"], m}), 3, "Objects should be hashable")
+
+        f = mstr.MSTRViewFiler(a.Forms["DESC"].isin(["North", "South"]) | a.Forms["DESC"].contains("th"))
+        self.assertEqual(f.todict()["viewFilter"]["operands"][0]["operands"][1],
+                         {"type": "constants", "dataType": "Char", "values": ["North", "South"]})
+        with testtools.ExpectedException(TypeError):
+            (m > 10) and (a.Forms["ID"] == 1)
+        with testtools.ExpectedException(TypeError):
+            a.Forms["DESC"].contains("th") or (m > 10)
+
+        # Equal but distinct objects still compare as plain objects
+        m2 = mstr.MSTRMetric("4C05177011D3E877C000B3B2D86C964F", {"name": "Revenue", "type": 4})
+        m3 = mstr.MSTRMetric("5C05177011D3E877C000B3B2D86C964F", {"name": "Cost", "type": 4})
+        self.assertIn(m2, [m3, m], "Membership of an equal metric")
+        self.assertNotIn(m3, [m])
+        self.assertEqual([m3, m].index(m2), 1)
+        self.assertEqual({m: 1}[m2], 1, "Dict lookup of an equal metric")
+        self.assertEqual(len({m, m2, m3}), 2, "Equal metrics should be one set element")
+        self.assertFalse(m == None)
+        self.assertTrue(m != None)
+        self.assertTrue(bool(m2 == m) and not bool(m3 == m) and bool(m3 != m))
+        form = mstr.MSTRAttribute(d["id"], d).Forms["ID"]
+        self.assertIn(form, [a.Forms["DESC"], a.Forms["ID"]], "Membership of an equal form")
+        self.assertEqual({a.Forms["ID"]: 1}[form], 1, "Dict lookup of an equal form")
+
+        # Plain values, sorting and updates
+        self.assertNotIn("x", [m, form], "Objects should not equal plain values")
+        self.assertFalse(m == "x")
+        self.assertTrue(form != 1)
+        self.assertFalse(m == ["x"])
+        self.assertEqual(sorted([m3, m, m2]), [m, m2, m3], "Objects should sort by identity")
+        self.assertEqual([f.ID for f in sorted(a.Forms.values())], sorted(f.ID for f in a.Forms.values()))
+        with testtools.ExpectedException(TypeError):
+            bool(m > 10)
+        objects = {m: "m", form: "form"}
+        key = hash(m)
+        m.update({"name": "Renamed", "type": 4})
+        form.update({"id": form.ID, "name": "Renamed", "dataType": "Char"})
+        self.assertEqual(hash(m), key, "Hash should not change with update")
+        self.assertEqual((objects[m], objects[form]), ("m", "form"), "Updated objects lost in a dict")
+        self.assertIn(m2, objects, "Updated object should still equal an object with the same ID")
+
+    def test_mstrcolumnarfilter(self):
+        """ Testing MSTRColumnarResults local filter evaluation
+        """
+        region = mstr.MSTRAttribute("8D679D4B11D3E4981000E787EC6DE8A4", {
+            "name": "Region", "type": 12, "forms": [{"id": "CCFBE2A5EADB4F50941FB879CCF1721C", "name": "DESC",
+                                                     "dataType": "Char"}]}).Forms["DESC"]
+        year = mstr.MSTRAttribute("8D679D4C11D3E4981000E787EC6DE8A4", {
+            "name": "Year", "type": 12, "forms": [{"id": "45C11FA478E745FEA08D781CEA190FE5", "name": "ID",
+                                                   "dataType": "Integer"}]}).Forms["ID"]
+        revenue = mstr.MSTRMetric("4C05177011D3E877C000B3B2D86C964F", {"name": "Revenue", "type": 4})
+        cost = mstr.MSTRMetric("4C051DB611D3E877C000B3B2D86C964F", {"name": "Cost", "type": 4})
+        c = mstr.MSTRDatasetResults(RESULTS).getColumnarResults()
+
+        for useNumpy in (True, False):
+            evaluator = mstr.MSTRColumnarFilter(c)
+            if not useNumpy:
+                evaluator._np = None
+            self.assertEqual(evaluator.filter(region == "North").todict()["Revenue"], [10.0, 20.0])
+            self.assertEqual(evaluator.filter((year >= 2018) | (revenue > 25)).todict()["Region"],
+                             ["North", "South"], "Wrong Or")
+            self.assertEqual(evaluator.filter(~region.beginsWith("N") & (revenue < 100)).todict()["Year"], ["2017"])
+            self.assertEqual(len(evaluator.filter(cost > 0)), 1, "Missing values should not match")
+            self.assertEqual(evaluator.filter(region.like("_or%")).todict()["Revenue"], [10.0, 20.0])
+            self.assertEqual(evaluator.filter(year.isin([2017])).todict()["Revenue"], [10.0, 30.0])
+            self.assertEqual(len(evaluator.filter(region == "East")), 0)
+            self.assertEqual(len(evaluator.filter(~(cost > 0))), 0, "Negated missing values should not match")
+            self.assertEqual(evaluator.filter(~(cost > 5)).todict()["Cost"], [4.5])
+            self.assertEqual(evaluator.filter(~(~(cost > 0) | (revenue > 100))).todict()["Cost"], [4.5])
+
+        ragged = mstr.MSTRColumnarResults({"Region": (["North", "South"], array('i', [0, -1, 1]))},
+                                          {"Revenue": array('d', [1, 2, 3])})
+        for useNumpy in (True, False):
+            evaluator = mstr.MSTRColumnarFilter(ragged)
+            if not useNumpy:
+                evaluator._np = None
+            self.assertEqual(evaluator.filter(~region.contains("or")).todict()["Revenue"], [3.0],
+                             "Negated missing elements should not match")
+            notContains = ['(', region, mstr.MSTROperatorNotContains(), mstr.MSTRConstant("or"), ')']
+            self.assertEqual(evaluator.filter(notContains).todict()["Revenue"], [3.0])
+            self.assertEqual(evaluator.filter(~region.isin(["North"])).todict()["Revenue"], [3.0])
+
+        explist = ['(', region, mstr.MSTROperatorEquals(), mstr.MSTRConstant("South"), ')']
+        self.assertEqual(c.filter(explist).todict()["Revenue"], [30.0], "Expression lists should be evaluated")
+        with testtools.ExpectedException(mstr.MSTRError):
+            c.filter(revenue.contains("1"))
+
+    def test_mstrcolumnarresults(self):
+        """ Testing MSTRColumnarResults decoding
+        """
+        c = mstr.MSTRDatasetResults(RESULTS).getColumnarResults()
+
+        self.assertEqual(len(c), 3, "Wrong number of rows")
+        self.assertEqual(c.AttributeNames, ["Region", "Year"], "Wrong attribute columns")
+        self.assertEqual(c.getCategories("Year"), ["2017", "2018"], "Wrong attribute categories")
+        self.assertEqual(list(c.getCodes("Year")), [0, 1, 0], "Wrong attribute codes")
+        d = c.todict()
+        self.assertEqual(d["Region"], ["North", "North", "South"], "Wrong decoded attribute")
+        self.assertEqual(d["Revenue"], [10.0, 20.0, 30.0], "Wrong metric values")
+        self.assertEqual(d["Cost"][0], 4.5, "Wrong metric values")
+        self.assertTrue(math.isnan(d["Cost"][1]) and math.isnan(d["Cost"][2]), "Missing metrics should be NaN")
+
+        # No element of the previous branch must leak into the branches without it
+        ragged = mstr.MSTRDatasetResults(RAGGED_RESULTS)
+        self.assertEqual([(row["Region"], row["Year"]) for row in ragged.iterRows()],
+                         [("North", "2017"), ("South", None), (None, "2018")], "Stale element in a ragged branch")
+        c = ragged.getColumnarResults()
+        self.assertEqual(list(c.getCodes("Year")), [0, -1, 1], "Stale element in a ragged branch")
+        self.assertEqual(list(c.getCodes("Region")), [0, 1, -1], "Stale element in a ragged branch")
+        self.assertEqual(c.todict()["Year"], ["2017", None, "2018"], "Missing elements should be None")
+
+    @testtools.skipIf(pandas is None, "pandas is not installed")
+    def test_mstrdataframeresults(self):
+        """ Testing MSTRDatasetResults pandas output
+        """
+        df = mstr.MSTRDatasetResults(RESULTS).getDataframeResults()
+
+        self.assertEqual(list(df.columns), ["Region", "Year", "Revenue", "Cost"], "Wrong columns")
+        self.assertEqual(str(df["Region"].dtype), "category", "Attributes should be categorical")
+        self.assertEqual(list(df["Year"]), ["2017", "2018", "2017"], "Wrong attribute values")
+        self.assertEqual(df["Revenue"].sum(), 60.0, "Wrong metric values")
+
+    def test_mstrresultrows(self):
+        """ Testing MSTRDatasetResults row flattening
+        """
+        r = mstr.MSTRDatasetResults(RESULTS)
+
+        rows = list(r.iterRows())
+        self.assertEqual(len(rows), 3, "Wrong number of rows")
+        self.assertEqual(rows[0], {"Region": "North", "Year": "2017", "Revenue": 10, "Cost": 4.5}, "Wrong row")
+        self.assertEqual(rows[1]["Cost"], None, "Missing metrics should be None")
+        self.assertEqual(rows[2][0], "South", "Reading row by position failed")
+        self.assertIs(rows[0]._header, rows[1]._header, "Rows should share the header")
+        self.assertFalse(hasattr(rows[0], "__dict__"), "Rows should not have a __dict__")
+
+        # Repeated calls must not accumulate rows between them
+        self.assertEqual(len(r.getQueryResults()), 3, "Wrong number of query results")
+        self.assertEqual(len(r.getQueryResults()), 3, "Query results leaked between calls")
+        self.assertEqual(r.getQueryResults()[2]["attributes"]["Region"], {"attributeIndex": 0, "name": "South",
+                                                                           "id": "hS"}, "Wrong query results")
+
+        # Reports with attributes only
+        r = mstr.MSTRDatasetResults({"result": {"definition": {"attributes": [{"name": "Region"}]},
+                                                "data": {"root": {"children": [
+                                                    {"element": {"attributeIndex": 0, "name": "North"}},
+                                                    {"element": {"attributeIndex": 0, "name": "South"}}]}}}})
+        self.assertEqual([row["Region"] for row in r.iterRows()], ["North", "South"], "Wrong attribute rows")
+        self.assertEqual(r.getColumnarResults().todict(), {"Region": ["North", "South"]}, "Wrong attribute columns")
+        leaves = [([x["name"] for x in e], m) for e, m in
+                  mstr.stream.MSTRResultStreamParser().iterLeaves([json.dumps(r._json).encode("utf-8")])]
+        self.assertEqual(leaves, [(["North"], {}), (["South"], {})], "Wrong streamed attribute rows")
+
+    def test_mstrresultrowsdeep(self):
+        """ Testing MSTRDatasetResults flattening deeper than the recursion limit
+        """
+        depth = 3000
+        leaf = {"depth": depth - 1, "element": {"attributeIndex": depth - 1, "name": "leaf"},
+                "metrics": {"M": {"rv": 1}}}
+        for d in range(depth - 2, -1, -1):
+            leaf = {"depth": d, "element": {"attributeIndex": d, "name": "e%s" % d}, "children": [leaf]}
+        r = mstr.MSTRDatasetResults({"result": {
+            "definition": {"attributes": [{"name": "A%s" % d} for d in range(depth)], "metrics": [{"name": "M"}]},
+            "data": {"root": {"children": [leaf]}}}})
+
+        rows = list(r.iterRows())
+        self.assertEqual(len(rows), 1, "Wrong number of rows")
+        self.assertEqual(rows[0]["A%s" % (depth - 1)], "leaf", "Wrong deep row")
+
+    def test_mstrresultstreamparser(self):
+        """ Testing incremental decoding of dataset results
+        """
+        payload = json.dumps(RESULTS, indent=1).encode("utf-8")
+        expected = [([x["name"] for x in e], m) for e, m in
+                    ((list(e), m) for e, m in mstr.MSTRDatasetResults(RESULTS).iterLeaves())]
+
+        for size in (1, 7, 64, len(payload)):
+            p = mstr.stream.MSTRResultStreamParser()
+            chunks = (payload[i:i + size] for i in range(0, len(payload), size))
+            leaves = [([x["name"] for x in e], m) for e, m in p.iterLeaves(chunks)]
+            self.assertEqual(leaves, expected, "Wrong leaves reading chunks of %s bytes" % size)
+            skeleton = p.Document
+            self.assertEqual(skeleton["instanceId"], RESULTS["instanceId"], "Wrong skeleton document")
+            self.assertEqual(skeleton["result"]["definition"], RESULTS["result"]["definition"],
+                             "Wrong skeleton document")
+            self.assertEqual(skeleton["result"]["data"]["root"]["children"], [], "Rows kept in the skeleton")
+
+        with testtools.ExpectedException(ValueError):
+            list(mstr.stream.MSTRResultStreamParser().iterLeaves([payload[:len(payload) // 2]]))
+
+        leaves = [[x and x["name"] for x in e] for e, _ in
+                  mstr.stream.MSTRResultStreamParser().iterLeaves([json.dumps(RAGGED_RESULTS).encode("utf-8")])]
+        self.assertEqual(leaves, [["North", "2017"], ["South", None], [None, "2018"]],
+                         "Stale element in a ragged branch")
+
+    def test_mstrstreamedresults(self):
+        """ Testing MSTRStreamedResults rows against the buffered results
+        """
+        class Response:
+            def __init__(self, pPayload):
+                self.payload = pPayload
+
+            def iter_content(self, pSize):
+                return (self.payload[i:i + pSize] for i in range(0, len(self.payload), pSize))
+
+            def close(self):
+                pass
+
+        # The second element is not an attribute of the definition
+        extra = {"instanceId": "FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF", "result": {
+            "definition": {"attributes": [{"name": "A"}], "metrics": [{"name": "M"}]},
+            "data": {"paging": {"total": 1}, "root": {"children": [
+                {"element": {"attributeIndex": 0, "name": "a"}, "children": [
+                    {"element": {"attributeIndex": 1, "name": "x"}, "metrics": {"M": {"rv": 1}}}]}]}}}}
+        for results in (RESULTS, RAGGED_RESULTS, extra):
+            streamed = mstr.mstr.MSTRStreamedResults(Response(json.dumps(results).encode("utf-8")))
+            streamed.CHUNK_SIZE = 16
+            self.assertEqual([dict(row) for row in streamed.iterRows()],
+                             [dict(row) for row in mstr.MSTRDatasetResults(results).iterRows()],
+                             "Streamed and buffered rows differ")
+        self.assertEqual(streamed.Total, 1)
+
+        streamed = mstr.mstr.MSTRStreamedResults(Response(json.dumps(extra).encode("utf-8")))
+        with testtools.ExpectedException(mstr.MSTRError):
+            streamed.Total
+        with testtools.ExpectedException(mstr.MSTRError):
+            streamed.InstanceId
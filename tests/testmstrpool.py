@@ -0,0 +1,68 @@
+import datetime
+from requests_mock.contrib import fixture
+import testtools
+import mstr
+
+
+class TestMSTRSessionPool(testtools.TestCase):
+
+    BASE_URL = 'http://pool.pxltd.ca:8080/MicroStrategyLibrary/api'
+    LOGIN_URL = BASE_URL + '/auth/login'
+    LOGOUT_URL = BASE_URL + '/auth/logout'
+    SESSION_URL = BASE_URL + '/sessions'
+
+    def setUp(self):
+        super(TestMSTRSessionPool, self).setUp()
+        self.requests_mock = self.useFixture(fixture.Fixture())
+        self.requests_mock.register_uri('POST', self.LOGIN_URL, headers={"X-MSTR-AuthToken": "FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF"})
+        self.requests_mock.register_uri('POST', self.LOGOUT_URL, status_code=204)
+        self.requests_mock.register_uri('GET', self.SESSION_URL, status_code=204)
+
+    def getLogins(self):
+        return len([r for r in self.requests_mock.request_history if r.url == self.LOGIN_URL])
+
+    def test_mstrsessionpoolcheckout(self):
+        """testing MSTRSessionPool checkout and checkin"""
+        pool = mstr.MSTRSessionPool(self.BASE_URL + '/', 'user', 'password', size=2)
+        s1 = pool.checkout()
+        s2 = pool.checkout()
+        self.assertIsNot(s1, s2, "Checked out sessions should be different")
+        self.assertEqual(pool.created, 2, "Wrong number of sessions")
+        with testtools.ExpectedException(mstr.MSTRError):
+            pool.checkout(timeout=0.1)
+
+        pool.checkin(s1)
+        with pool.session() as s3:
+            self.assertIs(s3, s1, "Idle session should be reused")
+        self.assertEqual(self.getLogins(), 2, "Sessions should only log in once")
+
+        # Expired sessions are logged in again when checked out
+        self.requests_mock.register_uri('GET', self.SESSION_URL, status_code=404,
+                                        json={"code": "ERR009", "message": "The users session has expired"})
+        s1.AuthToken.issuedOn = datetime.datetime.now() - datetime.timedelta(seconds=500)
+        self.assertIs(pool.checkout(), s1, "Idle session should be reused")
+        self.assertEqual(self.getLogins(), 3, "Expired session should log in again")
+
+        pool.checkin(s1)
+        pool.checkin(s2)
+        pool.close()
+        self.assertEqual(pool.created, 0, "Closed pool should log out its sessions")
+        with testtools.ExpectedException(mstr.MSTRError):
+            pool.checkout()
+
+    def test_mstrsessionpoolserverlimit(self):
+        """testing MSTRSessionPool limit of sessions per server"""
+        url = self.BASE_URL + '/limit/'
+        self.requests_mock.register_uri('POST', url + 'auth/login', headers={"X-MSTR-AuthToken": "FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF"})
+        self.requests_mock.register_uri('POST', url + 'auth/logout', status_code=204)
+        pool1 = mstr.MSTRSessionPool.getPool(url, 'user1', 'password', size=2, maxServerSessions=2)
+        pool2 = mstr.MSTRSessionPool.getPool(url, 'user2', 'password', size=2)
+        self.assertIs(mstr.MSTRSessionPool.getPool(url, 'user1', 'password'), pool1, "Pools should be shared")
+
+        s1 = pool1.checkout()
+        pool2.checkout()
+        with testtools.ExpectedException(mstr.MSTRError):
+            pool1.checkout(timeout=0.1)
+        pool1.close()
+        pool1.checkin(s1)
+        self.assertIsNotNone(pool2.checkout(timeout=0.1), "Server slot should be released")
@@ -1,12 +1,33 @@
 import unittest
+import fixtures
 import requests_mock
 from requests_mock.contrib import fixture
 import testtools
+import threading
 import time
 import datetime
+import os
 import mstr
 
 
+def datasetResult(pRegions, pOffset=0, pLimit=None, pInstanceId="FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF"):
+    """ Builds an instance response with Region -> Year rows and one Revenue metric per row"""
+    rows = [(r, y) for r in pRegions for y in ("2017", "2018")]
+    page = rows[pOffset:pOffset + pLimit if pLimit is not None else len(rows)]
+    children = []
+    for r, y in page:
+        if len(children) == 0 or children[-1]["element"]["name"] != r:
+            children.append({"depth": 0, "element": {"attributeIndex": 0, "name": r, "id": "h" + r}, "children": []})
+        children[-1]["children"].append({"depth": 1, "element": {"attributeIndex": 1, "name": y, "id": "h" + y},
+                                         "metrics": {"Revenue": {"rv": len(r) * int(y), "fv": str(len(r))}}})
+    return {"instanceId": pInstanceId,
+            "result": {"definition": {"attributes": [{"name": "Region", "id": "A1"}, {"name": "Year", "id": "A2"}],
+                                      "metrics": [{"name": "Revenue", "id": "M1"}]},
+                       "data": {"paging": {"total": len(rows), "current": len(page), "offset": pOffset,
+                                           "limit": pLimit},
+                                "root": {"isPartial": False, "children": children}}}}
+
+
 class TestMSTRSession(testtools.TestCase):
 
     # ...     def test_method(self):
@@ -18,6 +39,8 @@ class TestMSTRSession(testtools.TestCase):
     BASE_URL = 'http://demo.pxltd.ca:8080/MicroStrategyLibrary/api'
     LOGIN_URL = BASE_URL + '/auth/login'
     SESSION_URL = BASE_URL + '/sessions'
+    REPORT_ID = "0123456789ABCDEF0123456789ABCDEF"
+    INSTANCES_URL = BASE_URL + '/reports/' + REPORT_ID + '/instances'
 
     def setUp(self):
         super(TestMSTRSession, self).setUp()
@@ -63,3 +86,462 @@ class TestMSTRSession(testtools.TestCase):
         # Force aging of token for testing
         mstrsession.AuthToken.issuedOn = datetime.datetime.now() - datetime.timedelta(seconds=500)
         self.assertEqual(mstrsession.isValid, False, "Revalidation after expiration failed")
+
+    def getSession(self):
+        self.requests_mock.register_uri('POST', self.LOGIN_URL, headers={"X-MSTR-AuthToken": "FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF"})
+        return mstr.MSTRSession('http://demo.pxltd.ca:8080/MicroStrategyLibrary/api/', 'user', 'password', autoopen=True, autoload=False)
+
+    def getDataset(self):
+        report = mstr.MSTRObject(self.REPORT_ID, {"name": "Revenue by Region", "type": 3, "subtype": 768})
+        return mstr.MSTRDatasetDefinition(report, {"result": {"definition": {"availableObjects": {
+            "attributes": [], "metrics": []}}}})
+
+    def registerInstances(self, pRegions):
+        def page(request, context):
+            return datasetResult(pRegions, int(request.qs["offset"][0]), int(request.qs["limit"][0]))
+        self.requests_mock.register_uri('POST', self.INSTANCES_URL, json=page)
+        self.requests_mock.register_uri('GET', self.INSTANCES_URL + '/FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF', json=page)
+
+    def test_mstrsessioniterdata(self):
+        """testing MSTRSession Class iterData paginated method"""
+        mstrsession = self.getSession()
+        self.registerInstances(["North", "South", "East", "West", "Central"])
+
+        pages = list(mstrsession.getDataPages(self.getDataset(), pPageSize=3))
+        self.assertEqual(len(pages), 4, "Wrong number of pages")
+        self.assertEqual([p.Paging["offset"] for p in pages], [0, 3, 6, 9], "Wrong page offsets")
+
+        rows = list(mstrsession.iterData(self.getDataset(), pPageSize=3))
+        self.assertEqual(len(rows), 10, "Wrong number of rows")
+        self.assertEqual(rows[0], {"Region": "North", "Year": "2017", "Revenue": 5 * 2017}, "Wrong first row")
+        self.assertEqual(rows[-1], {"Region": "Central", "Year": "2018", "Revenue": 7 * 2018}, "Wrong last row")
+
+    def test_mstrsessionprefetchdata(self):
+        """testing MSTRSession Class getDataPages concurrent prefetch"""
+        mstrsession = self.getSession()
+        regions = ["Region %s" % i for i in range(20)]
+        self.registerInstances(regions)
+
+        pages = list(mstrsession.getDataPages(self.getDataset(), pPageSize=3, pWorkers=4))
+        self.assertEqual([p.Paging["offset"] for p in pages], list(range(0, 40, 3)), "Pages returned out of order")
+
+        rows = list(mstrsession.iterData(self.getDataset(), pPageSize=3, pWorkers=4))
+        self.assertEqual(rows, list(mstrsession.iterData(self.getDataset(), pPageSize=3)),
+                         "Concurrent and sequential rows differ")
+
+    def test_mstrsessioncolumnardata(self):
+        """testing MSTRSession Class getColumnarData method"""
+        mstrsession = self.getSession()
+        self.registerInstances(["North", "South", "East", "West", "Central"])
+
+        c = mstrsession.getColumnarData(self.getDataset(), pPageSize=3)
+        self.assertEqual(len(c), 10, "Wrong number of rows")
+        self.assertEqual(c.getCategories("Region"), ["North", "South", "East", "West", "Central"],
+                         "Categories should be shared across pages")
+        self.assertEqual(c.todict()["Revenue"], [float(r["Revenue"]) for r in mstrsession.iterData(self.getDataset())],
+                         "Columnar and row values differ")
+
+    def test_mstrsessionstreamdata(self):
+        """testing MSTRSession Class iterData streamed decoding"""
+        mstrsession = self.getSession()
+        self.registerInstances(["North", "South", "East", "West", "Central"])
+
+        rows = list(mstrsession.iterData(self.getDataset(), pPageSize=3, pStream=True))
+        self.assertEqual(rows, list(mstrsession.iterData(self.getDataset(), pPageSize=3)),
+                         "Streamed and buffered rows differ")
+
+        page = next(mstrsession.getDataPages(self.getDataset(), pPageSize=3, pStream=True))
+        self.assertIsInstance(page, mstr.mstr.MSTRStreamedResults)
+        self.assertEqual(len(list(page.iterRows())), 3, "Wrong number of streamed rows")
+        self.assertEqual(page.Total, 10, "Paging information not available after reading the stream")
+        with testtools.ExpectedException(mstr.MSTRError):
+            list(page.iterRows())
+
+    def test_mstrsessionmetadatacache(self):
+        """testing MSTRSession Class metadata cache"""
+        mstrsession = self.getSession()
+        mstrsession.cache = mstr.MSTRCache()
+        definition = {"result": {"definition": {"availableObjects": {
+            "attributes": [{"name": "Region", "id": "8D679D4B11D3E4981000E787EC6DE8A4", "type": "Attribute",
+                            "forms": [{"id": "CCFBE2A5EADB4F50941FB879CCF1721C", "name": "DESC", "dataType": "Char"}]}],
+            "metrics": [{"name": "Revenue", "id": "4C05177011D3E877C000B3B2D86C964F", "type": "Metric"}]}}}}
+        self.requests_mock.register_uri('GET', self.BASE_URL + '/reports/' + self.REPORT_ID, json=definition)
+
+        report = mstr.MSTRObject(self.REPORT_ID, {"name": "Revenue by Region", "type": 3, "subtype": 768,
+                                                  "dateModified": "2017-11-23T15:16:56.589Z"})
+        d = mstrsession.getDatasetDefinition(report)
+        calls = self.requests_mock.call_count
+        d = mstrsession.getDatasetDefinition(report)
+        self.assertEqual(self.requests_mock.call_count, calls, "Cached definition should not call the server")
+        self.assertEqual(d.Attributes[0].Forms["DESC"].ID, "CCFBE2A5EADB4F50941FB879CCF1721C",
+                         "Wrong cached definition")
+
+        report = mstr.MSTRObject(self.REPORT_ID, {"name": "Revenue by Region", "type": 3, "subtype": 768,
+                                                  "dateModified": "2018-01-01T00:00:00.000Z"})
+        mstrsession.getDatasetDefinition(report)
+        self.assertEqual(self.requests_mock.call_count, calls + 1, "Modified report should be requested again")
+
+    def test_mstrsessionresultcache(self):
+        """testing MSTRSession Class getColumnarData results cache"""
+        mstrsession = self.getSession()
+        path = self.useFixture(fixtures.TempDir()).path
+        mstrsession.resultCache = mstr.MSTRResultCache(path)
+        self.registerInstances(["North", "South", "East", "West", "Central"])
+
+        c = mstrsession.getColumnarData(self.getDataset(), pPageSize=3)
+        calls = self.requests_mock.call_count
+        cached = mstrsession.getColumnarData(self.getDataset(), pPageSize=3)
+        self.assertEqual(self.requests_mock.call_count, calls, "Cached results should not call the server")
+        self.assertEqual(cached.todict(), c.todict(), "Cached results differ")
+        del cached
+
+        # Entries with truncated columns and empty entries are fetched again
+        for truncate in (lambda f: os.path.getsize(f) - 8, lambda f: 0):
+            for name in os.listdir(path):
+                os.truncate(os.path.join(path, name), truncate(os.path.join(path, name)))
+            calls = self.requests_mock.call_count
+            refetched = mstrsession.getColumnarData(self.getDataset(), pPageSize=3)
+            self.assertGreater(self.requests_mock.call_count, calls, "Bad cache entry should be fetched again")
+            self.assertEqual(refetched.todict(), c.todict(), "Fetched results differ")
+
+        region = mstr.MSTRAttribute("8D679D4B11D3E4981000E787EC6DE8A4", {"name": "Region", "type": "Attribute", "forms": [
+            {"id": "CCFBE2A5EADB4F50941FB879CCF1721C", "name": "DESC", "dataType": "Char"}]})
+        mstrsession.getColumnarData(self.getDataset(), pMstrFilterList=[
+            '(', region.Forms["DESC"], mstr.MSTROperatorEquals(), mstr.MSTRConstant("North"), ')'], pPageSize=3)
+        self.assertGreater(self.requests_mock.call_count, calls, "Other view filter should call the server")
+
+    def test_mstrsessionhttpsettings(self):
+        """testing MSTRSession Class connection pool, timeout and retry settings"""
+        self.requests_mock.register_uri('POST', self.LOGIN_URL, headers={"X-MSTR-AuthToken": "FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF"})
+        mstrsession = mstr.MSTRSession('http://demo.pxltd.ca:8080/MicroStrategyLibrary/api/', 'user', 'password',
+                                       autoopen=True, autoload=False, poolMaxSize=32, poolBlock=True,
+                                       connectTimeout=3, readTimeout=120, retries=4)
+        self.assertEqual(self.requests_mock.last_request.timeout, (3, 120), "Timeouts not used in the requests")
+
+        adapter = mstrsession._session.adapters["https://"]
+        self.assertEqual(adapter._pool_maxsize, 32, "Wrong connection pool size")
+        self.assertEqual(adapter._pool_block, True, "Wrong connection pool block setting")
+        self.assertEqual(adapter.max_retries.total, 4, "Wrong number of retries")
+        self.assertTrue(adapter.max_retries.is_retry('GET', 503), "Idempotent requests should be retried")
+        self.assertFalse(adapter.max_retries.is_retry('POST', 503), "POST requests should not be retried")
+
+        mstrsession = self.getSession()
+        self.assertEqual(self.requests_mock.last_request.timeout,
+                         (mstr.MSTRSession.CONNECT_TIMEOUT, mstr.MSTRSession.REQ_TIMEOUT), "Wrong default timeouts")
+        self.assertEqual(mstrsession._session.adapters["http://"].max_retries.total, 0, "Wrong default retries")
+
+    def test_mstrsessionreauthenticate(self):
+        """testing MSTRSession Class login and replay of requests rejected because the session expired"""
+        self.requests_mock.register_uri('POST', self.LOGIN_URL, [
+            {"headers": {"X-MSTR-AuthToken": "FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF"}},
+            {"headers": {"X-MSTR-AuthToken": "EEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEE"}}])
+        mstrsession = mstr.MSTRSession('http://demo.pxltd.ca:8080/MicroStrategyLibrary/api/', 'user', 'password',
+                                       autoopen=True, autoload=False)
+        self.requests_mock.register_uri('GET', self.BASE_URL + '/projects', [
+            {"status_code": 401, "json": {"code": "ERR003", "message": "The users session has expired"}},
+            {"json": [{"id": "P1", "name": "Tutorial", "alias": ""}]}])
+
+        self.assertEqual(mstrsession.getProjectList(), [{"id": "P1", "name": "Tutorial", "alias": ""}],
+                         "Request not replayed after login")
+        logins = [r for r in self.requests_mock.request_history if r.url == self.LOGIN_URL]
+        self.assertEqual(len(logins), 2, "Expired session should log in once")
+        self.assertEqual(self.requests_mock.last_request.headers["X-MSTR-AuthToken"],
+                         "EEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEE", "Replayed request should use the new token")
+
+        self.requests_mock.register_uri('GET', self.BASE_URL + '/projects', status_code=401,
+                                        json={"code": "ERR003", "message": "The users session has expired"})
+        with testtools.ExpectedException(mstr.MSTRError):
+            mstrsession.getProjectList()
+
+    def test_mstrsessionkeepalive(self):
+        """testing MSTRSession Class background session validation"""
+        self.requests_mock.register_uri('POST', self.LOGIN_URL, headers={"X-MSTR-AuthToken": "FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF"})
+        self.requests_mock.register_uri('POST', self.BASE_URL + '/auth/logout', status_code=204)
+        self.requests_mock.register_uri('GET', self.SESSION_URL, status_code=204)
+        mstrsession = mstr.MSTRSession('http://demo.pxltd.ca:8080/MicroStrategyLibrary/api/', 'user', 'password',
+                                       autoopen=False, autoload=False, keepAlive=True)
+        # The timer thread never fires, its function is called by the test
+        mstrsession.KEEPALIVE_INTERVAL = 3600
+        mstrsession.open("user", "password", autoload=False)
+        timer = mstrsession._keepAliveTimer
+        self.assertTrue(timer.isAlive(), "Keep alive not started")
+        timer.function()
+        checks = [r for r in self.requests_mock.request_history if r.url == self.SESSION_URL]
+        self.assertEqual(len(checks), 1, "Session not validated in the background")
+
+        # Validation is local while the keep alive runs
+        mstrsession.AuthToken.issuedOn = datetime.datetime.now() - datetime.timedelta(seconds=500)
+        calls = self.requests_mock.call_count
+        self.assertEqual(mstrsession.isValid, True)
+        self.assertEqual(self.requests_mock.call_count - calls, 0, "Validation with keep alive should be local")
+
+        # Expired on the server: the session stays valid while it logs in again
+        validDuringLogin = []
+
+        def login(request, context):
+            validDuringLogin.append(mstrsession.isValid)
+            context.headers["X-MSTR-AuthToken"] = "EEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEE"
+        self.requests_mock.register_uri('GET', self.SESSION_URL, status_code=401)
+        self.requests_mock.register_uri('POST', self.LOGIN_URL, text=login)
+        timer.function()
+        self.assertEqual(validDuringLogin, [True], "Session invalid while logging in again")
+        self.assertEqual(mstrsession.AuthToken.token, "EEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEE", "Session not renewed")
+        self.assertEqual(mstrsession.isValid, True)
+
+        self.requests_mock.register_uri('POST', self.LOGIN_URL, status_code=401,
+                                        json={"code": "ERR003", "message": "Wrong password"})
+        with testtools.ExpectedException(mstr.MSTRError):
+            timer.function()
+        self.assertEqual(mstrsession.isValid, False, "Failed login should invalidate the session")
+
+        mstrsession.close()
+        self.assertFalse(timer.isAlive(), "Keep alive not stopped by close")
+
+    def test_mstrsessionobjectsinformation(self):
+        """testing MSTRSession Class getObjectsInformation method"""
+        mstrsession = self.getSession()
+        mstrsession.cache = mstr.MSTRCache()
+
+        def info(request, context):
+            objectId = request.path.rsplit('/', 1)[-1].upper()
+            return {"id": objectId, "name": "Object " + objectId, "type": 3, "subtype": 768,
+                    "dateModified": "2017-11-23T15:16:56.589Z"}
+        self.requests_mock.register_uri('GET', requests_mock.ANY, json=info)
+
+        objects = [mstr.MSTRObject("%032X" % (i % 20), {"type": 3}) for i in range(50)]
+        self.assertIs(mstrsession.getObjectsInformation(objects, pWorkers=4), objects)
+        requested = [r for r in self.requests_mock.request_history if r.method == 'GET']
+        self.assertEqual(len(requested), 20, "Repeated objects should be requested once")
+        self.assertEqual([o.Name for o in objects], ["Object %032X" % (i % 20) for i in range(50)],
+                         "Objects not updated")
+
+        calls = self.requests_mock.call_count
+        mstrsession.getObjectsInformation([mstr.MSTRObject("%032X" % 3, {"type": 3})])
+        self.assertEqual(self.requests_mock.call_count, calls, "Cached objects should not call the server")
+
+        # A failed object does not lose the others
+        def failing(request, context):
+            if request.path.rsplit('/', 1)[-1].upper() == "%032X" % 21:
+                context.status_code = 404
+                return {"code": "ERR004", "message": "Object not found"}
+            return info(request, context)
+        self.requests_mock.register_uri('GET', requests_mock.ANY, json=failing)
+        objects = [mstr.MSTRObject("%032X" % i, {"type": 3}) for i in range(20, 24)]
+        errors = {}
+        self.assertIs(mstrsession.getObjectsInformation(objects, pErrors=errors), objects)
+        self.assertEqual(list(errors), [("%032X" % 21, 3)], "Failed object not reported")
+        self.assertEqual([o.Name for o in objects], ["Object %032X" % 20, None, "Object %032X" % 22,
+                                                     "Object %032X" % 23], "Objects that succeeded not updated")
+        objects = [mstr.MSTRObject("%032X" % i, {"type": 3}) for i in range(21, 25)]
+        with testtools.ExpectedException(mstr.MSTRError):
+            mstrsession.getObjectsInformation(objects)
+        self.assertEqual(objects[-1].Name, "Object %032X" % 24, "Objects that succeeded not updated")
+
+        # Cached objects are served with an invalid session
+        mstrsession._valid = False
+        objects = [mstr.MSTRObject("%032X" % i, {"type": 3}) for i in (3, 30)]
+        errors = {}
+        self.assertIs(mstrsession.getObjectsInformation(objects, pErrors=errors), objects)
+        self.assertEqual(objects[0].Name, "Object %032X" % 3, "Cached object not updated")
+        self.assertEqual(list(errors), [("%032X" % 30, 3)])
+        self.assertIsNone(mstrsession.getObjectsInformation(objects))
+
+    def test_mstrsessionquicksearch(self):
+        """testing MSTRSession Class quickSearchProject paged results"""
+        mstrsession = self.getSession()
+        found = [{"id": "%032X" % i, "name": "Report %s" % i, "type": 3, "subtype": 768} for i in range(25)]
+
+        def search(request, context):
+            offset, limit = int(request.qs["offset"][0]), int(request.qs["limit"][0])
+            return {"totalItems": len(found), "result": found[offset:offset + limit]}
+        self.requests_mock.register_uri('GET', self.BASE_URL + '/searches/results', json=search)
+
+        results = mstrsession.quickSearchProject("Report", pPageSize=10)
+        self.assertEqual(len(results), 25, "Wrong number of results")
+        self.assertEqual(results[3].Name, "Report 3")
+        self.assertEqual(results[-1].Name, "Report 24", "Wrong negative index")
+        self.assertEqual([o.Name for o in results[8:12]], ["Report 8", "Report 9", "Report 10", "Report 11"],
+                         "Wrong slice across pages")
+        self.assertIs(results[3], results[3], "Objects should be built once")
+        self.assertEqual([o.ID for o in results.Results], [f["id"] for f in found], "Wrong materialized results")
+        pages = [r.qs["offset"][0] for r in self.requests_mock.request_history if r.path.endswith("/results")]
+        self.assertEqual(sorted(pages), ["0", "10", "20"], "Every page should be requested once")
+        with testtools.ExpectedException(IndexError):
+            results[25]
+
+        results = mstr.MSTRSearchResults({"result": found[:2]})
+        self.assertEqual([o.Name for o in results.Results], ["Report 0", "Report 1"], "Wrong unpaged results")
+
+    def test_mstrsearchresultsconcurrent(self):
+        """testing MSTRSearchResults Class pages requested from several threads"""
+        found = [{"id": "%032X" % i, "name": "Report %s" % i, "type": 3, "subtype": 768} for i in range(25)]
+        requested = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def fetch(offset, limit):
+            requested.append(offset)
+            if offset == 10:
+                started.set()
+                release.wait(5)
+            return {"totalItems": len(found), "result": found[offset:offset + limit]}
+
+        results = mstr.MSTRSearchResults(fetch(0, 10), fetch, 10)
+        names = []
+        threads = [threading.Thread(target=lambda: names.append(results[15].Name)) for _ in range(2)]
+        threads[0].start()
+        self.assertTrue(started.wait(5))
+        self.assertIn(1, results._pending, "Page requested without registering it")
+        threads[1].start()
+        time.sleep(0.05)
+        release.set()
+        for t in threads:
+            t.join(5)
+        self.assertEqual(names, ["Report 15", "Report 15"])
+        self.assertEqual(requested.count(10), 1, "Page should be requested once")
+
+        failures = []
+
+        def failing(offset, limit):
+            failures.append(offset)
+            if len(failures) == 1:
+                raise mstr.MSTRError("Search failed")
+            return {"totalItems": len(found), "result": found[offset:offset + limit]}
+
+        results = mstr.MSTRSearchResults({"totalItems": len(found), "result": found[:10]}, failing, 10)
+        with testtools.ExpectedException(mstr.MSTRError):
+            results[24]
+        self.assertEqual(results[24].Name, "Report 24", "Failed page should be requested again")
+        self.assertIs(results._getPrefetchExecutor(), mstr.MSTRSearchResults._getPrefetchExecutor(),
+                      "Prefetch executor should be shared")
+
+    def test_mstrsessionprojects(self):
+        """testing MSTRSession Class project index and refresh"""
+        projects = [{"id": "B19DEDCC11D4E0EFC000EB9495D0F44F", "name": "MicroStrategy Tutorial", "alias": "Tutorial",
+                     "status": 0},
+                    {"id": "AF09B3E3458F78B4FBE4DEB68528BF7B", "name": "Human Resources Analysis Module", "alias": "",
+                     "status": 0},
+                    {"id": "4BAE16A340B995CAD24193AA3AC15D29", "name": "Inactive", "alias": "", "status": 1}]
+        self.requests_mock.register_uri('POST', self.LOGIN_URL, headers={"X-MSTR-AuthToken": "FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF"})
+        self.requests_mock.register_uri('POST', self.BASE_URL + '/auth/logout', status_code=204)
+        self.requests_mock.register_uri('GET', self.BASE_URL + '/projects', json=lambda request, context: projects)
+        mstrsession = mstr.MSTRSession('http://demo.pxltd.ca:8080/MicroStrategyLibrary/api/', 'user', 'password',
+                                       autoopen=True, autoload=True, projectRefresh=3600)
+        self.assertEqual(mstrsession.projectCount, 2, "Inactive projects should not be indexed")
+        self.assertEqual(mstrsession.searchForProject("AF09B3E3458F78B4FBE4DEB68528BF7B")["alias"], "")
+        self.assertEqual(mstrsession.searchForProject("Tutorial")["id"], "B19DEDCC11D4E0EFC000EB9495D0F44F")
+        self.assertEqual(mstrsession.searchForProject("human resources analysis module")["id"],
+                         "AF09B3E3458F78B4FBE4DEB68528BF7B", "Names should match case insensitive")
+        self.assertIsNone(mstrsession.searchForProject("Inactive"))
+        self.assertIsNone(mstrsession.searchForProject(""), "Empty alias should not match")
+
+        # The timer thread never fires, its function is called by the test
+        timer = mstrsession._projectTimer
+        self.assertTrue(timer.isAlive(), "Project refresh not started")
+        projects[2]["status"] = 0
+        timer.function()
+        self.assertEqual(mstrsession.searchForProject("Inactive")["id"], "4BAE16A340B995CAD24193AA3AC15D29",
+                         "Project list not refreshed")
+        mstrsession.close()
+        self.assertFalse(timer.isAlive(), "Project refresh not stopped by close")
+
+    def test_mstrsessionloadprojects(self):
+        """testing MSTRSession Class getProjectList and loadProjects methods"""
+        projects = [{"id": "B19DEDCC11D4E0EFC000EB9495D0F44F", "name": "MicroStrategy Tutorial", "alias": "Tutorial",
+                     "status": 0},
+                    {"id": "AF09B3E3458F78B4FBE4DEB68528BF7B", "name": "No Status", "alias": ""}]
+        self.requests_mock.register_uri('POST', self.LOGIN_URL, headers={"X-MSTR-AuthToken": "FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF"})
+        self.requests_mock.register_uri('GET', self.BASE_URL + '/projects', json=projects)
+        mstrsession = mstr.MSTRSession('http://demo.pxltd.ca:8080/MicroStrategyLibrary/api/', 'user', 'password',
+                                       autoopen=True, autoload=False)
+        self.assertEqual(mstrsession.getProjectList(), projects, "Reading project list failed")
+        self.assertEqual(mstrsession.projectCount, 0, "getProjectList should not index the projects")
+
+        self.assertEqual(mstrsession.loadProjects(), projects, "Reading project list failed")
+        self.assertEqual(mstrsession.projectCount, 1, "Projects without status should not be indexed")
+        self.assertIsNone(mstrsession.searchForProject("No Status"))
+        self.assertEqual(mstrsession.searchForProject("Tutorial")["id"], "B19DEDCC11D4E0EFC000EB9495D0F44F")
+
+    def test_mstrsessionprojectsdata(self):
+        """testing MSTRSession Class getColumnarDataForProjects method"""
+        projects = [{"id": "%032X" % i, "name": name, "alias": "", "status": 0}
+                    for i, name in enumerate(["Canada", "Mexico", "Brazil"])]
+        self.requests_mock.register_uri('POST', self.LOGIN_URL, headers={"X-MSTR-AuthToken": "FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF"})
+        self.requests_mock.register_uri('GET', self.BASE_URL + '/projects', json=projects)
+        mstrsession = mstr.MSTRSession('http://demo.pxltd.ca:8080/MicroStrategyLibrary/api/', 'user', 'password',
+                                       autoopen=True, autoload=True)
+        regions = {"%032X" % 0: ["North", "South"], "%032X" % 1: ["South", "Central"]}
+
+        def page(request, context):
+            project = request.headers["X-MSTR-ProjectID"]
+            if project not in regions:
+                context.status_code = 500
+                return {"code": "ERR001", "message": "Report failed"}
+            return datasetResult(regions[project], int(request.qs["offset"][0]), int(request.qs["limit"][0]))
+        self.requests_mock.register_uri('POST', self.INSTANCES_URL, json=page)
+        self.requests_mock.register_uri('GET', self.INSTANCES_URL + '/FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF', json=page)
+
+        results = mstrsession.getColumnarDataForProjects(self.getDataset(), ["Canada", "Mexico", "Brazil", "Peru"],
+                                                         pPageSize=3)
+        self.assertEqual(results.Projects, ["Canada", "Mexico"], "Wrong projects that succeeded")
+        self.assertEqual(sorted(results.Errors), ["Brazil", "Peru"], "Failed projects not reported")
+        self.assertFalse(results.isComplete)
+        data = results.Results.todict()
+        self.assertEqual(data["Project"], ["Canada"] * 4 + ["Mexico"] * 4, "Wrong project column")
+        self.assertEqual(data["Region"], ["North", "North", "South", "South", "South", "South", "Central", "Central"],
+                         "Wrong merged attribute")
+        self.assertEqual(results.Results.getCategories("Region"), ["North", "South", "Central"],
+                         "Categories should be merged")
+        self.assertEqual(data["Revenue"], [len(r) * y for r in ["North", "South", "South", "Central"]
+                                           for y in (2017, 2018)])
+
+        with testtools.ExpectedException(mstr.MSTRError):
+            mstrsession.getColumnarDataForProjects(self.getDataset(), ["Canada"], pPageSize=3,
+                                                   pProjectColumn="Region")
+
+        # Unexpected errors of a project do not lose the others
+        getColumnarData = mstrsession.getColumnarData
+
+        def failing(pDataset, pObjects, pFilters, pProjectId, pPageSize):
+            if pProjectId == "%032X" % 1:
+                raise KeyError("result")
+            return getColumnarData(pDataset, pObjects, pFilters, pProjectId, pPageSize)
+        mstrsession.getColumnarData = failing
+        results = mstrsession.getColumnarDataForProjects(self.getDataset(), ["Canada", "Mexico"], pPageSize=3)
+        self.assertEqual(results.Projects, ["Canada"], "Projects that succeeded lost")
+        self.assertIsInstance(results.Errors["Mexico"], KeyError)
+        self.assertEqual(len(results.Results), 4)
+
+        # getColumnarData returns None when the session is not valid
+        mstrsession.getColumnarData = lambda *args: None
+        results = mstrsession.getColumnarDataForProjects(self.getDataset(), ["Canada", "Mexico"])
+        self.assertEqual(results.Projects, [], "Projects without data reported as succeeded")
+        self.assertEqual(sorted(results.Errors), ["Canada", "Mexico"])
+
+    def test_mstrsessionrequestlogging(self):
+        """testing MSTRSession Class request timing hooks and truncated DEBUG logging"""
+        self.requests_mock.register_uri('POST', self.LOGIN_URL, headers={"X-MSTR-AuthToken": "FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF"})
+        mstrsession = mstr.MSTRSession('http://demo.pxltd.ca:8080/MicroStrategyLibrary/api/', 'user', 'password',
+                                       autoopen=True, autoload=False)
+        timings = []
+        mstrsession.requestHooks.append(lambda t, r: timings.append(t))
+        self.requests_mock.register_uri('GET', self.BASE_URL + '/projects', json=[{"id": "P" * 5000}])
+        self.requests_mock.register_uri('GET', self.SESSION_URL, status_code=401, json={"code": "ERR009"})
+
+        logger = self.useFixture(fixtures.FakeLogger(level=20))
+        mstrsession.request("GET", self.BASE_URL + '/projects')
+        self.assertEqual(timings[-1]["status"], 200)
+        self.assertEqual(timings[-1]["bytesIn"], len('[{"id": "' + "P" * 5000 + '"}]'), "Wrong bytes received")
+        self.assertGreaterEqual(timings[-1]["total"], 0)
+        self.assertIn("status 200", logger.output)
+        self.assertNotIn("PPPP", logger.output, "Content should only be logged in DEBUG")
+
+        logger = self.useFixture(fixtures.FakeLogger(level=10))
+        mstrsession.request("GET", self.BASE_URL + '/projects')
+        self.assertIn("PPPP", logger.output)
+        self.assertIn("(%s of 5012)" % mstr.MSTRSession.LOG_BODY_LIMIT, logger.output, "Content not truncated")
+        self.assertNotIn("P" * mstr.MSTRSession.LOG_BODY_LIMIT, logger.output, "Content not truncated")
+        self.assertNotIn("FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF", logger.output, "Authentication token logged")
+
+        mstrsession.request("GET", self.SESSION_URL, raiseError=False, pReauthenticate=False)
+        self.assertEqual(timings[-1]["status"], 401, "Failed requests should be timed")